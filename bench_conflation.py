@@ -0,0 +1,102 @@
+# Бенчмарк: слияние стаканов и котировок для медленного потребителя (conflation.py)
+#
+# Запуск:
+#   python bench_conflation.py                       — потребитель тратит 20 мс на каждую пачку
+#   python bench_conflation.py --delay 0.1 --workers 2
+#
+# Коннектор читает поток эмулятора (quotes, quotations, alltrades, orders). Потребитель
+# забирает обновления с заданной задержкой. Выводится, во сколько раз слились обновления
+# по инструментам, и проверяется, что сделки и заявки дошли все.
+import argparse  # Для аргументов командной строки
+import importlib  # Для выбора варианта программы
+import logging  # Чтобы заглушить вывод каждого сообщения в консоль
+import os  # Для пути к эмулятору
+import socket  # Ожидание запуска эмулятора
+import subprocess  # Эмулятор в отдельном процессе
+import sys  # Путь к интерпретатору
+import tempfile  # Временная папка для лог-файла
+import threading  # Счетчик записей пишут потоки-обработчики
+import time  # Для замера времени
+from collections import Counter  # Сколько записей каждого тега получено
+from transport import EmulatorTransport  # Подключение к эмулятору вместо DLL
+from conflation import Conflator, CONFLATED  # Слияние обновлений
+
+
+def wait_port(host, port, timeout=10.0):
+    """Ждет, пока эмулятор начнет принимать подключения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Эмулятор не запустился на {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Слияние обновлений для медленного потребителя")
+    parser.add_argument("--rate", type=int, default=10000, help="сообщений/с от эмулятора")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--delay", type=float, default=0.02, help="секунд потребитель обрабатывает пачку")
+    parser.add_argument("--instruments", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="число потоков разбора")
+    parser.add_argument("--variant", choices=("j", "t"), default="j", help="какой terminal_connector использовать")
+    parser.add_argument("--port", type=int, default=3955)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # Вывод каждого сообщения в консоль исказит замер
+
+    emulator = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                              "transaq_emulator.py"),
+                                 "--port", str(args.port), "--rate", str(args.rate),
+                                 "--instruments", str(args.instruments), "--mix", "40,20,5,35"])
+    try:
+        wait_port("127.0.0.1", args.port)
+        module = importlib.import_module(f"terminal_connector_{args.variant}")
+        connector = module.Connector(transport=EmulatorTransport(port=args.port), workers=args.workers,
+                                     capture=False)
+        produced = Counter()  # Записей каждого тега, которые пришли в коннектор
+        lock = threading.Lock()
+
+        def count(tag, records):
+            with lock:
+                produced[tag] += len(records)
+
+        for tag in tuple(CONFLATED) + ("alltrades", "orders"):
+            connector.add_record_handler(tag, lambda records, tag=tag: count(tag, records))
+        conflator = Conflator()
+        conflator.attach(connector)
+        consumed = Counter()  # Записей каждого тега, которые получил потребитель
+        calls = 0
+
+        def consume(batches):
+            nonlocal calls
+            calls += 1
+            for tag, records in batches:
+                consumed[tag] += len(records)
+            time.sleep(args.delay)  # Медленный потребитель: окно, запись в базу, сеть
+
+        with tempfile.TemporaryDirectory() as tmp:
+            connector.initialize(tmp, 1)
+            connector.send_command('<command id="connect"><login>bench</login><password>bench</password></command>')
+            conflator.start(consume)
+            time.sleep(args.duration)
+            connector.uninitialize()
+            connector.queue.stop()  # Обработчики разбирают остаток очереди
+        time.sleep(args.delay + 1.0)  # Потребитель забирает остаток
+        conflator.stop()
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+    print(f"Пачек у потребителя: {calls}, по {args.delay * 1000:.0f} мс")
+    print(f"{'тег':<12}{'пришло':>10}{'получено':>10}")
+    for tag in tuple(CONFLATED) + ("alltrades", "orders"):
+        print(f"{tag:<12}{produced[tag]:>10}{consumed[tag]:>10}")
+    lost = sum(produced[tag] - consumed[tag] for tag in ("alltrades", "orders"))
+    print(f"Сделок и заявок потеряно: {lost}")
+    print(conflator.format_report(10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Микро-бенчмарк: рассылка сообщений через dispatch.DispatchTable
+#
+# Запуск:
+#   python bench_dispatch.py            — 20000 сообщений эмулятора, 100 инструментов
+#   python bench_dispatch.py 50000
+#
+# Сравниваются: без подписчиков (тег по первым байтам, без разбора), разбор каждого сообщения
+# (как делает подписчик на все теги), подписчик на все записи quotes и alltrades и подписчик
+# только на один инструмент.
+import argparse  # Для аргументов командной строки
+import time  # Для замера времени
+from xml_stream import root_tag  # Корневой тег сообщения
+from messages import decode  # Разбор без таблицы
+from transaq_emulator import EmulatorServer  # Синтетический поток
+from dispatch import DispatchTable  # Таблица рассылки
+
+
+def run(payloads, table):
+    started = time.perf_counter()
+    for data in payloads:
+        table.dispatch(root_tag(data), data)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Рассылка сообщений через DispatchTable")
+    parser.add_argument("count", nargs="?", type=int, default=20000, help="сообщений эмулятора")
+    count = parser.parse_args().count
+    server = EmulatorServer(instruments=100)
+    payloads = [server.next_message() for _ in range(count)]
+    received = []
+
+    started = time.perf_counter()
+    for data in payloads:
+        decode(root_tag(data), data)
+    decode_all = time.perf_counter() - started
+
+    empty = DispatchTable()
+    everything = DispatchTable()
+    one = DispatchTable()
+    for tag in ("quotes", "alltrades"):
+        everything.add_record_handler(tag, received.append)
+        one.add_record_handler(tag, received.append, board="TQBR", seccode="SEC0001")
+    cases = (("без подписчиков", run(payloads, empty)),
+             ("разбор всех сообщений", decode_all),
+             ("все записи quotes, alltrades", run(payloads, everything)),
+             ("один инструмент", run(payloads, one)))
+    print(f"Сообщений: {count}")
+    print(f"{'случай':<30}{'сообщений/с':>14}{'мкс/сообщение':>16}")
+    for title, elapsed in cases:
+        print(f"{title:<30}{count / elapsed:>14,.0f}{elapsed / count * 1e6:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
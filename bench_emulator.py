@@ -0,0 +1,81 @@
+# Нагрузочный тест: Connector против локального эмулятора Transaq на разных скоростях потока
+#
+# Запуск (PyQt5 и cryptography не нужны):
+#   python bench_emulator.py --rates 10000,50000,100000,200000 --duration 5
+#
+# Для каждой скорости запускается transaq_emulator.py в отдельном процессе. Точка
+# насыщения — скорость, с которой "обработано/с" перестает расти, а "выброшено"
+# и глубина очереди начинают расти.
+import argparse  # Для аргументов командной строки
+import importlib  # Для выбора варианта программы
+import logging  # Чтобы заглушить вывод каждого сообщения в консоль
+import os  # Для пути к эмулятору
+import socket  # Ожидание запуска эмулятора
+import subprocess  # Эмулятор в отдельном процессе
+import sys  # Путь к интерпретатору
+import tempfile  # Временная папка для лог-файла
+import time  # Для замера времени
+from transport import EmulatorTransport  # Транспорт к эмулятору вместо DLL
+
+
+def wait_port(host, port, timeout=10.0):
+    """Ждет, пока эмулятор начнет принимать подключения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Эмулятор не запустился на {host}:{port}")
+
+
+def run_rate(module, rate, args):
+    """Прогоняет одну скорость и возвращает строку результатов"""
+    emulator = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                              "transaq_emulator.py"),
+                                 "--port", str(args.port), "--rate", str(rate),
+                                 "--instruments", str(args.instruments)])
+    try:
+        wait_port("127.0.0.1", args.port)
+        transport = EmulatorTransport(port=args.port)
+        connector = module.Connector(transport=transport, workers=args.workers, capture=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            connector.initialize(tmp, 1)
+            connector.send_command('<command id="connect"><login>bench</login><password>bench</password></command>')
+            time.sleep(1.0)  # Разгон: первые пачки генератора
+            received, processed, dropped = transport.received, connector.queue.processed, connector.queue.dropped
+            started = time.perf_counter()
+            time.sleep(args.duration)
+            elapsed = time.perf_counter() - started
+            stats = connector.queue.stats()
+            result = (rate, (transport.received - received) / elapsed, (stats["processed"] - processed) / elapsed,
+                      stats["dropped"] - dropped, stats["max_depth"])
+            connector.uninitialize()
+            connector.queue.stop(timeout=1.0)
+        return result
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск точки насыщения Connector на синтетическом потоке")
+    parser.add_argument("--rates", default="10000,50000,100000,200000", help="скорости эмулятора, сообщений/с")
+    parser.add_argument("--duration", type=float, default=5.0, help="секунд на одну скорость")
+    parser.add_argument("--variant", choices=("j", "t"), default="j", help="какой terminal_connector использовать")
+    parser.add_argument("--workers", type=int, default=1, help="число потоков разбора")
+    parser.add_argument("--instruments", type=int, default=100, help="число бумаг в эмуляторе")
+    parser.add_argument("--port", type=int, default=3950)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # Вывод каждого сообщения в консоль исказит замер
+    module = importlib.import_module(f"terminal_connector_{args.variant}")
+    print(f"{'скорость':>10}{'принято/с':>12}{'обработано/с':>15}{'выброшено':>11}{'макс. очередь':>15}")
+    for rate in (int(x) for x in args.rates.split(",")):
+        rate, received, processed, dropped, depth = run_rate(module, rate, args)
+        print(f"{rate:>10}{received:>12,.0f}{processed:>15,.0f}{dropped:>11}{depth:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Бенчмарк: раздача записей через gateway.py нескольким клиентам по TCP
+#
+# Запуск:
+#   python bench_gateway.py                         — 200000 сообщений, 2 клиента на все теги
+#   python bench_gateway.py --clients 4 --filtered 2 — двое из клиентов подписаны только на один инструмент
+#
+# Сообщения генерирует transaq_emulator.py, разбираются они заранее (как в потоках-обработчиках
+# коннектора), публикует их отдельный поток. Выводится, сколько записей в секунду получил
+# каждый клиент, и сколько байт занимает запись в кадре шлюза против исходного XML.
+import argparse  # Для аргументов командной строки
+import asyncio  # Клиенты шлюза
+import marshal  # Размер кадров
+import threading  # Публикация — из отдельного потока, как у потоков-обработчиков
+import time  # Для замера времени
+import messages  # Разбор сообщений в записи
+from xml_stream import root_tag  # Корневой тег сообщения
+from transaq_emulator import EmulatorServer  # Синтетический поток
+from gateway import Gateway, GatewayClient, encode_record  # Шлюз
+
+PORT = 3961
+
+
+def prepare(count, instruments):
+    """[(тег, записи)] и общий размер XML"""
+    server = EmulatorServer(instruments=instruments, mix=(60, 40, 0))
+    batches, xml_bytes = [], 0
+    for _ in range(count):
+        payload = server.next_message()
+        tag = root_tag(payload)
+        batches.append((tag, messages.decode(tag, payload)))
+        xml_bytes += len(payload)
+    return batches, xml_bytes
+
+
+async def consume(client, expected, deadline):
+    """Читает, пока не получит expected записей (или не кончится время); (получено, время окончания)"""
+    received, finished = 0, time.monotonic()
+    while received + client.lost < expected and time.monotonic() < deadline:
+        try:
+            _, records = await asyncio.wait_for(client.__anext__(), 0.5)
+        except asyncio.TimeoutError:
+            continue
+        received += len(records)
+        finished = time.monotonic()
+    return received, finished
+
+
+async def run(args, batches, total, selected):
+    gateway = Gateway(port=PORT, high_water=64 * 1024 * 1024)
+    gateway.start_thread()
+    clients = [await GatewayClient.connect(port=PORT) for _ in range(args.clients)]
+    for i, client in enumerate(clients):
+        for tag in ("quotes", "alltrades"):
+            if i < args.filtered:
+                await client.subscribe(tag, board="TQBR", seccode="SEC0001")
+            else:
+                await client.subscribe(tag)
+    await asyncio.sleep(0.1)  # Подписки дошли до шлюза
+
+    def publisher():
+        for tag, records in batches:
+            gateway.publish(tag, records)
+
+    started = time.monotonic()
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    results = await asyncio.gather(*(consume(client, selected if i < args.filtered else total, started + 60)
+                                     for i, client in enumerate(clients)))
+    thread.join()
+    for client in clients:
+        await client.close()
+    stats = gateway.stats()
+    gateway.stop()
+    return started, results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Раздача записей через шлюз")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--filtered", type=int, default=0, help="сколько клиентов подписаны на один инструмент")
+    parser.add_argument("--instruments", type=int, default=20)
+    args = parser.parse_args()
+
+    batches, xml_bytes = prepare(args.messages, args.instruments)
+    total = sum(len(records) for _, records in batches)
+    selected = sum(record.seccode == "SEC0001" and record.board == "TQBR" for _, records in batches for record in records)
+    frame_bytes = sum(len(marshal.dumps((tag, [encode_record(record) for record in records]))) + 5
+                      for tag, records in batches)
+    print(f"Сообщений: {args.messages}, записей: {total}")
+    print(f"Байт на запись: XML {xml_bytes / total:.1f}, кадр шлюза {frame_bytes / total:.1f}")
+
+    started, results, stats = asyncio.run(run(args, batches, total, selected))
+    print(f"{'клиент':<14}{'записей':>10}{'записей/с':>12}")
+    for i, (received, finished) in enumerate(results):
+        kind = "один инструмент" if i < args.filtered else "все"
+        print(f"{kind:<14}{received:>10}{received / (finished - started):>12,.0f}")
+    print(f"Выброшено для медленных клиентов: {stats['dropped']}")
+
+
+if __name__ == "__main__":
+    main()
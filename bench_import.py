@@ -0,0 +1,67 @@
+# Бенчмарк: время импорта коннектора без окна и с окном (каждый замер — в новом процессе)
+#
+# Запуск:
+#   python bench_import.py          — по 5 запусков каждого модуля
+#   python bench_import.py 20
+#
+# "import, мс" — время самого импорта внутри процесса, "процесс, мс" — запуск интерпретатора
+# целиком. Для terminal_connector_*.py нужен настоящий KEY (как и для запуска программ).
+import argparse  # Для аргументов командной строки
+import os  # Папка с модулями программы
+import statistics  # Медиана замеров
+import subprocess  # Каждый импорт — в чистом процессе
+import sys  # Путь к интерпретатору
+import time  # Для замера времени
+
+MODULES = (
+    ("connector_core", "коннектор без окна"),
+    ("terminal_connector_j", "программа, --headless"),
+    ("terminal_connector_t", "программа dev, --headless"),
+    ("cryptography.fernet", "шифрование пароля"),
+    ("connection_window", "окно и PyQt5"),
+)
+PROBE = ("import sys, time; started = time.perf_counter(); import {module}; "
+         "print(time.perf_counter() - started, 'PyQt5' in sys.modules, 'cryptography' in sys.modules)")
+
+
+def measure(module, runs):
+    """Медианы (импорт, процесс) в секундах и какие тяжелые пакеты загрузились; None — модуль не импортируется"""
+    imports, processes = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        processes.append(time.perf_counter() - started)
+        if result.returncode:
+            return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "ошибка"
+        elapsed, qt, crypto = result.stdout.split()
+        imports.append(float(elapsed))
+    return (statistics.median(imports), statistics.median(processes)), (qt == "True", crypto == "True")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта коннектора без окна и с окном")
+    parser.add_argument("runs", nargs="?", type=int, default=5, help="запусков каждого модуля")
+    runs = parser.parse_args().runs
+    baseline = statistics.median(
+        [_timed([sys.executable, "-c", "pass"]) for _ in range(runs)])  # Запуск пустого интерпретатора
+    print(f"Пустой интерпретатор: {baseline * 1000:.1f} мс, запусков: {runs}")
+    print(f"{'модуль':<24}{'import, мс':>12}{'процесс, мс':>13}  {'PyQt5':<6}{'crypto':<7}описание")
+    for module, title in MODULES:
+        times, loaded = measure(module, runs)
+        if times is None:
+            print(f"{module:<24}{'—':>12}{'—':>13}  {loaded}")
+            continue
+        qt, crypto = loaded
+        print(f"{module:<24}{times[0] * 1000:>12.1f}{times[1] * 1000:>13.1f}  {'да' if qt else 'нет':<6}"
+              f"{'да' if crypto else 'нет':<7}{title}")
+
+
+def _timed(command):
+    started = time.perf_counter()
+    subprocess.run(command, capture_output=True)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    main()
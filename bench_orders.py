@@ -0,0 +1,97 @@
+# Микро-бенчмарк: сборка команд заявок через f-строки и через готовые байтовые шаблоны orders.py
+#
+# Запуск:
+#   python bench_orders.py             — 200000 команд каждого вида
+#   python bench_orders.py 1000000
+import argparse  # Для аргументов командной строки
+import time  # Для замера времени
+from messages import from_scaled, to_scaled  # Цены в единицах PRICE_SCALE
+from orders import OrderEntry, encode_neworder, encode_cancelorder, encode_moveorder  # Новый способ
+from securities_cache import SecuritiesCache  # Справочник для проверки заявок
+
+CLIENT = "C123456"
+PRICE = to_scaled("250.17")
+
+
+def fstring_neworder(i):
+    """Текущий способ: f-строка, как команда connect в _on_connect_clicked, и кодирование в UTF-8"""
+    return f"""<command id="neworder">
+                <security><board>TQBR</board><seccode>SBER</seccode></security>
+                <client>{CLIENT}</client>
+                <price>{from_scaled(PRICE + i % 100 * 10000)}</price>
+                <hidden>0</hidden>
+                <quantity>{i % 10 + 1}</quantity>
+                <buysell>{"B" if i & 1 else "S"}</buysell>
+                <unfilled>PutInQueue</unfilled>
+            </command>""".encode("utf-8")
+
+
+def fstring_cancelorder(i):
+    return f"""<command id="cancelorder"><transactionid>{1000000 + i}</transactionid></command>""".encode("utf-8")
+
+
+def fstring_moveorder(i):
+    return (f"""<command id="moveorder"><transactionid>{1000000 + i}</transactionid>"""
+            f"""<price>{from_scaled(PRICE + i % 100 * 10000)}</price><moveflag>0</moveflag>"""
+            f"""<quantity>0</quantity></command>""").encode("utf-8")
+
+
+def template_neworder(i):
+    return encode_neworder("TQBR", "SBER", "B" if i & 1 else "S", i % 10 + 1, PRICE + i % 100 * 10000,
+                           client=CLIENT, decimals=2)
+
+
+def template_cancelorder(i):
+    return encode_cancelorder(1000000 + i)
+
+
+def template_moveorder(i):
+    return encode_moveorder(1000000 + i, PRICE + i % 100 * 10000, decimals=2)
+
+
+def checked_neworder_factories():
+    """neworder с проверкой по справочнику из одного инструмента: через OrderEntry и готовую заготовку"""
+    securities = SecuritiesCache()
+    securities.load_message(b'<securities><security secid="3" active="true"><seccode>SBER</seccode>'
+                            b'<instrclass>E</instrclass><board>TQBR</board><market>1</market>'
+                            b'<decimals>2</decimals><minstep>0.01</minstep><lotsize>10</lotsize>'
+                            b'</security></securities>')
+    orders = OrderEntry(securities=securities, client=CLIENT)
+
+    template = orders.template("TQBR", "SBER")
+
+    def checked_neworder(i):
+        return orders.encode_new_order("TQBR", "SBER", "B" if i & 1 else "S", i % 10 + 1, PRICE + i % 100 * 10000)
+
+    def prebuilt_neworder(i):
+        return template.encode("B" if i & 1 else "S", i % 10 + 1, PRICE + i % 100 * 10000)
+    return checked_neworder, prebuilt_neworder
+
+
+def measure(func, count):
+    """Время на команду (мкс)"""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка команд заявок через f-строки и через шаблоны orders.py")
+    parser.add_argument("count", nargs="?", type=int, default=200000, help="команд каждого вида")
+    count = parser.parse_args().count
+    print(f"Команд каждого вида: {count}")
+    print(f"{'команда':<28}{'f-строка, мкс':>15}{'шаблон, мкс':>13}{'ускорение':>11}")
+    checked, prebuilt = checked_neworder_factories()
+    for name, old, new in (("neworder", fstring_neworder, template_neworder),
+                           ("neworder + проверка", fstring_neworder, checked),
+                           ("neworder, заготовка", fstring_neworder, prebuilt),
+                           ("cancelorder", fstring_cancelorder, template_cancelorder),
+                           ("moveorder", fstring_moveorder, template_moveorder)):
+        old_us = measure(old, count)
+        new_us = measure(new, count)
+        print(f"{name:<28}{old_us:>15.2f}{new_us:>13.2f}{old_us / new_us:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Микро-бенчмарк: разбор сообщений Transaq через ET.fromstring и через xml_stream
+#
+# Запуск:
+#   python bench_parser.py                 — на синтетических сообщениях
+#   python bench_parser.py transaq.log     — на сообщениях из лога terminal_connector_j.py
+#   python bench_parser.py capture.tqc     — на сообщениях из файла записи (capture.py)
+import argparse  # Для аргументов командной строки
+import time  # Для замера времени
+import tracemalloc  # Для замера пиковой памяти
+import xml.etree.ElementTree as ET  # Текущий способ разбора
+from collections import defaultdict  # Для группировки сообщений по тегу
+from xml_stream import root_tag, root_attrib, iter_children  # Новый способ разбора
+from capture import CaptureReader  # Чтение файлов записи
+
+BIG_TAGS = {"quotes": "quote", "alltrades": "trade", "securities": "security"}  # Пакет -> элемент
+REPEAT = 5  # Сколько раз прогоняем набор сообщений
+
+
+def synthetic_payloads():
+    """Генерирует набор сообщений, похожих на реальный поток Transaq"""
+    payloads = [b'<server_status id="1" connected="true" recover="false" server_tz="Russian Standard Time"/>'] * 50
+    payloads += [b'<result success="true" transactionid="123456"/>'] * 50
+    quotes = b"".join(
+        b'<quote secid="%d"><board>TQBR</board><seccode>SBER</seccode><price>%d.%02d</price>'
+        b'<buy>%d</buy></quote>' % (i % 50, 250 + i % 20, i % 100, i) for i in range(200))
+    payloads += [b"<quotes>" + quotes + b"</quotes>"] * 200
+    trades = b"".join(
+        b'<trade secid="3"><seccode>SBER</seccode><board>TQBR</board><tradeno>%d</tradeno>'
+        b'<time>18.10.2026 10:00:%02d.123</time><price>251.3</price><quantity>%d</quantity>'
+        b'<buysell>B</buysell></trade>' % (7000000 + i, i % 60, i % 90 + 1) for i in range(500))
+    payloads += [b"<alltrades>" + trades + b"</alltrades>"] * 100
+    securities = b"".join(
+        b'<security secid="%d" active="true"><seccode>T%05d</seccode><instrclass>E</instrclass>'
+        b'<board>TQBR</board><market>1</market><shortname>Ticker %d</shortname><decimals>2</decimals>'
+        b'<minstep>0.01</minstep><lotsize>10</lotsize></security>' % (i, i, i) for i in range(20000))
+    payloads += [b"<securities>" + securities + b"</securities>"] * 2
+    return payloads
+
+
+def load_log(path):
+    """Читает сообщения из лога terminal_connector_j.py ("ЧЧ:ММ:СС.ммм <xml>") или файла записи"""
+    if path.endswith(".tqc"):
+        return [payload for _, _, payload in CaptureReader(path)]
+    payloads = []
+    with open(path, "rb") as f:
+        for line in f:
+            _, _, payload = line.rstrip(b"\r\n").partition(b" ")  # Отрезаем время
+            if payload.startswith(b"<"):
+                payloads.append(payload)
+    return payloads
+
+
+def old_path(data):
+    """Текущий путь: декодирование в str и построение всего дерева"""
+    root = ET.fromstring(data.decode("utf-8"))
+    if root.tag in BIG_TAGS:
+        return sum(1 for _ in root)  # Перебираем элементы готового дерева
+    return root.get("connected") or root.get("success")
+
+
+def new_path(data):
+    """Новый путь: тег по первым байтам, атрибуты корня или потоковый перебор"""
+    tag = root_tag(data)
+    if tag in BIG_TAGS:
+        return sum(1 for _ in iter_children(data, BIG_TAGS[tag]))
+    attrib = root_attrib(data)
+    return attrib.get("connected") or attrib.get("success")
+
+
+def measure(func, payloads):
+    """Возвращает время на сообщение (мкс) и пиковую память (КБ) для набора"""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for data in payloads:
+            func(data)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()  # Память меряем отдельно, чтобы не искажать время
+    for data in payloads:
+        func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / (REPEAT * len(payloads)) * 1e6, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор сообщений через ET.fromstring и через xml_stream")
+    parser.add_argument("path", nargs="?", help="лог terminal_connector_j.py или файл записи .tqc "
+                                               "(без него — синтетические сообщения)")
+    args = parser.parse_args()
+    payloads = load_log(args.path) if args.path else synthetic_payloads()
+    groups = defaultdict(list)
+    for data in payloads:
+        groups[root_tag(data)].append(data)
+
+    print(f"Сообщений: {len(payloads)}, типов: {len(groups)}")
+    print(f"{'тег':<16}{'кол-во':>8}{'ET, мкс':>12}{'stream, мкс':>14}{'ускорение':>11}"
+          f"{'ET, КБ':>10}{'stream, КБ':>12}{'память':>9}")
+    for tag, items in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        old_us, old_kb = measure(old_path, items)
+        new_us, new_kb = measure(new_path, items)
+        print(f"{tag or '?':<16}{len(items):>8}{old_us:>12.1f}{new_us:>14.1f}{old_us / new_us:>10.2f}x"
+              f"{old_kb:>10.0f}{new_kb:>12.0f}{old_kb / new_kb:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
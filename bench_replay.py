@@ -0,0 +1,67 @@
+# Бенчмарк: воспроизведение записанной сессии через Connector без DLL
+#
+# Запуск (PyQt5 и cryptography не нужны: события коннектора вызываются без Qt):
+#   python bench_replay.py capture.tqc                 — так быстро, как возможно
+#   python bench_replay.py capture.tqc --speed 10      — в 10 раз быстрее записи
+#   python bench_replay.py capture.tqc --variant t     — через terminal_connector_t.py
+import argparse  # Для аргументов командной строки
+import importlib  # Для выбора варианта программы
+import logging  # Чтобы заглушить вывод каждого сообщения в консоль
+import tempfile  # Временная папка для лог-файла
+import time  # Для замера времени
+from collections import Counter  # Счетчики сигналов
+from ingest_queue import BLOCK  # Без потерь: при переполнении воспроизведение ждет обработчиков
+from transport import ReplayTransport  # Воспроизведение записи вместо DLL
+
+SIGNALS = ("data_received", "important_data_received", "connection_status_changed", "error_occurred")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пропускная способность Connector на записанной сессии")
+    parser.add_argument("capture", help="файл записи *.tqc")
+    parser.add_argument("--speed", default="max", help="max или множитель скорости (1 — как в записи)")
+    parser.add_argument("--variant", choices=("j", "t"), default="j", help="какой terminal_connector использовать")
+    parser.add_argument("--workers", type=int, default=1, help="число потоков разбора")
+    parser.add_argument("--console", action="store_true", help="не глушить вывод сообщений в консоль")
+    parser.add_argument("--latency", action="store_true", help="замерить задержки по стадиям обработки")
+    args = parser.parse_args()
+
+    if not args.console:
+        logging.disable(logging.INFO)  # Вывод каждого сообщения в консоль исказит замер
+    module = importlib.import_module(f"terminal_connector_{args.variant}")
+    speed = None if args.speed == "max" else float(args.speed)
+    transport = ReplayTransport(args.capture, speed)
+    connector = module.Connector(transport=transport, workers=args.workers, queue_policy=BLOCK, capture=False,
+                                 latency=args.latency)
+
+    counts = Counter()
+
+    def counter(name):
+        def count(*_):
+            counts[name] += 1
+        return count
+
+    for name in SIGNALS:  # Считаем события прямо в потоке-обработчике
+        signal = getattr(connector.signals, name, None)
+        if signal is not None:
+            signal.connect(counter(name))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        connector.initialize(tmp, 1)
+        transport.finished.wait()
+        while connector.queue.processed + connector.queue.dropped < transport.sent:  # Ждем разбора хвоста очереди
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - transport.started_at
+        connector.uninitialize()
+        log_stats = connector.log.stats()  # После остановки: последняя пачка уже на диске
+
+    print(f"Сообщений: {transport.sent}, время: {elapsed:.3f} с, {transport.sent / elapsed:,.0f} сообщений/с")
+    print(f"Очередь: {connector.queue.stats()}")
+    print(f"Сигналы: {dict(counts)}")
+    print(f"Лог: {log_stats}")
+    if args.latency:
+        print(connector.latency.format_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Бенчмарк: раздача потока через shm_ring.py нескольким процессам-читателям
+#
+# Запуск:
+#   python bench_shm.py                          — 500000 сообщений, 2 читателя
+#   python bench_shm.py --readers 4 --slow 1     — один из читателей медленный (ждет 10 мс после каждой пачки)
+#
+# Писатель публикует сообщения с максимальной скоростью и никогда не ждет читателей.
+# Для каждого читателя выводится, сколько он получил и потерял (его обогнали) и задержка
+# от публикации до чтения: monotonic_ns общий для всех процессов машины.
+import argparse  # Для аргументов командной строки
+import multiprocessing  # Читатели — отдельные процессы
+import time  # Для замера времени
+from latency import Histogram  # Задержки публикация -> чтение
+from shm_ring import RingWriter, RingReader  # Кольцевой буфер в общей памяти
+
+PAYLOAD = (b'<quotes><quote secid="1"><board>TQBR</board><seccode>SBER</seccode>'
+           b'<price>250.10</price><buy>10</buy></quote></quotes>')
+
+
+def reader(name, slow, total, results):
+    histogram = Histogram()
+    with RingReader(name, start="tail") as ring:
+        received = 0
+        deadline = time.monotonic() + 60
+        while received + ring.lost < total and time.monotonic() < deadline:
+            messages = ring.poll(1000)
+            now = time.monotonic_ns()
+            for message in messages:
+                histogram.record(now - message.ns)
+            received += len(messages)
+            if slow:
+                time.sleep(0.01)
+            elif not messages:
+                time.sleep(0.0001)
+        results.put((slow, received, ring.lost, ring.overruns, histogram.percentile(50) / 1e3,
+                     histogram.percentile(99) / 1e3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Раздача потока через общую память")
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--slow", type=int, default=0, help="сколько читателей медленные")
+    parser.add_argument("--capacity", type=int, default=16, help="размер буфера, МБ")
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    with RingWriter(capacity=args.capacity * 1024 * 1024) as ring:
+        processes = [multiprocessing.Process(target=reader, args=(ring.name, i < args.slow, args.messages, results))
+                     for i in range(args.readers)]
+        for process in processes:
+            process.start()
+        while len(ring.readers()) < args.readers:  # Ждем, пока все читатели займут слоты
+            time.sleep(0.01)
+        started = time.perf_counter()
+        for _ in range(args.messages):
+            ring.publish("quotes", PAYLOAD)
+        elapsed = time.perf_counter() - started
+        ring.check_readers()
+        print(f"Опубликовано: {args.messages}, {args.messages / elapsed:,.0f} сообщений/с")
+        print(f"{'читатель':<12}{'получено':>10}{'потеряно':>10}{'обгонов':>9}{'p50 мкс':>10}{'p99 мкс':>10}")
+        for _ in processes:
+            slow, received, lost, overruns, p50, p99 = results.get()
+            print(f"{'медленный' if slow else 'быстрый':<12}{received:>10}{lost:>10}{overruns:>9}{p50:>10.1f}{p99:>10.1f}")
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
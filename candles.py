@@ -0,0 +1,231 @@
+# Свечи (OHLCV) нескольких таймфреймов, обновляемые по каждой сделке из <alltrades>
+#
+# Подключение к Connector:
+#   candles = CandleAggregator()
+#   candles.attach(connector)          # сделки, история gethistorydata и сигнал bar_closed
+#   candles.bars("TQBR", "SBER", "1m", 100)
+#
+# Время свечи — начало интервала в мс эпохи, как у сделок. Программа подключается с
+# utc_time=true, поэтому дневные свечи начинаются в полночь UTC.
+import threading  # Сделки могут приходить из нескольких потоков-обработчиков
+import time  # Незакончившаяся свеча истории определяется по текущему времени
+from bisect import bisect_left  # Вставка свечей истории по времени
+from collections import deque  # Ограниченный список закрытых свечей
+
+# Таймфреймы: имя -> длительность в мс
+TIMEFRAMES = {"1s": 1000, "1m": 60 * 1000, "5m": 5 * 60 * 1000, "1h": 60 * 60 * 1000, "1d": 24 * 60 * 60 * 1000}
+
+
+class Bar:
+    """Свеча: время начала интервала, цены в единицах PRICE_SCALE, объем"""
+    __slots__ = ("time", "open", "high", "low", "close", "volume")
+
+    def __init__(self, time, open, high, low, close, volume):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def add(self, price, quantity):
+        """Учитывает сделку внутри интервала свечи"""
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += quantity
+
+    def copy(self):
+        return Bar(self.time, self.open, self.high, self.low, self.close, self.volume)
+
+    def __repr__(self):
+        return (f"Bar(time={self.time}, open={self.open}, high={self.high}, low={self.low}, "
+                f"close={self.close}, volume={self.volume})")
+
+    def __eq__(self, other):
+        if not isinstance(other, Bar):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+class CandleSeries:
+    """Свечи одной бумаги в одном таймфрейме: текущая свеча и последние закрытые"""
+    def __init__(self, interval, max_bars=10000):
+        self.interval = interval  # Длительность свечи в мс
+        self.current = None  # Текущая (незакрытая) свеча
+        self.closed = deque(maxlen=max_bars)  # Закрытые свечи по возрастанию времени
+        self.late = 0  # Сделки, опоздавшие больше чем на одну свечу (не учтены)
+        self.history_until = None  # Конец последней свечи истории: более ранние сделки уже учтены сервером
+
+    def add_trade(self, time, price, quantity):
+        """Учитывает сделку; возвращает закрытую этой сделкой свечу или None"""
+        start = time - time % self.interval
+        current = self.current
+        closed = self.closed
+        if current is not None:
+            if start == current.time:
+                current.add(price, quantity)
+                return None
+            if start > current.time:  # Начался новый интервал — текущая свеча закрывается
+                self.current = Bar(start, price, price, price, price, quantity)
+                closed.append(current)
+                return current
+        elif not closed or start > closed[-1].time:  # Первая сделка после закрытия по времени
+            self.current = Bar(start, price, price, price, price, quantity)
+            return None
+        # Сделка из прошлого интервала (пришла не по порядку)
+        if self.history_until is not None and start < self.history_until:
+            return None  # Свеча этого интервала пришла из истории и уже содержит сделку
+        if closed and closed[-1].time == start:
+            closed[-1].add(price, quantity)
+        else:
+            self.late += 1
+        return None
+
+    def merge_history(self, bars, now=None):
+        """Добавляет свечи истории, не задваивая объем уже собранных по сделкам
+
+        История заменяет свечи раньше текущей: они уже закрыты на сервере, и его
+        данные полнее (живые сделки могли начаться с середины интервала). Свечи
+        с временем текущей и позже пропускаются — их продолжают собирать сделки.
+        Свеча, интервал которой к моменту now (мс эпохи, по умолчанию — сейчас) еще
+        не закончился, тоже пропускается: сервер отдает ее недостроенной, и сделки
+        этого интервала, пришедшие потом, легли бы поверх его итогов.
+        """
+        if now is None:
+            now = time.time_ns() // 1_000_000
+        watermark = self.current.time if self.current is not None else None
+        closed = list(self.closed)
+        times = [bar.time for bar in closed]
+        for bar in bars:
+            if watermark is not None and bar.time >= watermark or bar.time + self.interval > now:
+                continue
+            end = bar.time + self.interval
+            if self.history_until is None or end > self.history_until:
+                self.history_until = end
+            i = bisect_left(times, bar.time)
+            if i < len(times) and times[i] == bar.time:
+                closed[i] = bar  # Замена, а не сложение
+            else:
+                closed.insert(i, bar)
+                times.insert(i, bar.time)
+        self.closed = deque(closed[-self.closed.maxlen:], maxlen=self.closed.maxlen)
+
+    def close_until(self, time):
+        """Закрывает текущую свечу, если ее интервал закончился к моменту time; возвращает ее или None"""
+        current = self.current
+        if current is None or time < current.time + self.interval:
+            return None
+        self.closed.append(current)
+        self.current = None
+        return current
+
+    def bars(self, count=None, include_current=True):
+        """Копии последних count свечей по возрастанию времени"""
+        bars = list(self.closed)
+        if include_current and self.current is not None:
+            bars.append(self.current)
+        if count is not None:
+            bars = bars[-count:]
+        return [bar.copy() for bar in bars]
+
+
+class CandleAggregator:
+    """Свечи всех бумаг по всем таймфреймам; O(1) на сделку в каждом таймфрейме
+
+    on_bar_closed(board, seccode, timeframe, bar) вызывается в потоке-обработчике
+    для каждой закрытой свечи.
+    """
+    def __init__(self, timeframes=None, max_bars=10000, on_bar_closed=None):
+        self.timeframes = dict(timeframes or TIMEFRAMES)  # Имя -> длительность в мс
+        self.max_bars = max_bars
+        self.on_bar_closed = on_bar_closed
+        self.series = {}  # (board, seccode) -> {таймфрейм: CandleSeries}
+        self.last_tradeno = {}  # (board, seccode) -> последний учтенный номер сделки
+        self.kinds = {}  # id вида свечей gethistorydata -> имя таймфрейма
+        self._lock = threading.Lock()
+
+    def attach(self, connector):
+        """Подписывается на сделки, свечи истории и виды свечей; закрытые свечи — в сигнал bar_closed"""
+        connector.add_record_handler("alltrades", self.on_trades)
+        connector.add_record_handler("candles", self.on_candles)
+        connector.add_record_handler("candlekinds", self.on_candlekinds)
+        if self.on_bar_closed is None:
+            self.on_bar_closed = connector.signals.bar_closed.emit
+
+    def _series(self, key):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {name: CandleSeries(interval, self.max_bars)
+                                         for name, interval in self.timeframes.items()}
+        return series
+
+    def on_trades(self, trades):
+        """Обработчик записей AllTrade; сделки с уже учтенным номером пропускаются"""
+        closed = []
+        with self._lock:
+            for trade in trades:
+                if trade.time is None or trade.price is None:
+                    continue
+                key = (trade.board, trade.seccode)
+                tradeno = trade.tradeno
+                if tradeno is not None:
+                    if tradeno <= self.last_tradeno.get(key, 0):
+                        continue  # Повтор после переподключения
+                    self.last_tradeno[key] = tradeno
+                for name, series in self._series(key).items():
+                    bar = series.add_trade(trade.time, trade.price, trade.quantity or 0)
+                    if bar is not None:
+                        closed.append((key, name, bar))
+        self._emit(closed)
+
+    def on_candlekinds(self, kinds):
+        """Запоминает, какому таймфрейму соответствует id вида свечей"""
+        by_interval = {interval: name for name, interval in self.timeframes.items()}
+        for kind in kinds:
+            name = by_interval.get((kind.period or 0) * 1000)
+            if name is not None:
+                self.kinds[kind.kind_id] = name
+
+    def on_candles(self, candles):
+        """Обработчик свечей истории (ответ на gethistorydata)"""
+        if not candles:
+            return
+        name = self.kinds.get(candles[0].period)
+        if name is None:
+            return  # Вид свечей неизвестен или не совпадает ни с одним таймфреймом
+        self.merge_history(candles[0].board, candles[0].seccode, name,
+                           [Bar(c.time, c.open, c.high, c.low, c.close, c.volume or 0) for c in candles])
+
+    def merge_history(self, board, seccode, timeframe, bars, now=None):
+        """Добавляет свечи истории таймфрейма timeframe (см. CandleSeries.merge_history)"""
+        with self._lock:
+            self._series((board, seccode))[timeframe].merge_history(sorted(bars, key=lambda bar: bar.time), now)
+
+    def close_until(self, time):
+        """Закрывает свечи всех бумаг, интервал которых закончился к моменту time (мс)"""
+        closed = []
+        with self._lock:
+            for key, series in self.series.items():
+                for name, s in series.items():
+                    bar = s.close_until(time)
+                    if bar is not None:
+                        closed.append((key, name, bar))
+        self._emit(closed)
+
+    def _emit(self, closed):
+        callback = self.on_bar_closed
+        if callback is None:
+            return
+        for (board, seccode), name, bar in closed:
+            callback(board, seccode, name, bar.copy())
+
+    def bars(self, board, seccode, timeframe, count=None, include_current=True):
+        """Копии последних свечей бумаги (пустой список, если сделок еще не было)"""
+        with self._lock:
+            series = self.series.get((board, seccode))
+            if series is None:
+                return []
+            return series[timeframe].bars(count, include_current)
@@ -0,0 +1,252 @@
+# Сжатый файл записи сырых сообщений Transaq и быстрый чтец с индексом по времени и тегам
+#
+# Формат файла *.tqc:
+#   заголовок файла  — FILE_MAGIC (8 байт)
+#   блоки            — BLOCK_HEADER + сжатые zlib записи
+#   запись в блоке   — RECORD_HEADER (время в нс, код тега, длина) + байты сообщения
+# Рядом лежит индекс *.tqc.idx: по одной строке INDEX_ENTRY на блок (смещение,
+# первое и последнее время, число записей, битовая маска кодов тегов).
+import os  # Для работы с файлами и путями
+import struct  # Для упаковки заголовков
+import threading  # Запись может идти из нескольких потоков-обработчиков
+import time  # Для перевода монотонного времени в настенное
+import zlib  # Сжатие блоков (стандартная библиотека)
+from datetime import datetime  # Для границ выборки по времени
+from xml_stream import sniff_root_tag  # Определение корневого тега по первым байтам
+
+FILE_MAGIC = b"TQCAP1\0\0"
+INDEX_MAGIC = b"TQIDX1\0\0"
+BLOCK_HEADER = struct.Struct("<4sIIIqq")  # b"BLK1", размер до сжатия, после, записей, первое и последнее время
+RECORD_HEADER = struct.Struct("<qHI")     # время в нс, код тега, длина сообщения
+INDEX_ENTRY = struct.Struct("<QqqIQ")     # смещение блока, первое и последнее время, записей, маска тегов
+BLOCK_MAGIC = b"BLK1"
+
+# Коды корневых тегов (0 — тег не из списка или не XML: имя такого тега чтец берет из самого
+# сообщения). Список только дополняется, иначе старые файлы будут читаться неверно.
+# Код 63 и выше в маске делят один бит.
+TAGS = (
+    None, "server_status", "result", "error", "quotes", "alltrades", "quotations", "ticks",
+    "orders", "trades", "positions", "securities", "sec_info", "sec_info_upd", "markets",
+    "boards", "candlekinds", "candles", "client", "union", "overnight", "messages",
+    "news_header", "news_body", "portfolio_tplus", "portfolio_mct", "clientlimits",
+    "max_buy_sell", "current_server", "connector_version", "pits", "leverage_control",
+    "united_portfolio", "united_equity", "mc_portfolio", "united_go", "marketord",
+    "stoporders", "sec_position", "money_position", "forts_position", "forts_money", "forts_collaterals",
+    "spot_limit", "united_limits", "news", "cln_sec_permissions",
+)
+TAG_CODES = {tag.encode("ascii"): code for code, tag in enumerate(TAGS) if tag}
+
+
+def tag_code(tag):
+    """Возвращает код корневого тега (str или bytes)"""
+    if isinstance(tag, str):
+        tag = tag.encode("ascii", "replace")
+    return TAG_CODES.get(tag, 0)
+
+
+def tag_name(code):
+    """Возвращает имя тега по коду (None для неизвестного)"""
+    return TAGS[code] if 0 <= code < len(TAGS) else None
+
+
+def _mask_bit(code):
+    return 1 << min(code, 63)
+
+
+def to_ns(value):
+    """Переводит границу выборки (datetime или секунды эпохи, int или float) в наносекунды эпохи"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1_000_000_000)
+    if isinstance(value, int):
+        return value * 1_000_000_000
+    return int(value * 1_000_000_000)
+
+
+class CaptureWriter:
+    """Пишет сырые сообщения сжатыми блоками и ведет индекс блоков"""
+    def __init__(self, path, block_records=4096, block_bytes=1024 * 1024, level=1):
+        self.path = path
+        self.block_records = block_records  # Блок закрывается по числу записей...
+        self.block_bytes = block_bytes      # ...или по объему до сжатия
+        self.level = level  # Уровень сжатия zlib (1 — быстрее всего)
+        self._lock = threading.Lock()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "ab")  # Дописываем в существующий файл
+        if new_file:
+            self._file.write(FILE_MAGIC)
+        index_path = path + ".idx"
+        new_index = not os.path.exists(index_path) or os.path.getsize(index_path) == 0
+        self._index = open(index_path, "ab")
+        if new_index:
+            self._index.write(INDEX_MAGIC)
+        self._chunks = []  # Записи текущего блока
+        self._size = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._mask = 0
+        self._wall_offset = time.time_ns() - time.monotonic_ns()  # Перевод монотонного времени в настенное
+        self.records = 0  # Счетчики
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def write(self, payload, recv_ns=None, tag=None):
+        """Добавляет сообщение; recv_ns — монотонное время приема (time.monotonic_ns)"""
+        ts = (recv_ns if recv_ns is not None else time.monotonic_ns()) + self._wall_offset
+        code = tag_code(tag) if tag is not None else TAG_CODES.get(sniff_root_tag(payload), 0)
+        with self._lock:
+            self._chunks.append(RECORD_HEADER.pack(ts, code, len(payload)))
+            self._chunks.append(payload)
+            self._size += RECORD_HEADER.size + len(payload)
+            if self._first_ts is None:
+                self._first_ts = self._last_ts = ts
+            elif ts < self._first_ts:  # При нескольких потоках время может прийти не по порядку
+                self._first_ts = ts
+            elif ts > self._last_ts:
+                self._last_ts = ts
+            self._mask |= _mask_bit(code)
+            if len(self._chunks) >= 2 * self.block_records or self._size >= self.block_bytes:
+                self._flush_block()
+
+    def flush(self):
+        """Закрывает текущий блок и сбрасывает файлы на диск"""
+        with self._lock:
+            self._flush_block()
+            self._file.flush()
+            self._index.flush()
+
+    def close(self):
+        """Дописывает последний блок и закрывает файлы"""
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+    def _flush_block(self):
+        """Сжимает накопленные записи в блок и добавляет строку индекса"""
+        if not self._chunks:
+            return
+        raw = b"".join(self._chunks)
+        packed = zlib.compress(raw, self.level)
+        count = len(self._chunks) // 2
+        offset = self._file.tell()
+        self._file.write(BLOCK_HEADER.pack(BLOCK_MAGIC, len(raw), len(packed), count,
+                                           self._first_ts, self._last_ts))
+        self._file.write(packed)
+        self._index.write(INDEX_ENTRY.pack(offset, self._first_ts, self._last_ts, count, self._mask))
+        self.records += count
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(packed)
+        self._chunks = []
+        self._size = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._mask = 0
+
+
+class CaptureReader:
+    """Читает файл записи, пропуская блоки, которые не попадают в выборку по индексу"""
+    def __init__(self, path):
+        self.path = path
+        self.blocks = self._load_index()  # Список (смещение, первое время, последнее, записей, маска)
+
+    def _load_index(self):
+        """Читает индекс; если его нет или он поврежден — восстанавливает по заголовкам блоков"""
+        index_path = self.path + ".idx"
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                data = f.read()
+            if data[:len(INDEX_MAGIC)] == INDEX_MAGIC:
+                body = memoryview(data)[len(INDEX_MAGIC):]
+                body = body[:len(body) - len(body) % INDEX_ENTRY.size]  # Обрезаем недописанную строку
+                return list(INDEX_ENTRY.iter_unpack(body))
+        return self.rebuild_index()
+
+    def rebuild_index(self):
+        """Строит индекс проходом по блокам файла (маску тегов без индекса можно узнать только распаковкой)"""
+        blocks = []
+        with open(self.path, "rb") as f:
+            if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                raise ValueError(f"Не файл записи Transaq: {self.path}")
+            while True:
+                offset = f.tell()
+                header = f.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    break
+                magic, raw_len, comp_len, count, first_ts, last_ts = BLOCK_HEADER.unpack(header)
+                if magic != BLOCK_MAGIC:
+                    break
+                packed = f.read(comp_len)
+                if len(packed) < comp_len:  # Недописанный блок в конце файла
+                    break
+                mask = 0
+                for _, code, _ in self._iter_records(zlib.decompress(packed)):
+                    mask |= _mask_bit(code)
+                blocks.append((offset, first_ts, last_ts, count, mask))
+        return blocks
+
+    @staticmethod
+    def _iter_records(raw):
+        """Перебирает записи распакованного блока: (время, код тега, memoryview сообщения)"""
+        view = memoryview(raw)
+        pos = 0
+        size = len(raw)
+        unpack = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        while pos < size:
+            ts, code, length = unpack(raw, pos)
+            pos += header_size
+            yield ts, code, view[pos:pos + length]
+            pos += length
+
+    def read(self, start=None, end=None, tags=None, start_ns=None, end_ns=None):
+        """Выдает (время в нс, тег, bytes) для сообщений в интервале [start, end] с нужными тегами
+
+        start и end — datetime или секунды эпохи (int или float, как time.time()). Точные
+        границы в наносекундах (как время записей) передаются в start_ns и end_ns.
+        Тег сообщения с кодом 0 (не из TAGS) определяется по его корневому элементу; None — не XML.
+        """
+        if start is not None:
+            start_ns = to_ns(start)
+        if end is not None:
+            end_ns = to_ns(end)
+        codes = None
+        unknown = None  # Нужные теги не из TAGS (bytes): ищутся среди записей с кодом 0
+        mask = 0
+        if tags is not None:
+            codes = set()
+            unknown = set()
+            for tag in tags:
+                code = tag_code(tag)
+                codes.add(code)
+                if not code:
+                    unknown.add(tag.encode("ascii", "replace") if isinstance(tag, str) else tag)
+            for code in codes:
+                mask |= _mask_bit(code)
+        with open(self.path, "rb") as f:
+            for offset, first_ts, last_ts, count, block_mask in self.blocks:
+                if start_ns is not None and last_ts < start_ns:
+                    continue  # Блок целиком раньше интервала
+                if end_ns is not None and first_ts > end_ns:
+                    continue  # Блок целиком позже интервала
+                if codes is not None and not block_mask & mask:
+                    continue  # В блоке нет нужных тегов
+                f.seek(offset)
+                header = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                raw = zlib.decompress(f.read(header[2]))
+                for ts, code, payload in self._iter_records(raw):
+                    if codes is not None and code not in codes:
+                        continue
+                    if (start_ns is not None and ts < start_ns) or (end_ns is not None and ts > end_ns):
+                        continue
+                    if code:
+                        yield ts, tag_name(code), payload.tobytes()
+                        continue
+                    data = payload.tobytes()
+                    tag = sniff_root_tag(data)
+                    if unknown is not None and tag not in unknown:
+                        continue
+                    yield ts, tag.decode("ascii", "replace") if tag is not None else None, data
+
+    def __iter__(self):
+        return self.read()
@@ -0,0 +1,272 @@
+# Асинхронная отправка команд: отдельный поток-отправитель, futures и сопоставление ответов
+#
+#   future = pipeline.submit(b'<command id="neworder">...</command>', timeout=5, confirm=True)
+#   result = future.result()                       # из обычного потока
+#   result = await pipeline.submit_async(command)  # из asyncio
+#
+# SendCommand в DLL синхронный, поэтому команды отправляются по одной из потока-отправителя,
+# а вызывающий поток (например, поток интерфейса) не ждет ответа DLL. Для команд с
+# confirm=True future завершается только после первого <orders> с тем же transactionid;
+# таких команд в ожидании может быть сколько угодно. Порядок отправки и частоту команд
+# определяет планировщик (command_scheduler.py).
+#
+# Срок команды (timeout) отсчитывается от постановки в очередь и охватывает все: ожидание
+# в очереди планировщика, SendCommand и ожидание подтверждения. Сроки проверяет отдельный
+# поток, поэтому future завершается с timed_out=True, даже если SendCommand завис:
+# команда, срок которой истек в очереди, удаляется из нее и не отправляется.
+import heapq  # Сроки ожидания подтверждений
+import itertools  # Номера запросов
+import logging  # Для ведения логов
+import threading  # Поток-отправитель
+import time  # Для сроков ожидания
+from concurrent.futures import Future, InvalidStateError  # Результат команды для любого потока
+from command_scheduler import CommandScheduler  # Очередь команд с лимитами и приоритетами
+from xml_stream import root_tag, root_attrib, parse_root, ParseError  # Разбор ответа на команду
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+NO_REPLY = "Нет ответа"  # Причина неудачи, если SendCommand вернул NULL
+
+
+class CommandResult:
+    """Итог команды: ответ SendCommand и, для confirm=True, первая запись Order"""
+    __slots__ = ("request_id", "success", "transactionid", "message", "raw", "order", "elapsed", "queued",
+                 "timed_out", "superseded_by")
+
+    def __init__(self, request_id, success=False, transactionid=None, message=None, raw=None):
+        self.request_id = request_id
+        self.success = success
+        self.transactionid = transactionid
+        self.message = message  # Текст ошибки сервера или причина неудачи
+        self.raw = raw  # Ответ SendCommand (bytes)
+        self.order = None  # Order с тем же transactionid (только при confirm=True)
+        self.elapsed = None  # Секунд от постановки в очередь до результата
+        self.queued = None  # Из них секунд в очереди планировщика
+        self.timed_out = False
+        self.superseded_by = None  # request_id более новой moveorder, заменившей эту в очереди
+
+    def __repr__(self):
+        return (f"CommandResult(request_id={self.request_id}, success={self.success}, "
+                f"transactionid={self.transactionid}, message={self.message!r}, timed_out={self.timed_out})")
+
+
+def parse_result(request_id, raw):
+    """Разбирает ответ SendCommand (<result .../> или <error>...</error>)"""
+    if raw is None:
+        return CommandResult(request_id, False, message=NO_REPLY)
+    try:
+        tag = root_tag(raw)
+        if tag == "error":
+            return CommandResult(request_id, False, message=parse_root(raw).text, raw=raw)
+        attrib = root_attrib(raw)
+        success = attrib.get("success") == "true"
+        transactionid = attrib.get("transactionid")
+        result = CommandResult(request_id, success, int(transactionid) if transactionid else None, raw=raw)
+        if not success:
+            result.message = parse_root(raw).findtext("message")
+        return result
+    except (ParseError, ValueError):
+        return CommandResult(request_id, False, message=raw[:200].decode("utf-8", "replace"), raw=raw)
+
+
+class CommandPipeline:
+    """Очередь команд с потоком-отправителем и сопоставлением ответов по transactionid"""
+    def __init__(self, send, on_finished=None, default_timeout=30.0, scheduler=None):
+        self.send = send  # send(bytes) -> bytes | None, например Transport.send_command
+        self.on_finished = on_finished  # f(request_id, CommandResult), вызывается в потоке-отправителе
+        self.default_timeout = default_timeout  # Сколько ждать подтверждения (секунд)
+        self.scheduler = scheduler if scheduler is not None else CommandScheduler()  # Очередь к отправителю
+        self._ids = itertools.count(1)
+        self._awaiting = {}  # transactionid -> (future, result, начало)
+        self._queued = {}  # request_id -> элемент планировщика (команда еще не отправлена)
+        self._deadlines = []  # Куча (срок, request_id) всех незавершенных команд
+        self._current = None  # Элемент, который сейчас в send
+        self._sending = False  # Поток-отправитель внутри send
+        self._early = {}  # transactionid -> Order, пришедший раньше, чем send вернул ответ
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)  # Будит поток сроков при новом, более раннем сроке
+        self._thread = None
+        self._watchdog = None
+        self._stopping = False
+        self.sent = 0  # Счетчики
+        self.timeouts = 0
+
+    def start(self):
+        """Запускает поток-отправитель (вызывается автоматически при первой команде)"""
+        with self._lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="CommandSender", daemon=True)
+                self._thread.start()
+                self._watchdog = threading.Thread(target=self._watch, name="CommandDeadlines", daemon=True)
+                self._watchdog.start()
+
+    def stop(self, timeout=5.0):
+        """Останавливает поток-отправитель после уже поставленных команд"""
+        thread = self._thread
+        if thread is not None:
+            self.scheduler.close()
+            thread.join(timeout)
+            with self._wake:
+                self._stopping = True
+                self._wake.notify()
+            self._watchdog.join(timeout)
+            self._thread = None
+            self._watchdog = None
+
+    def submit(self, command, timeout=None, confirm=False):
+        """Ставит команду (str или bytes) в очередь и возвращает concurrent.futures.Future
+
+        Future всегда завершается CommandResult (ошибки и истечение срока — success=False).
+        У future есть атрибут request_id. Если moveorder той же заявки еще стоит в очереди,
+        она заменяется этой, а ее future сразу завершается с superseded_by.
+        """
+        if isinstance(command, str):
+            command = command.encode("utf-8")  # Кодируем один раз, DLL получит эти же байты
+        if self._thread is None:
+            self.start()
+        future = Future()
+        future.request_id = next(self._ids)
+        started = time.monotonic()
+        item = (future, command, timeout if timeout is not None else self.default_timeout, confirm, started)
+        with self._wake:
+            self._queued[future.request_id] = item
+            heapq.heappush(self._deadlines, (started + item[2], future.request_id))
+            if self._deadlines[0][1] == future.request_id:
+                self._wake.notify()  # Новый самый ранний срок
+        replaced = self.scheduler.put(command, item)
+        if replaced is not None:
+            old_future, _, _, _, started = replaced
+            with self._lock:
+                self._queued.pop(old_future.request_id, None)
+            result = CommandResult(old_future.request_id, False, message="Заменена более новой moveorder")
+            result.superseded_by = future.request_id
+            self._finish(old_future, result, started)
+        return future
+
+    def submit_async(self, command, timeout=None, confirm=False):
+        """То же, что submit, но возвращает asyncio.Future (вызывать из потока цикла событий)"""
+        import asyncio  # Только для вызова из asyncio: остальным программам не нужен
+        return asyncio.wrap_future(self.submit(command, timeout, confirm))
+
+    def on_orders(self, orders):
+        """Обработчик записей Order: завершает команды, ждущие подтверждения"""
+        if not self._awaiting and not self._sending:
+            return
+        for order in orders:
+            with self._lock:
+                waiting = self._awaiting.pop(order.transactionid, None)
+                if waiting is None and self._sending:  # Callback DLL может опередить ответ SendCommand
+                    self._early.setdefault(order.transactionid, order)
+            if waiting is not None:
+                future, result, started = waiting
+                result.order = order
+                self._finish(future, result, started)
+
+    def cancel_pending(self, message="Соединение закрыто"):
+        """Завершает все ждущие подтверждения команды неудачей (например, при отключении)"""
+        with self._lock:
+            waiting = list(self._awaiting.values())
+            self._awaiting.clear()
+        for future, result, started in waiting:
+            result.success = False
+            result.message = message
+            self._finish(future, result, started)
+
+    def pending(self):
+        """Сколько команд ждут подтверждения"""
+        return len(self._awaiting)
+
+    def _run(self):
+        """Цикл потока-отправителя: команды по одной"""
+        while True:
+            item = self.scheduler.get()
+            if item is None:
+                break
+            future, command, timeout, confirm, started = item
+            with self._lock:
+                if self._queued.pop(future.request_id, None) is None or future.done():
+                    continue  # Срок истек в очереди, команда заменена или отменена
+                self._current = item
+                self._sending = True
+            queued = time.monotonic() - started
+            try:
+                raw = self.send(command)
+                self.sent += 1
+                result = parse_result(future.request_id, raw)
+            except Exception as e:
+                logger.error(f"Ошибка при отправке команды: {e}")
+                result = CommandResult(future.request_id, False, message=str(e))
+            result.queued = queued
+            wait = confirm and result.success and result.transactionid is not None
+            with self._lock:
+                self._sending = False
+                self._current = None
+                early = self._early.pop(result.transactionid, None) if wait else None
+                self._early.clear()
+                if future.done():  # Срок истек, пока SendCommand не отвечал
+                    logger.warning(f"Ответ на команду {future.request_id} пришел после истечения срока: "
+                                   f"success={result.success}, transactionid={result.transactionid}")
+                    continue
+                if wait and early is None:  # Ждем <orders> с этим transactionid
+                    self._awaiting[result.transactionid] = (future, result, started)
+                    continue
+            result.order = early
+            self._finish(future, result, started)
+
+    def _watch(self):
+        """Цикл потока сроков: завершает команды, срок которых истек, где бы они ни были"""
+        with self._wake:
+            while not self._stopping:
+                wait = self._deadlines[0][0] - time.monotonic() if self._deadlines else None
+                if wait is None or wait > 0:
+                    self._wake.wait(wait)
+                    continue
+                self._wake.release()
+                try:
+                    self._expire()
+                finally:
+                    self._wake.acquire()
+
+    def _expire(self):
+        """Завершает команды с истекшим сроком: в очереди, в SendCommand и в ожидании подтверждения"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, request_id = heapq.heappop(self._deadlines)
+                item = self._queued.pop(request_id, None)
+                if item is not None:  # Еще в очереди планировщика: не отправляем
+                    self.scheduler.discard(item)
+                    expired.append((item[0], CommandResult(request_id), item[4], "Не отправлена в срок"))
+                    continue
+                current = self._current
+                if current is not None and current[0].request_id == request_id:
+                    expired.append((current[0], CommandResult(request_id), current[4], "SendCommand не ответил в срок"))
+                    continue
+                for transactionid, (future, result, started) in self._awaiting.items():
+                    if future.request_id == request_id:
+                        del self._awaiting[transactionid]
+                        expired.append((future, result, started, "Нет подтверждения в срок"))
+                        break
+        for future, result, started, message in expired:
+            if future.done():
+                continue
+            self.timeouts += 1
+            result.success = False
+            result.timed_out = True
+            result.message = message
+            self._finish(future, result, started)
+
+    def _finish(self, future, result, started):
+        result.elapsed = time.monotonic() - started
+        try:
+            future.set_result(result)
+        except InvalidStateError:  # Уже завершена (отменена вызывающим кодом)
+            return
+        callback = self.on_finished
+        if callback is not None:
+            try:
+                callback(result.request_id, result)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика результата команды: {e}", exc_info=True)
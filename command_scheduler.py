@@ -0,0 +1,251 @@
+# Планировщик исходящих команд: лимиты по типам команд, приоритеты и склейка moveorder
+#
+#   scheduler = CommandScheduler(limits={"transactions": (10, 10), "subscribe": (5, 5)})
+#   pipeline = CommandPipeline(transport.send_command, scheduler=scheduler)
+#   logger.info(scheduler.format_report())
+#
+# Брокер ограничивает частоту транзакционных команд, и превышение лимита заканчивается
+# отказом. Каждая команда перед отправкой берет токен из корзины своего типа и, если это
+# транзакция, из общей корзины "transactions". Команды стоят в очередях по приоритету:
+# снятие заявок, затем выставление и изменение, затем подписки и запросы данных. Если
+# команда с высоким приоритетом ждет токен, менее важные команды из других корзин уходят,
+# а из той же корзины — нет (чтобы не забирать у нее токены).
+import queue  # Исключение Empty, как у queue.Queue
+import re  # Тип команды и transactionid по байтам команды
+import threading  # Очереди общие для потока-отправителя и вызывающих потоков
+import time  # Для пополнения корзин и задержек
+from collections import deque  # Очередь одного приоритета
+from latency import Histogram  # Гистограмма задержек в очереди
+
+CANCEL, TRADE, DATA = 0, 1, 2  # Приоритеты: меньше — раньше
+PRIORITIES = {
+    "cancelorder": CANCEL, "cancelstoporder": CANCEL, "cancelnegdeal": CANCEL, "cancelreport": CANCEL,
+    "neworder": TRADE, "newstoporder": TRADE, "newcondorder": TRADE, "moveorder": TRADE, "newrpsorder": TRADE,
+    "subscribe": DATA, "unsubscribe": DATA, "subscribe_ticks": DATA, "gethistorydata": DATA,
+    "get_securities": DATA, "get_forts_positions": DATA, "get_client_limits": DATA, "get_portfolio": DATA,
+    "get_markets": DATA, "get_servtime_difference": DATA, "get_connector_version": DATA,
+}
+DEFAULT_PRIORITY = TRADE  # Остальные команды (connect, disconnect, change_pass...)
+TRANSACTIONS = frozenset(("neworder", "newstoporder", "newcondorder", "moveorder", "newrpsorder",
+                          "cancelorder", "cancelstoporder", "cancelnegdeal", "cancelreport"))
+# Лимиты по умолчанию: имя -> (токенов в секунду, запас). Имя — тип команды или "transactions"
+# (все транзакции вместе). Подберите под лимиты своего брокера.
+DEFAULT_LIMITS = {"transactions": (10.0, 10), "subscribe": (5.0, 5), "unsubscribe": (5.0, 5),
+                  "gethistorydata": (5.0, 5)}
+
+_COMMAND_ID_RE = re.compile(rb'<command\s+id\s*=\s*["\']([\w-]+)')
+_TRANSACTIONID_RE = re.compile(rb"<transactionid>\s*(\d+)\s*</transactionid>")
+
+
+def command_id(command):
+    """Тип команды (атрибут id) по байтам команды или None"""
+    match = _COMMAND_ID_RE.search(command, 0, 200)
+    return match.group(1).decode("ascii") if match else None
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, в запасе не больше burst"""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.burst  # Сразу после запуска можно отправить burst команд подряд
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Сколько секунд до появления целого токена (0 — есть сейчас)"""
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.updated = now
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1.0
+
+
+class _Entry:
+    """Команда в очереди планировщика"""
+    __slots__ = ("name", "buckets", "item", "enqueued", "transactionid", "throttled")
+
+    def __init__(self, name, buckets, item, enqueued, transactionid=None):
+        self.name = name
+        self.buckets = buckets
+        self.item = item  # То, что вернет get (у CommandPipeline — кортеж с future)
+        self.enqueued = enqueued  # monotonic_ns постановки в очередь
+        self.transactionid = transactionid  # Для склейки moveorder
+        self.throttled = False  # Ждала ли команда токен
+
+
+class CommandScheduler:
+    """Очередь команд с лимитами частоты и приоритетами (замена queue.Queue для CommandPipeline)"""
+    def __init__(self, limits=None, priorities=None, coalesce=True):
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)  # Имя -> (в секунду, запас)
+        self.priorities = dict(PRIORITIES, **(priorities or {}))
+        self.coalesce = coalesce  # Склеивать moveorder одной заявки, еще не ушедшие на сервер
+        self.buckets = {name: TokenBucket(rate, burst) for name, (rate, burst) in self.limits.items()}
+        self._lanes = [deque() for _ in range(DATA + 1)]
+        self._moves = {}  # transactionid -> _Entry moveorder в очереди
+        self._closed = False
+        self._cond = threading.Condition()
+        self.delays = {}  # Тип команды -> Histogram задержки в очереди (нс)
+        self.throttled = {}  # Тип команды -> сколько команд ждали токен
+        self.coalesced = 0  # Сколько moveorder заменено более новыми
+
+    def __len__(self):
+        return sum(len(lane) for lane in self._lanes)
+
+    def _buckets_for(self, name):
+        buckets = []
+        bucket = self.buckets.get(name)
+        if bucket is not None:
+            buckets.append(bucket)
+        if name in TRANSACTIONS:
+            bucket = self.buckets.get("transactions")
+            if bucket is not None:
+                buckets.append(bucket)
+        return tuple(buckets)
+
+    def put(self, command, item):
+        """Ставит item команды command (bytes) в очередь
+
+        Если в очереди уже есть moveorder той же заявки, ее item заменяется новым
+        (место в очереди сохраняется); тогда возвращается замененный item, иначе None.
+        """
+        name = command_id(command)
+        transactionid = None
+        if name == "moveorder" and self.coalesce:
+            match = _TRANSACTIONID_RE.search(command)
+            if match is not None:
+                transactionid = int(match.group(1))
+        with self._cond:
+            if transactionid is not None:
+                entry = self._moves.get(transactionid)
+                if entry is not None:
+                    replaced = entry.item
+                    entry.item = item
+                    entry.enqueued = time.monotonic_ns()  # Задержка считается для новой команды
+                    self.coalesced += 1
+                    return replaced
+            entry = _Entry(name, self._buckets_for(name), item, time.monotonic_ns(), transactionid)
+            self._lanes[self.priorities.get(name, DEFAULT_PRIORITY)].append(entry)
+            if transactionid is not None:
+                self._moves[transactionid] = entry
+            self._cond.notify()
+        return None
+
+    def discard(self, item):
+        """Убирает из очереди команду с этим item (например, срок которой истек); True, если нашлась"""
+        with self._cond:
+            for lane in self._lanes:
+                for entry in lane:
+                    if entry.item is item:
+                        lane.remove(entry)
+                        if entry.transactionid is not None:
+                            self._moves.pop(entry.transactionid, None)
+                        self._cond.notify()  # Очередь могла опустеть после close()
+                        return True
+        return False
+
+    def close(self):
+        """get вернет None, когда очередь опустеет (как queue.put(None))"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Следующая команда, которую можно отправить сейчас, не нарушая лимитов
+
+        Ждет не дольше timeout секунд и выбрасывает queue.Empty. После close() и
+        опустевшей очереди возвращает None.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                entry, wait = self._pick(now)
+                if entry is not None:
+                    self._record(entry.name, entry.enqueued)
+                    return entry.item
+                if self._closed and not len(self):
+                    self._closed = False
+                    return None
+                if deadline is not None:
+                    left = deadline - now
+                    if left <= 0:
+                        raise queue.Empty
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+
+    def _pick(self, now):
+        """Первая по приоритету команда с токенами; иначе (None, сколько ждать токен)"""
+        blocked = set()  # Корзины, которых ждут более важные команды
+        wait = None
+        for lane in self._lanes:
+            if not lane:
+                continue
+            entry = lane[0]
+            need = 0.0
+            for bucket in entry.buckets:
+                need = max(need, bucket.wait_time(now))
+            if not need and blocked.isdisjoint(entry.buckets):
+                lane.popleft()
+                for bucket in entry.buckets:
+                    bucket.take()
+                if entry.transactionid is not None:
+                    self._moves.pop(entry.transactionid, None)
+                return entry, None
+            if need:
+                if not entry.throttled:
+                    entry.throttled = True
+                    self.throttled[entry.name] = self.throttled.get(entry.name, 0) + 1
+                wait = need if wait is None else min(wait, need)
+            blocked.update(entry.buckets)
+        return None, wait
+
+    def acquire(self, command):
+        """Ждет токены для команды, отправляемой в обход очереди (своим отправителем, не CommandPipeline)"""
+        name = command_id(command)
+        buckets = self._buckets_for(name)
+        if not buckets:
+            return
+        enqueued = time.monotonic_ns()
+        throttled = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(bucket.wait_time(now) for bucket in buckets)
+                if not wait:
+                    for bucket in buckets:
+                        bucket.take()
+                    self._record(name, enqueued)
+                    return
+                if not throttled:
+                    throttled = True
+                    self.throttled[name] = self.throttled.get(name, 0) + 1
+                self._cond.wait(wait)
+
+    def _record(self, name, enqueued):
+        histogram = self.delays.get(name)
+        if histogram is None:
+            histogram = self.delays[name] = Histogram()
+        histogram.record(time.monotonic_ns() - enqueued)
+
+    def report(self):
+        """Возвращает {тип команды: {count, throttled, p50, p99, max}} с задержками в очереди в мс"""
+        with self._cond:
+            return {name: {"count": histogram.count,
+                           "throttled": self.throttled.get(name, 0),
+                           "p50": histogram.percentile(50) / 1e6,
+                           "p99": histogram.percentile(99) / 1e6,
+                           "max": histogram.max / 1e6}
+                    for name, histogram in self.delays.items()}
+
+    def format_report(self):
+        """Отчет в виде текста: строка на каждый тип команды"""
+        lines = [f"{'команда':<20}{'count':>8}{'ждали':>8}{'p50 мс':>10}{'p99 мс':>10}{'max мс':>10}"]
+        for name, s in sorted(self.report().items(), key=lambda item: str(item[0])):
+            lines.append(f"{name or '?':<20}{s['count']:>8}{s['throttled']:>8}{s['p50']:>10.1f}{s['p99']:>10.1f}"
+                         f"{s['max']:>10.1f}")
+        lines.append(f"Склеено moveorder: {self.coalesced}, в очереди: {len(self)}")
+        return "\n".join(lines)
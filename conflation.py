@@ -0,0 +1,172 @@
+# Слияние обновлений для медленных потребителей: вместо каждого обновления — последнее состояние
+#
+#   conflator = Conflator()
+#   conflator.attach(connector)             # quotes, quotations — слияние; alltrades, orders, trades — без потерь
+#   for tag, records in conflator.poll(timeout=1.0):    # в потоке потребителя, в своем темпе
+#       ...
+#   conflator.start(on_batches, interval=0.1)           # или в своем потоке: on_batches([(tag, records)])
+#   conflator.report()                      # {(board, seccode): {"received", "delivered", "ratio"}}
+#
+# Пока потребитель занят, обновления одного уровня стакана (board, seccode, price, source) и
+# котировки одного инструмента (board, seccode) сливаются: поля нового обновления ложатся
+# поверх прежних, непришедшие поля (None) остаются от прежних. Удаление уровня (buy/sell = -1)
+# тоже доходит до потребителя, если после него уровень не появился снова. Сделки и заявки
+# не сливаются и приходят все, по порядку, перед свежим состоянием стаканов и котировок.
+# Чем медленнее потребитель, тем больше обновлений сливается; потоки-обработчики коннектора
+# его не ждут. Политика COALESCE очереди (ingest_queue.py) заменяет только целые сообщения-
+# снимки; стаканы и котировки приходят разницами, поэтому сливаются здесь, уже разобранными.
+import logging  # Для ведения логов
+import threading  # Обработчики пишут из своих потоков, потребитель читает из своего
+from functools import partial  # Обработчик сообщений без слияния для каждого тега
+from operator import attrgetter  # Ключ уровня стакана
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+
+def _whole(record):
+    """Ключ для котировки: одна запись на инструмент"""
+    return None
+
+
+CONFLATED = {"quotes": attrgetter("price", "source"), "quotations": _whole}  # Тег -> ключ записи внутри инструмента
+LOSSLESS = ("alltrades", "orders", "trades")  # Эти сообщения приходят все
+
+
+def merge(old, new):
+    """Новая запись: поля new поверх полей old (None в new — поле не менялось). Записи не изменяются"""
+    cls = type(new)
+    merged = cls.__new__(cls)
+    for name in cls.__slots__:
+        value = getattr(new, name)
+        setattr(merged, name, getattr(old, name) if value is None else value)
+    return merged
+
+
+class Conflator:
+    """Очередь между коннектором и медленным потребителем со слиянием стаканов и котировок"""
+    def __init__(self, conflated=CONFLATED, lossless=LOSSLESS):
+        self.conflated = dict(conflated)
+        self.lossless = tuple(lossless)
+        self._pending = {}  # Тег -> {(board, seccode): {ключ записи: запись}}
+        self._queue = []  # [(тег, записи)] сообщений без слияния
+        self._received = {}  # (board, seccode) -> записей пришло
+        self._delivered = {}  # (board, seccode) -> записей отдано потребителю
+        self.passed = 0  # Записей без слияния отдано потребителю
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def attach(self, connector):
+        """Подписывается на записи коннектора"""
+        for tag in self.conflated:
+            connector.add_record_handler(tag, partial(self.on_conflated, tag))
+        for tag in self.lossless:
+            connector.add_record_handler(tag, partial(self.on_lossless, tag))
+
+    def on_conflated(self, tag, records):
+        """Обработчик записей, которые сливаются (вызывается в потоке-обработчике)"""
+        record_key = self.conflated[tag]
+        with self._cond:
+            instruments = self._pending.get(tag)
+            if instruments is None:
+                instruments = self._pending[tag] = {}
+            received = self._received
+            for record in records:
+                key = (record.board, record.seccode)
+                latest = instruments.get(key)
+                if latest is None:
+                    latest = instruments[key] = {}
+                level = record_key(record)
+                old = latest.get(level)
+                latest[level] = record if old is None else merge(old, record)
+                received[key] = received.get(key, 0) + 1
+            self._cond.notify()
+
+    def on_lossless(self, tag, records):
+        """Обработчик записей без слияния (вызывается в потоке-обработчике)"""
+        with self._cond:
+            self._queue.append((tag, records))
+            self._cond.notify()
+
+    def poll(self, timeout=None):
+        """Ждет обновлений (не дольше timeout) и отдает [(тег, записи)]: сначала без слияния, потом слитые
+
+        Слитые записи одного тега отдаются одной пачкой по всем инструментам. Пустой список — за
+        timeout ничего не пришло.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self._pending, timeout):
+                return []
+            batches, self._queue = self._queue, []
+            pending, self._pending = self._pending, {}
+            delivered = self._delivered
+            for instruments in pending.values():
+                for key, latest in instruments.items():
+                    delivered[key] = delivered.get(key, 0) + len(latest)
+            self.passed += sum(len(records) for _, records in batches)
+        for tag, instruments in pending.items():  # Записи собираются уже без блокировки
+            batches.append((tag, [record for latest in instruments.values() for record in latest.values()]))
+        return batches
+
+    # --- Поток потребителя ---
+
+    def start(self, callback, interval=0.0):
+        """Отдает обновления callback([(тег, записи)]) в отдельном потоке, не чаще раза в interval секунд"""
+        self.stop()
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                batches = self.poll(0.5)
+                if not batches:
+                    continue
+                try:
+                    callback(batches)
+                except Exception as e:
+                    logger.error(f"Ошибка потребителя обновлений: {e}", exc_info=True)
+                if interval:
+                    self._stop.wait(interval)  # Пока ждем, обновления копятся и сливаются
+
+        self._thread = threading.Thread(target=loop, name="Conflator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток потребителя"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    # --- Статистика ---
+
+    def report(self):
+        """{(board, seccode): {"received", "delivered", "ratio"}} — ratio: сколько обновлений слито в одно"""
+        with self._cond:
+            received = dict(self._received)
+            delivered = dict(self._delivered)
+        result = {}
+        for key, count in received.items():
+            out = delivered.get(key, 0)
+            result[key] = {"received": count, "delivered": out, "ratio": count / out if out else None}
+        return result
+
+    def format_report(self, limit=20):
+        """Отчет в виде текста: инструменты с наибольшим слиянием"""
+        rows = sorted(self.report().items(), key=lambda item: -(item[1]["ratio"] or 0))[:limit]
+        lines = [f"{'инструмент':<24}{'пришло':>10}{'отдано':>10}{'слияние':>10}"]
+        for (board, seccode), s in rows:
+            ratio = f"{s['ratio']:.1f}" if s["ratio"] is not None else "—"
+            name = f"{board}/{seccode}"
+            lines.append(f"{name:<24}{s['received']:>10}{s['delivered']:>10}{ratio:>10}")
+        return "\n".join(lines)
+
+    def stats(self):
+        """Общие счетчики: записи без слияния, ожидающие инструменты и сообщения"""
+        with self._cond:
+            return {
+                "passed": self.passed,
+                "queued": len(self._queue),
+                "pending_instruments": sum(len(instruments) for instruments in self._pending.values()),
+                "received": sum(self._received.values()),
+                "delivered": sum(self._delivered.values()),
+            }
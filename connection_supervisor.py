@@ -0,0 +1,324 @@
+# Автоматическое переподключение: слежение за <server_status>, повтор с задержкой, резервные адреса
+#
+#   supervisor = ConnectionSupervisor()
+#   supervisor.attach(connector)
+#   supervisor.start([("tr1.finam.ru", 3900), ("tr2.finam.online", 3900)], login, password)
+#   supervisor.stop()      # перед connector.uninitialize(), чтобы отключение не считалось сбоем
+#
+# После connected="false" или "error" супервизор ждет (задержка растет после каждого круга
+# по всем адресам, со случайным разбросом, чтобы клиенты не переподключались одновременно)
+# и подключается к лучшему адресу: сначала к адресам без недавних сбоев, среди них — к
+# самому быстрому по времени TCP-соединения. Пока коннектор сам восстанавливает связь
+# (recover="true"), супервизор ждет не дольше recover_timeout. Вся работа идет в потоках
+# таймеров и потоках-обработчиках коннектора, поток интерфейса не ждет.
+#
+# Ошибки, которые повтор не исправит (неверный логин или пароль, заблокированный счет,
+# неверные параметры подключения — см. FATAL_PATTERNS), останавливают повторы: состояние
+# становится FAILED, причина — в last_error, и вызывается on_fatal. Повторы продолжатся
+# после нового start с исправленными данными.
+import logging  # Для ведения логов
+import random  # Разброс задержки
+import re  # Распознавание ошибок входа и настройки
+import socket  # Замер времени TCP-соединения с адресом
+import threading  # Таймеры повторов и сроков
+import time  # Для замера времени
+from concurrent.futures import ThreadPoolExecutor  # Параллельный замер адресов
+from xml.sax.saxutils import escape  # Экранирование логина и пароля
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+CONNECT_OPTIONS = {"language": "ru", "autopos": "true", "milliseconds": "true", "utc_time": "true"}
+IDLE, CONNECTING, CONNECTED, RECOVERING, WAITING = "idle", "connecting", "connected", "recovering", "waiting"
+FAILED = "failed"  # Ошибка входа или настройки: повторов нет до нового start
+# Тексты ошибок сервера и DLL, при которых повторять подключение бессмысленно
+# Только фразы об отказе во входе: упоминание логина или пароля в тексте другой ошибки
+# (например, "сервер входа недоступен") не должно останавливать повторы
+FATAL_PATTERNS = (
+    r"неверн\w* (?:логин|идентификатор|имя пользователя|пароль)", r"(?:логин|идентификатор) или пароль неверн",
+    r"(?:wrong|invalid|incorrect|bad) (?:login|user ?name|user ?id|password|credentials)",
+    r"(?:login|user ?name) or password (?:is )?(?:wrong|invalid|incorrect)",
+    r"истек\w* срок действия пароля", r"пароль (?:устарел|истек)", r"password (?:has )?expired",
+    r"(?:пользовател\w*|учетн\w* запис\w*|сч[её]т\w*|клиент\w*) заблокирова",
+    r"(?:user|account|client) (?:is |has been )?(?:blocked|locked)",
+    r"доступ запрещ", r"access denied",
+    r"сертификат\w* (?:не найден|недействител|отозван|истек)", r"certificate (?:not found|is invalid|revoked|expired)",
+    r"неверн\w* (?:параметр|формат|значени|адрес|порт)", r"invalid (?:parameter|format|value|host|port)",
+    r"не указан\w* (?:логин|пароль|адрес|порт|сервер)",
+)
+EWMA_ALPHA = 0.3  # Вес нового замера в скользящем среднем
+
+
+def build_connect_command(login, password, host, port, **options):
+    """Команда connect (bytes); options дополняют или заменяют CONNECT_OPTIONS (None — убрать элемент)"""
+    fields = {"login": login, "password": password, "host": host, "port": port}
+    fields.update(CONNECT_OPTIONS)
+    fields.update(options)
+    body = "".join(f"<{name}>{escape(str(value))}</{name}>" for name, value in fields.items() if value is not None)
+    return f'<command id="connect">{body}</command>'.encode("utf-8")
+
+
+def is_fatal(text, patterns=FATAL_PATTERNS):
+    """True, если ошибка подключения не исправится повтором (вход или настройка)"""
+    if not text:
+        return False
+    return any(re.search(pattern, text, re.IGNORECASE) for pattern in patterns)
+
+
+def _ewma(old, value):
+    return value if old is None else old + EWMA_ALPHA * (value - old)
+
+
+class Endpoint:
+    """Адрес сервера и его статистика"""
+    __slots__ = ("host", "port", "rtt", "connect_time", "failures", "successes", "last_failure")
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = int(port)
+        self.rtt = None  # Среднее время TCP-соединения, с (None — не замерено или недоступен)
+        self.connect_time = None  # Среднее время от команды connect до connected="true", с
+        self.failures = 0  # Сбоев подряд
+        self.successes = 0
+        self.last_failure = None  # Текст последнего сбоя
+
+    def probe(self, timeout=3.0):
+        """Замеряет время TCP-соединения (в потоке вызывающего); возвращает секунды или None"""
+        started = time.monotonic()
+        try:
+            with socket.create_connection((self.host, self.port), timeout):
+                elapsed = time.monotonic() - started
+        except OSError:
+            self.rtt = None
+            return None
+        self.rtt = _ewma(self.rtt, elapsed)
+        return elapsed
+
+    def __repr__(self):
+        rtt = f"{self.rtt * 1000:.1f} мс" if self.rtt is not None else "?"
+        connect_time = f"{self.connect_time:.2f} с" if self.connect_time is not None else "?"
+        return (f"Endpoint({self.host}:{self.port}, rtt={rtt}, connect={connect_time}, "
+                f"failures={self.failures}, successes={self.successes})")
+
+
+class ConnectionSupervisor:
+    """Подключение с автоматическим повтором и переходом на резервный адрес"""
+    def __init__(self, backoff_initial=1.0, backoff_max=60.0, jitter=0.5, connect_timeout=30.0,
+                 recover_timeout=60.0, probe_timeout=3.0, on_status=None, on_fatal=None,
+                 fatal_patterns=FATAL_PATTERNS):
+        self.backoff_initial = backoff_initial  # Задержка первого повтора, с
+        self.backoff_max = backoff_max  # Предел задержки, с
+        self.jitter = jitter  # Доля задержки, на которую она случайно уменьшается (0 — без разброса)
+        self.connect_timeout = connect_timeout  # Сколько ждать connected="true" после команды connect
+        self.recover_timeout = recover_timeout  # Сколько ждать восстановления связи самим коннектором
+        self.probe_timeout = probe_timeout  # Таймаут замера адреса (0 — не замерять)
+        self.on_status = on_status  # f(текст), вызывается в потоке таймера или потоке-обработчике
+        self.on_fatal = on_fatal  # f(текст) при ошибке входа или настройки (повторы остановлены)
+        self.fatal_patterns = fatal_patterns  # Шаблоны re таких ошибок (пустой кортеж — повторять всегда)
+        self.last_error = None  # Причина перехода в FAILED
+        self.endpoints = []
+        self.current = None  # Endpoint текущей попытки или соединения
+        self.state = IDLE
+        self.attempts = 0  # Неудачных попыток подряд
+        self.reconnects = 0  # Сколько раз соединение восстанавливалось после сбоя
+        self.send = None  # send(bytes) -> Future с CommandResult
+        self._login = self._password = None
+        self._options = {}
+        self._attempt_id = 0  # Номер попытки: таймеры и ответы старых попыток не учитываются
+        self._started = None  # Время отправки connect
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def attach(self, connector):
+        """Команды — через send_command_async; состояние — по <server_status>; сообщения — в сигнал статуса"""
+        self.send = connector.send_command_async
+        connector.add_record_handler("server_status", self.on_server_status)
+        if self.on_status is None:
+            self.on_status = connector.signals.connection_status_changed.emit
+        if self.on_fatal is None:
+            self.on_fatal = connector.signals.error_occurred.emit
+
+    # --- Управление ---
+
+    def start(self, hosts, login, password, **options):
+        """Подключается к первому адресу из hosts [(host, port)]; при сбоях переходит к остальным
+
+        Возвращает Future команды connect первой попытки.
+        """
+        with self._lock:
+            known = {(e.host, e.port): e for e in self.endpoints}  # Статистика прошлых подключений сохраняется
+            self.endpoints = [known.get((host, int(port))) or Endpoint(host, port) for host, port in hosts]
+            self._login = login
+            self._password = password
+            self._options = options
+            self.attempts = 0
+            self.last_error = None
+            attempt = self._prepare(self.endpoints[0])
+        return self._send_connect(*attempt)
+
+    def stop(self):
+        """Прекращает слежение и повторы (соединение не разрывает)"""
+        with self._lock:
+            self.state = IDLE
+            self._attempt_id += 1
+            self._cancel_timer()
+
+    # --- Попытки ---
+
+    def _prepare(self, endpoint):
+        """Начинает попытку подключения к endpoint (под блокировкой); команду отправляет _send_connect"""
+        self._attempt_id += 1
+        self.current = endpoint
+        self.state = CONNECTING
+        self._started = time.monotonic()
+        self._set_timer(self.connect_timeout, self._failure, "Нет ответа на подключение", self._attempt_id)
+        command = build_connect_command(self._login, self._password, endpoint.host, endpoint.port, **self._options)
+        return endpoint, command, self._attempt_id
+
+    def _send_connect(self, endpoint, command, attempt_id):
+        self._status(f"Подключение к {endpoint.host}:{endpoint.port}")
+        future = self.send(command)
+        future.add_done_callback(lambda f: self._on_connect_result(f, attempt_id))
+        return future
+
+    def _retry(self, attempt_id):
+        """Поток таймера: замер адресов и новая попытка"""
+        if self.probe_timeout and len(self.endpoints) > 1:
+            self.probe()
+        with self._lock:
+            if attempt_id != self._attempt_id or self.state != WAITING:
+                return
+            attempt = self._prepare(self.best())
+        self._send_connect(*attempt)
+
+    def best(self):
+        """Лучший адрес: меньше сбоев подряд, затем быстрее TCP-соединение, затем порядок в списке"""
+        order = {id(e): i for i, e in enumerate(self.endpoints)}
+        return min(self.endpoints, key=lambda e: (e.failures, e.rtt is None, e.rtt or 0.0, order[id(e)]))
+
+    def probe(self):
+        """Замеряет все адреса параллельно; возвращает {(host, port): секунды или None}"""
+        endpoints = list(self.endpoints)
+        with ThreadPoolExecutor(max_workers=len(endpoints) or 1) as pool:
+            results = list(pool.map(lambda e: e.probe(self.probe_timeout), endpoints))
+        return {(e.host, e.port): rtt for e, rtt in zip(endpoints, results)}
+
+    def backoff(self):
+        """Задержка перед следующей попыткой: растет вдвое после каждого круга по всем адресам"""
+        rounds = (self.attempts - 1) // max(1, len(self.endpoints))
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** rounds)
+        return delay * (1.0 - self.jitter * random.random())
+
+    def _failure(self, reason, attempt_id=None):
+        """Сбой попытки или соединения: планирует переподключение; ошибку входа или настройки — нет"""
+        with self._lock:
+            if self.state in (IDLE, WAITING, FAILED) or (attempt_id is not None and attempt_id != self._attempt_id):
+                return
+            endpoint = self.current
+            endpoint.failures += 1
+            endpoint.last_failure = reason
+            was_connected = self.state == CONNECTED
+            self.attempts += 1
+            self._attempt_id += 1
+            fatal = is_fatal(reason, self.fatal_patterns)
+            if fatal:
+                self.state = FAILED
+                self.last_error = reason
+                self._cancel_timer()
+            else:
+                self.state = WAITING
+                delay = self.backoff()
+                self._set_timer(delay, self._retry, self._attempt_id)
+        if fatal:
+            self._status(f"Подключение к {endpoint.host}:{endpoint.port} остановлено: {reason}. "
+                         f"Повтор не поможет — проверьте логин, пароль и настройки")
+            self._fatal(reason)
+            return
+        if was_connected:
+            logger.warning(f"Соединение с {endpoint.host}:{endpoint.port} потеряно: {reason}")
+        self._status(f"Сбой {endpoint.host}:{endpoint.port}: {reason}. Повтор через {delay:.1f} с "
+                     f"(попытка {self.attempts})")
+
+    # --- События ---
+
+    def on_server_status(self, records):
+        """<server_status>: успех, восстановление связи коннектором или сбой"""
+        for status in records:
+            if status.connected == "true" and not status.recover:
+                self._on_connected()
+            elif status.connected == "true":
+                with self._lock:
+                    if self.state not in (CONNECTED, CONNECTING):
+                        continue
+                    self.state = RECOVERING
+                    self._set_timer(self.recover_timeout, self._on_recover_timeout, self._attempt_id)
+                self._status("Коннектор восстанавливает связь")
+            else:
+                self._failure(status.message or f"connected={status.connected}")
+
+    def _on_connected(self):
+        with self._lock:
+            if self.state not in (CONNECTING, RECOVERING, WAITING):
+                return
+            endpoint = self.current
+            if self.state == CONNECTING:
+                endpoint.connect_time = _ewma(endpoint.connect_time, time.monotonic() - self._started)
+            if self.attempts:
+                self.reconnects += 1
+            endpoint.failures = 0
+            endpoint.successes += 1
+            self.attempts = 0
+            self.state = CONNECTED
+            self._attempt_id += 1
+            self._cancel_timer()
+        self._status(f"Подключено к {endpoint.host}:{endpoint.port}")
+
+    def _on_connect_result(self, future, attempt_id):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._failure(f"Ошибка команды connect: {e}", attempt_id)
+            return
+        if not result.success:
+            self._failure(result.message or "Ошибка команды connect", attempt_id)
+
+    def _on_recover_timeout(self, attempt_id):
+        """Коннектор слишком долго восстанавливает связь — разрываем соединение и подключаемся заново"""
+        with self._lock:
+            if attempt_id != self._attempt_id or self.state != RECOVERING:
+                return
+        self.send(b'<command id="disconnect"/>')
+        self._failure("Связь не восстановилась", attempt_id)
+
+    # --- Вспомогательные ---
+
+    def _set_timer(self, delay, function, *args):
+        self._cancel_timer()
+        self._timer = threading.Timer(delay, function, args)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _status(self, text):
+        logger.info(text)
+        callback = self.on_status
+        if callback is not None:
+            try:
+                callback(text)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика состояния: {e}")
+
+    def _fatal(self, text):
+        callback = self.on_fatal
+        if callback is not None:
+            try:
+                callback(text)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика ошибки подключения: {e}")
+
+    def report(self):
+        """Статистика адресов (список строк)"""
+        return [repr(endpoint) for endpoint in self.endpoints]
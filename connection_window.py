@@ -0,0 +1,263 @@
+# Окно программы: ввод логина, выбор сервера, журнал сообщений
+#
+# Импортируется только при запуске с окном (terminal_connector_j.py, terminal_connector_t.py
+# без --headless): вместе с ним загружается PyQt5. Коннектор получает Qt-сигналы, чтобы
+# результаты команд приходили в поток интерфейса.
+import os  # Для работы с файлами и путями
+import xml.etree.ElementTree as ET  # Для разбора XML-данных
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton,
+                             QHBoxLayout, QComboBox, QFormLayout)  # Элементы интерфейса
+from PyQt5.QtGui import QIcon  # Иконки для кнопок
+from qt_signals import ConnectorSignals  # Сигналы для связи между компонентами
+from gui_batcher import SignalBatcher  # Пакетный вывод сообщений в окно
+from securities_cache import SecuritiesCache  # Справочник инструментов со снимком на диске
+from subscriptions import SubscriptionManager  # Пакетные подписки на сделки и стаканы
+from connection_supervisor import ConnectionSupervisor  # Переподключение и резервные адреса
+from log_view import LogView, CATEGORY_INFO, CATEGORY_DATA, CATEGORY_ERROR, CATEGORY_STATUS  # Ограниченный журнал
+
+
+class ConnectionWindow(QDialog):
+    """Главное окно программы"""
+    log_max_fps = 20  # Сколько раз в секунду журнал обновляется
+    log_max_per_frame = 500  # Сколько сообщений выводится за одно обновление
+    log_max_lines = 100000  # Сколько строк хранит журнал (старые вытесняются)
+    latency_report_interval = 0  # Раз в сколько секунд писать отчет о задержках в лог (0 — замер выключен)
+    title = "Соединение с Transaq"  # Заголовок окна
+    data_signal = "data_received"  # Сигнал коннектора, сообщения которого выводятся в журнал
+    log_label = "Журнал:"  # Заголовок журнала
+    log_placeholder = ""  # Подсказка в пустом журнале
+
+    def __init__(self, connector_class):
+        super().__init__()
+        self.setWindowTitle(self.title)  # Заголовок окна
+        self.setGeometry(370, 240, 920, 660)  # Позиция и размер окна
+
+        self.connector = connector_class(signals=ConnectorSignals())  # Connector программы с Qt-сигналами
+        self.securities = SecuritiesCache(os.path.join(os.path.dirname(__file__), "securities.cache"))  # Рядом с config.xml
+        self.securities.attach(self.connector)
+        self.securities.preload()  # Снимок прошлой сессии читается в фоне
+        self.subscriptions = SubscriptionManager()  # Подписки на данные, повторяются после переподключения
+        self.subscriptions.attach(self.connector)
+        self.supervisor = ConnectionSupervisor()  # Следит за соединением и переподключается при сбоях
+        self.supervisor.attach(self.connector)
+        self.log_batcher = SignalBatcher(self._add_log_messages, self.log_max_fps, self.log_max_per_frame, self,
+                                         latency=self.connector.latency)  # Пакетный вывод
+        if self.latency_report_interval:  # Отчет о задержках — в лог-файл
+            self.connector.latency.enabled = True
+            self.connector.latency.start_periodic(self.latency_report_interval, self.connector.log.write_log)
+
+        # Подключаем сигналы к методам:
+        self.log_batcher.connect_signal(getattr(self.connector.signals, self.data_signal), CATEGORY_DATA)
+        self.log_batcher.connect_signal(self.connector.signals.error_occurred, CATEGORY_ERROR)
+        self.log_batcher.connect_signal(self.connector.signals.connection_status_changed, CATEGORY_STATUS)
+        self.connector.signals.command_finished.connect(self._on_command_finished)  # Вызывается в потоке интерфейса
+
+        main_layout = QVBoxLayout()  # Основной макет (вертикальный)
+
+        # Форма для ввода данных:
+        form_layout = QFormLayout()
+
+        # Поля ввода:
+        self.login_input = QLineEdit()  # Поле для логина
+        self.password_input = QLineEdit()  # Поле для пароля
+        self.password_input.setEchoMode(QLineEdit.Password)  # Скрываем пароль
+
+        # Кнопка показа пароля:
+        self.toggle_password_btn = QPushButton()
+        self.toggle_password_btn.setIcon(QIcon("eye_icon.png"))  # Иконка глаза
+        self.toggle_password_btn.setCheckable(True)  # Кнопка-переключатель
+        self.toggle_password_btn.toggled.connect(self._toggle_password_visibility)  # Обработчик
+
+        # Компоновка поля пароля:
+        password_layout = QHBoxLayout()
+        password_layout.addWidget(self.password_input)
+        password_layout.addWidget(self.toggle_password_btn)
+
+        # Выбор сервера:
+        self.server_combo = QComboBox()
+        self.server_combo.addItems([
+            "АО «ФИНАМ» Основной адрес",
+            "АО «ФИНАМ» Резервный адрес",
+            "АО «Банк Финам» Основной адрес",
+            "АО «Банк Финам» Резервный адрес"
+        ])
+
+        # Параметры серверов:
+        self.server_params = {
+            "АО «ФИНАМ» Основной адрес": {"ip": "tr1.finam.ru", "port": "3900"},
+            "АО «ФИНАМ» Резервный адрес": {"ip": "tr2.finam.online", "port": "3900"},
+            "АО «Банк Финам» Основной адрес": {"ip": "tr1.finambank.ru", "port": "3324"},
+            "АО «Банк Финам» Резервный адрес": {"ip": "tr2.finambank.ru", "port": "3324"},
+        }
+
+        # Добавляем элементы в форму:
+        form_layout.addRow("Логин:", self.login_input)
+        form_layout.addRow("Пароль:", password_layout)
+        form_layout.addRow("Сервер:", self.server_combo)
+
+        # Кнопки управления:
+        button_layout = QHBoxLayout()
+        self.clear_btn = QPushButton("Стереть")  # Кнопка очистки
+        self.clear_btn.clicked.connect(self._on_clear_clicked)
+        self.disconnect_btn = QPushButton("Отключить")  # Кнопка отключения
+        self.disconnect_btn.clicked.connect(self._on_disconnect_clicked)
+        self.disconnect_btn.setEnabled(False)  # По умолчанию выключена
+        self.connect_btn = QPushButton("Подключить")  # Кнопка подключения
+        self.connect_btn.clicked.connect(self._on_connect_clicked)
+
+        button_layout.addWidget(self.clear_btn)
+        button_layout.addWidget(self.disconnect_btn)
+        button_layout.addWidget(self.connect_btn)
+
+        # Журнал сообщений:
+        self.log_text = LogView(self.log_max_lines,
+                                placeholder=self.log_placeholder)  # Только для чтения, хранит не больше log_max_lines строк
+
+        # Компоновка интерфейса:
+        main_layout.addLayout(form_layout)
+        main_layout.addLayout(button_layout)
+        main_layout.addWidget(QLabel(self.log_label))
+        main_layout.addWidget(self.log_text)
+
+        self.setLayout(main_layout)  # Устанавливаем макет
+
+        self._load_saved_credentials()  # Загружаем сохраненные данные
+
+    def _toggle_password_visibility(self, checked):
+        """Показывает или скрывает пароль"""
+        self.password_input.setEchoMode(QLineEdit.Normal if checked else QLineEdit.Password)
+
+    def _load_saved_credentials(self):
+        """Загружает сохраненные логин и пароль из файла"""
+        config_path = os.path.join(os.path.dirname(__file__), "config.xml")
+        if os.path.exists(config_path):
+            try:
+                tree = ET.parse(config_path)  # Читаем XML
+                root = tree.getroot()
+
+                login = root.find("login").text  # Логин
+                password = self.connector.decrypt_password(root.find("password").text)  # Пароль
+                host = root.find("host").text  # Адрес сервера
+                port = root.find("port").text  # Порт
+
+                self.login_input.setText(login)  # Заполняем поле логина
+                self.password_input.setText(password)  # Заполняем поле пароля
+
+                # Устанавливаем выбранный сервер:
+                for server, params in self.server_params.items():
+                    if params["ip"] == host and params["port"] == port:
+                        self.server_combo.setCurrentText(server)
+                        break
+
+                self._add_log_message("Конфигурация загружена")
+            except Exception as e:
+                self._add_log_message(f"Ошибка загрузки конфигурации: {e}")
+
+    def _save_config(self, login, password, host, port):
+        """Сохраняет настройки в файл config.xml"""
+        config_path = os.path.join(os.path.dirname(__file__), "config.xml")
+
+        config = ET.Element("config")  # Создаем XML-структуру
+        ET.SubElement(config, "login").text = login
+        ET.SubElement(config, "password").text = self.connector.encrypt_password(password)  # Шифруем пароль
+        ET.SubElement(config, "host").text = host
+        ET.SubElement(config, "port").text = port
+        ET.SubElement(config, "language").text = "ru"
+        ET.SubElement(config, "autopos").text = "true"
+        ET.SubElement(config, "milliseconds").text = "true"
+        ET.SubElement(config, "utc_time").text = "true"
+
+        tree = ET.ElementTree(config)
+        tree.write(config_path, encoding="utf-8", xml_declaration=True)  # Сохраняем в файл
+
+        self._add_log_message("Конфигурация сохранена")
+
+    def _add_log_message(self, message):
+        """Добавляет сообщение в журнал (выводится со следующей пачкой)"""
+        self.log_batcher.collect(message)
+
+    def _add_log_messages(self, items, skipped):
+        """Добавляет пачку сообщений в журнал одной вставкой"""
+        if skipped:  # Часть сообщений не успела попасть в окно (в лог-файле они есть)
+            items.insert(0, (CATEGORY_INFO, f"... пропущено сообщений: {skipped}"))
+        self.log_text.append_messages(items)  # Одна вставка на всю пачку
+
+    def _on_connect_clicked(self):
+        """Обработчик нажатия кнопки 'Подключить'"""
+        login = self.login_input.text()  # Получаем логин
+        password = self.password_input.text()  # Получаем пароль
+        server = self.server_combo.currentText()  # Получаем выбранный сервер
+
+        if not login or not password:  # Если логин или пароль пустые
+            self._add_log_message("Ошибка: необходимо указать логин и пароль")
+            return
+
+        if server not in self.server_params:  # Если сервер не найден
+            self._add_log_message("Ошибка: выбран несуществующий сервер")
+            return
+
+        server_info = self.server_params[server]  # Получаем параметры сервера
+
+        try:
+            self._save_config(login, password, server_info["ip"], server_info["port"])  # Сохраняем настройки
+
+            result = self.connector.initialize(os.path.dirname(__file__), 1)  # Инициализация
+            self._add_log_message(f"Инициализация: {result}")
+
+            # Подключаемся к выбранному адресу, при сбоях — к остальным адресам того же брокера:
+            hosts = [(params["ip"], params["port"]) for params in self._server_group(server)]
+            future = self.supervisor.start(hosts, login, password)  # Окно не ждет ответа DLL
+            self._add_log_message(f"Команда подключения отправлена (запрос {future.request_id})")
+
+            self.connect_btn.setEnabled(False)  # Отключаем кнопку подключения
+            self.disconnect_btn.setEnabled(True)  # Включаем кнопку отключения
+
+        except Exception as e:
+            self._add_log_message(f"Ошибка подключения: {e}")
+
+    def _server_group(self, server):
+        """Параметры выбранного сервера и затем остальных адресов того же брокера"""
+        broker = server.rsplit(" ", 2)[0]  # "АО «ФИНАМ» Основной адрес" -> "АО «ФИНАМ»"
+        return [self.server_params[server]] + [params for name, params in self.server_params.items()
+                                               if name != server and name.rsplit(" ", 2)[0] == broker]
+
+    def _on_command_finished(self, request_id, result):
+        """Выводит результат асинхронной команды (вызывается в потоке интерфейса)"""
+        if result.success:
+            self._add_log_message(f"Ответ сервера (запрос {request_id}): {result.raw.decode('utf-8', 'replace')}")
+        else:
+            self._add_log_message(f"Ошибка команды (запрос {request_id}): {result.message}")
+
+    def _on_disconnect_clicked(self):
+        """Обработчик нажатия кнопки 'Отключить'"""
+        try:
+            self.supervisor.stop()  # Отключение по кнопке — не сбой, переподключаться не нужно
+            result = self.connector.uninitialize()  # Отключаемся
+            self.securities.save()  # Сохраняем справочник для быстрого следующего запуска
+            self._add_log_message(f"Отключение: {result}")
+            self.connect_btn.setEnabled(True)  # Включаем кнопку подключения
+            self.disconnect_btn.setEnabled(False)  # Отключаем кнопку отключения
+        except Exception as e:
+            self._add_log_message(f"Ошибка отключения: {e}")
+
+    def _on_clear_clicked(self):
+        """Обработчик нажатия кнопки 'Стереть'"""
+        config_path = os.path.join(os.path.dirname(__file__), "config.xml")
+        if os.path.exists(config_path):  # Если файл конфигурации существует
+            try:
+                os.remove(config_path)  # Удаляем его
+                self.login_input.clear()  # Очищаем поле логина
+                self.password_input.clear()  # Очищаем поле пароля
+                self._add_log_message("Конфигурация очищена")
+            except Exception as e:
+                self._add_log_message(f"Ошибка очистки: {e}")
+        else:
+            self._add_log_message("Конфигурация не найдена")
+
+
+class DevConnectionWindow(ConnectionWindow):
+    """Главное окно программы (версия для разработчиков): в журнале только важные сообщения"""
+    title = "Соединение с Transaq (Dev Mode)"
+    data_signal = "important_data_received"
+    log_label = "Важные сообщения:"
+    log_placeholder = "Здесь будут отображаться только важные сообщения..."
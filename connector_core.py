@@ -0,0 +1,247 @@
+# Коннектор без интерфейса: очередь, разбор, обработчики записей, команды. Не зависит от PyQt5
+#
+#   connector = Connector()                                  # события — events.ConnectorEvents
+#   connector = Connector(signals=ConnectorSignals())        # для окна — Qt-сигналы из qt_signals.py
+#
+# terminal_connector_j.py и terminal_connector_t.py наследуют отсюда свои Connector и отличаются
+# только настройками журнала (journal, echo, log_name); окно (connection_window.py) и PyQt5
+# загружаются только при запуске с окном. cryptography импортируется при первом шифровании пароля.
+#
+# Сообщения рассылаются через dispatch.DispatchTable: статус соединения, ошибки и результаты
+# команд обрабатываются такими же подписчиками по корневому тегу, как подписки подсистем.
+import os  # Для работы с файлами и путями
+import logging  # Для ведения логов (записей о работе программы)
+import time  # Для отметок времени приема сообщений
+from ingest_queue import IngestQueue, DROP_OLDEST  # Очередь входящих сообщений
+from log_writer import Log  # Асинхронная запись лог-файла
+from capture import CaptureWriter  # Сжатая запись сырых сообщений
+from transport import DllTransport  # Транспорт через DLL Transaq
+from xml_stream import root_tag, root_attrib, parse_root, ParseError  # Потоковый разбор XML
+from dispatch import DispatchTable  # Подписчики по корневому тегу
+from latency import LatencyTracker  # Замер задержек по стадиям обработки
+from command_pipeline import CommandPipeline, NO_REPLY  # Асинхронная отправка команд
+from command_scheduler import CommandScheduler  # Лимиты частоты и приоритеты команд
+from events import ConnectorEvents  # События без Qt
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+JOURNAL_ALL = "all"  # В лог и в data_received — все сообщения целиком
+JOURNAL_IMPORTANT = "important"  # В лог и в important_data_received — статус, ошибки и результаты команд
+
+
+class Connector:
+    """Основной класс для работы с Transaq Connector"""
+    log_name = "transaq.log"  # Имя лог-файла в папке коннектора
+    password_key = None  # Ключ Fernet для шифрования пароля (программы задают свой KEY)
+    journal = JOURNAL_ALL  # Что писать в лог-файл и отправлять в интерфейс
+    echo = False  # Выводить начало каждого сообщения в консоль
+
+    def __init__(self, transport=None, workers=1, queue_size=65536, queue_policy=DROP_OLDEST, capture=False,
+                 latency=False, command_limits=None, signals=None):
+        self.signals = signals if signals is not None else ConnectorEvents()  # События (Qt-сигналы — для окна)
+        self.log = Log()  # Создаем логгер
+        self.dispatch_table = DispatchTable()  # Корневой тег -> обработчики записей и сырых сообщений
+        self.emit_records = False  # Отправлять ли записи сигналом records_received
+        self.capture_enabled = capture  # Записывать ли все сырые сообщения в файл *.tqc (по умолчанию нет)
+        self.capture = None  # Текущий файл записи
+        self.latency = LatencyTracker(latency)  # Замер задержек (выключен, пока не задан latency=True)
+        self.queue = IngestQueue(queue_size, queue_policy)  # Очередь сообщений от DLL
+        self.queue.start_workers(self._process_data, workers)  # Потоки разбора сообщений
+        self.transport = transport if transport is not None else DllTransport()  # По умолчанию — DLL
+        self.transport.set_callback(self._on_data)  # Входящие сообщения — в очередь
+        self.commands = CommandPipeline(self.transport.send_command, self.signals.command_finished.emit,
+                                        scheduler=CommandScheduler(command_limits))  # Поток-отправитель с лимитами
+        self.add_record_handler("orders", self.commands.on_orders)  # Подтверждение команд по transactionid
+        self.add_raw_handler("server_status", self._on_server_status)
+        self.add_raw_handler("error", self._on_error)
+        if self.journal == JOURNAL_IMPORTANT:
+            self.add_raw_handler("result", self._on_result)
+        self._cipher_suite = None  # Создается при первом шифровании пароля
+
+    def _on_data(self, data):
+        """Принимает сообщение от транспорта (в его потоке) и кладет в очередь"""
+        self.queue.put((time.monotonic_ns(), data))  # Передаем данные потокам разбора вместе со временем приема
+
+    def _process_data(self, item):
+        """Разбирает сообщение из очереди (вызывается в потоке-обработчике)"""
+        recv_ns, raw = item
+        latency = self.latency
+        if latency.enabled:
+            latency.begin(recv_ns, raw)  # Отмечаем время ожидания в очереди
+        capture = self.capture
+        if capture is not None:
+            capture.write(raw, recv_ns)  # Сохраняем сырое сообщение для разбора после торгов
+        if self.echo:
+            logger.info(f"Получены данные: {raw[:200].decode('utf-8', 'replace')}...")  # Первые 200 символов
+        self._handle_data(raw)  # Обрабатываем данные
+        if latency.enabled:
+            latency.end()
+
+    def _handle_data(self, data):
+        """Обрабатывает входящие данные (bytes: XML или текст)"""
+        latency = self.latency
+        if self.journal == JOURNAL_ALL:
+            text = data.decode('utf-8', 'replace')  # Декодируем один раз для интерфейса
+            if latency.enabled:
+                latency.mark("decode")
+            self.log.write_log(data)  # Пишем в лог-файл (байты, без повторного кодирования)
+            if latency.enabled:
+                latency.mark("log")
+            self.signals.data_received.emit(text)  # Отправляем данные в интерфейс
+
+        tag = root_tag(data)  # Определяем тип сообщения по первым байтам, без разбора
+        if latency.enabled:
+            latency.mark("parse")
+        if tag is None:
+            self._handle_other(data)
+            return
+        try:
+            records = self.dispatch_table.dispatch(tag, data, self.emit_records)  # Без подписчиков — без разбора
+        except ParseError:
+            self._handle_other(data)  # XML поврежден
+            return
+        if latency.enabled:
+            latency.mark("dispatch")
+        if records is not None and self.emit_records:
+            self.signals.records_received.emit(tag, records)  # Отправляем записи в интерфейс
+
+    def _handle_other(self, data):
+        """Не XML или поврежденный XML: в журнал важных сообщений — если похоже на ошибку"""
+        if self.journal == JOURNAL_IMPORTANT:
+            lowered = data.lower()
+            if b"error" in lowered or b"fail" in lowered:  # Содержит ли текст "error" или "fail"
+                self._important(data[:200].decode('utf-8', 'replace'))  # Первые 200 символов
+                return
+        logger.debug(f"Не XML данные: {data[:100].decode('utf-8', 'replace')}...")
+
+    def _important(self, message):
+        """Важное сообщение — в лог и в интерфейс (только для journal = JOURNAL_IMPORTANT)"""
+        if self.journal != JOURNAL_IMPORTANT:
+            return
+        self.log.write_log(message)
+        if self.latency.enabled:
+            self.latency.mark("log")
+        self.signals.important_data_received.emit(message)
+
+    def _on_server_status(self, data):
+        status = root_attrib(data).get("connected", "unknown")  # Нужны только атрибуты корня
+        message = f"Состояние соединения: {status}"
+        self.signals.connection_status_changed.emit(message)
+        self._important(message)
+
+    def _on_error(self, data):
+        message = f"Ошибка: {parse_root(data).text}"  # Маленькое сообщение — разбираем целиком
+        self.signals.error_occurred.emit(message)
+        self._important(message)
+
+    def _on_result(self, data):
+        attrib = root_attrib(data)
+        if "success" in attrib:
+            self._important(f"Результат команды: {attrib['success']}")
+        else:
+            self._important(f"Результат: {data[:100].decode('utf-8', 'replace')}...")  # Первые 100 символов
+
+    def start_capture(self, path):
+        """Начинает запись всех сырых сообщений в сжатый файл с индексом"""
+        self.stop_capture()
+        self.capture = CaptureWriter(path)
+        logger.info(f"Запись сообщений в {path}")
+
+    def stop_capture(self):
+        """Дописывает и закрывает файл записи"""
+        capture, self.capture = self.capture, None
+        if capture is not None:
+            capture.close()
+
+    def add_record_handler(self, tag, handler, board=None, seccode=None):
+        """Подписывает handler(records) на типизированные записи сообщений с корневым тегом tag
+
+        С board и/или seccode handler получает только записи этого инструмента (или режима торгов).
+        """
+        self.dispatch_table.add_record_handler(tag, handler, board, seccode)
+
+    def add_raw_handler(self, tag, handler):
+        """Подписывает handler(data) на сырые сообщения (bytes) с корневым тегом tag"""
+        self.dispatch_table.add_raw_handler(tag, handler)
+
+    def remove_record_handler(self, tag, handler, board=None, seccode=None):
+        """Отписывает handler, подписанный add_record_handler с теми же аргументами"""
+        self.dispatch_table.remove_record_handler(tag, handler, board, seccode)
+
+    def remove_raw_handler(self, tag, handler):
+        """Отписывает handler, подписанный add_raw_handler"""
+        self.dispatch_table.remove_raw_handler(tag, handler)
+
+    def send_command(self, command, timeout=None):
+        """Отправляет команду на сервер и ждет ответа
+
+        Команда идет через ту же очередь, что и send_command_async: с лимитами, приоритетами
+        и из одного потока-отправителя (DLL не вызывается из двух потоков сразу).
+        """
+        result = self.send_command_async(command, timeout).result()
+        if result.raw is not None:  # Если есть ответ
+            return result.raw.decode('utf-8')  # Декодируем
+        if result.message == NO_REPLY:
+            return ""  # Если ответа нет
+        logger.error(f"Ошибка при отправке команды: {result.message}")  # Срок истек или SendCommand упал
+        raise RuntimeError(result.message)  # Прерываем выполнение
+
+    def send_command_async(self, command, timeout=None, confirm=False):
+        """Ставит команду в очередь потока-отправителя и сразу возвращает Future с CommandResult
+
+        Результат также приходит сигналом command_finished. С confirm=True команда
+        считается выполненной после первого <orders> с ее transactionid.
+        """
+        return self.commands.submit(command, timeout, confirm)
+
+    def initialize(self, path, log_level):
+        """Инициализирует подключение к серверу"""
+        try:
+            result = self.transport.initialize(path.encode('utf-8'), log_level)  # Инициализация
+
+            if result is not None:
+                result = result.decode('utf-8')  # Ответ
+
+                log_path = os.path.join(path, self.log_name)  # Путь к лог-файлу
+                self.log.start_logging(log_path)  # Начинаем запись логов
+                if self.capture_enabled:  # Сырые сообщения — в отдельный сжатый файл
+                    self.start_capture(os.path.join(path, time.strftime("capture_%Y%m%d_%H%M%S.tqc")))
+
+                return result
+            return ""
+        except Exception as e:
+            logger.error(f"Ошибка инициализации: {e}")
+            raise
+
+    def uninitialize(self):
+        """Отключает соединение с сервером"""
+        try:
+            result = self.transport.uninitialize()  # Деинициализация
+
+            if result is not None:
+                result = result.decode('utf-8')
+
+                self.commands.cancel_pending()  # Подтверждений после отключения уже не будет
+                self.log.stop_logging()  # Останавливаем запись логов
+                self.stop_capture()  # Закрываем файл записи
+
+                return result
+            return ""
+        except Exception as e:
+            logger.error(f"Ошибка деинициализации: {e}")
+            raise
+
+    def _cipher(self):
+        """Объект для шифрования/расшифровки (cryptography импортируется при первом обращении)"""
+        if self._cipher_suite is None:
+            from cryptography.fernet import Fernet  # Для шифрования паролей
+            self._cipher_suite = Fernet(self.password_key)
+        return self._cipher_suite
+
+    def encrypt_password(self, password):
+        """Шифрует пароль"""
+        return self._cipher().encrypt(password.encode()).decode()  # Возвращает зашифрованную строку
+
+    def decrypt_password(self, encrypted_password):
+        """Расшифровывает пароль"""
+        return self._cipher().decrypt(encrypted_password.encode()).decode()  # Возвращает расшифрованный пароль
@@ -0,0 +1,143 @@
+# Таблица рассылки сообщений: корневой тег -> подписчики, с фильтром по board/seccode
+#
+#   table = DispatchTable()
+#   table.add_raw_handler("securities", on_securities)                    # bytes, без разбора
+#   table.add_record_handler("alltrades", on_trades)                      # все записи сообщения
+#   table.add_record_handler("quotes", on_sber, board="TQBR", seccode="SBER")  # только записи SBER
+#   table.dispatch(root_tag(data), data)
+#
+# Тег определяется по первым байтам (xml_stream.root_tag), маршрут — одним поиском в словаре.
+# Если на тег никто не подписан, сообщение не разбирается вовсе. Сообщение с подписчиками
+# на записи декодируется один раз, подписчики с фильтром получают только свои записи.
+# Маршруты неизменяемы и заменяются целиком при подписке, поэтому потоки-обработчики
+# читают таблицу без блокировки.
+import logging  # Для ведения логов
+import threading  # Подписка из одного потока, рассылка — из потоков-обработчиков
+from messages import decode  # Типизированные записи сообщений
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+
+class _Route:
+    """Подписчики одного тега (не изменяется после создания)"""
+    __slots__ = ("raw", "records", "filtered")
+
+    def __init__(self, raw=(), records=(), filtered=None):
+        self.raw = raw  # (handler(data), ...)
+        self.records = records  # (handler(records), ...) — все записи
+        self.filtered = filtered or {}  # (board, seccode) -> (handler(records), ...); None в ключе — любое значение
+
+
+class DispatchTable:
+    """Подписчики по корневому тегу; декодирование — только для тегов, на записи которых подписаны"""
+    def __init__(self):
+        self._routes = {}  # Тег -> _Route
+        self._lock = threading.Lock()
+
+    def add_raw_handler(self, tag, handler):
+        """Подписывает handler(data) на сырые сообщения (bytes) с корневым тегом tag"""
+        with self._lock:
+            route = self._routes.get(tag, _Route())
+            self._routes[tag] = _Route(route.raw + (handler,), route.records, route.filtered)
+
+    def add_record_handler(self, tag, handler, board=None, seccode=None):
+        """Подписывает handler(records) на записи сообщений tag; с board/seccode — только на подходящие записи"""
+        with self._lock:
+            route = self._routes.get(tag, _Route())
+            if board is None and seccode is None:
+                self._routes[tag] = _Route(route.raw, route.records + (handler,), route.filtered)
+                return
+            filtered = dict(route.filtered)
+            filtered[(board, seccode)] = filtered.get((board, seccode), ()) + (handler,)
+            self._routes[tag] = _Route(route.raw, route.records, filtered)
+
+    def remove_raw_handler(self, tag, handler):
+        """Отписывает handler от сырых сообщений tag"""
+        with self._lock:
+            route = self._routes.get(tag, _Route())
+            self._set(tag, _Route(_without(route.raw, handler, tag), route.records, route.filtered))
+
+    def remove_record_handler(self, tag, handler, board=None, seccode=None):
+        """Отписывает handler от записей tag (с теми же board/seccode, что и при подписке)"""
+        with self._lock:
+            route = self._routes.get(tag, _Route())
+            if board is None and seccode is None:
+                self._set(tag, _Route(route.raw, _without(route.records, handler, tag), route.filtered))
+                return
+            filtered = dict(route.filtered)
+            handlers = _without(filtered.get((board, seccode), ()), handler, tag)
+            if handlers:
+                filtered[(board, seccode)] = handlers
+            else:
+                del filtered[(board, seccode)]
+            self._set(tag, _Route(route.raw, route.records, filtered))
+
+    def _set(self, tag, route):
+        if route.raw or route.records or route.filtered:
+            self._routes[tag] = route
+        else:
+            self._routes.pop(tag, None)  # Подписчиков не осталось — сообщения снова пропускаются без разбора
+
+    def wants(self, tag):
+        """Есть ли у тега подписчики"""
+        return tag in self._routes
+
+    def tags(self):
+        """Теги, на которые есть подписки"""
+        return list(self._routes)
+
+    def dispatch(self, tag, data, decode_always=False):
+        """Рассылает сообщение подписчикам tag; возвращает записи, если сообщение декодировалось
+
+        С decode_always=True записи декодируются и без подписчиков (для сигнала
+        records_received). Ошибка разбора (ParseError) передается вызывающему коду,
+        ошибки подписчиков — только в лог.
+        """
+        route = self._routes.get(tag)
+        if route is None:
+            return decode(tag, data) if decode_always else None  # Подписчиков нет — без разбора
+        for handler in route.raw:  # Подписчики, которые разбирают байты сами
+            _call(handler, data, tag)
+        if not route.records and not route.filtered and not decode_always:
+            return None
+        records = decode(tag, data)  # None — для этого тега декодера нет
+        if records is None:
+            return None
+        for handler in route.records:
+            _call(handler, records, tag)
+        if route.filtered:
+            self._dispatch_filtered(route.filtered, records, tag)
+        return records
+
+    @staticmethod
+    def _dispatch_filtered(filtered, records, tag):
+        """Раскладывает записи по фильтрам (board, seccode) за один проход и вызывает подписчиков"""
+        selected = {}  # Ключ фильтра -> записи
+        for record in records:
+            board = getattr(record, "board", None)
+            seccode = getattr(record, "seccode", None)
+            if board is None or seccode is None:
+                keys = ((board, seccode),)  # Без одного из полей подходит только фильтр по другому
+            else:
+                keys = ((board, seccode), (None, seccode), (board, None))
+            for key in keys:
+                if key in filtered:
+                    selected.setdefault(key, []).append(record)
+        for key, subset in selected.items():
+            for handler in filtered[key]:
+                _call(handler, subset, tag)
+
+
+def _call(handler, argument, tag):
+    try:
+        handler(argument)
+    except Exception as e:
+        logger.error(f"Ошибка обработчика {tag}: {e}", exc_info=True)  # Ошибка одного подписчика не мешает остальным
+
+
+def _without(handlers, handler, tag):
+    if handler not in handlers:
+        raise ValueError(f"Обработчик не подписан на {tag}")
+    handlers = list(handlers)
+    handlers.remove(handler)
+    return tuple(handlers)
@@ -0,0 +1,14 @@
+# Протокол эмулятора Transaq: кадры FRAME_HEADER (тип, длина) + XML в UTF-8
+#
+# Отдельно от transaq_emulator.py, чтобы transport.py не загружал asyncio и сам сервер.
+import struct  # Заголовки кадров
+
+FRAME_HEADER = struct.Struct("<cI")  # Тип кадра (1 байт) и длина тела
+FRAME_COMMAND = b"C"  # Команда клиента (<command id="...">), как в SendCommand
+FRAME_RESULT = b"R"  # Ответ на команду (строго по порядку команд)
+FRAME_DATA = b"D"  # Асинхронное сообщение, как в callback DLL
+
+
+def frame(kind, payload):
+    """Упаковывает тело в кадр"""
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
@@ -0,0 +1,59 @@
+# События коннектора без Qt: обработчики вызываются прямо в потоке, который отправил событие
+#
+#   events = ConnectorEvents()
+#   events.connection_status_changed.connect(print)
+#   events.connection_status_changed.emit("Состояние соединения: true")
+#
+# У Event те же connect/disconnect/emit, что и у сигналов PyQt5, поэтому подсистемы
+# (подписки, переподключение, портфель) работают и с ConnectorEvents, и с Qt-сигналами
+# из qt_signals.py. Окну нужны Qt-сигналы (доставка в поток интерфейса); программе без
+# окна хватает ConnectorEvents, и PyQt5 не загружается вовсе.
+import logging  # Для ведения логов
+import threading  # Подписка из одного потока, события — из других
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+
+class Event:
+    """Событие со списком обработчиков; emit вызывает их по очереди в своем потоке"""
+    __slots__ = ("name", "_slots", "_lock")
+
+    def __init__(self, name=""):
+        self.name = name
+        self._slots = ()  # Кортеж заменяется целиком: emit читает его без блокировки
+        self._lock = threading.Lock()
+
+    def connect(self, slot, connection_type=None):
+        """Подписывает slot(*args); connection_type — для совместимости с Qt (вызов всегда прямой)"""
+        with self._lock:
+            self._slots += (slot,)
+
+    def disconnect(self, slot=None):
+        """Отписывает slot (без аргумента — всех)"""
+        with self._lock:
+            if slot is None:
+                self._slots = ()
+            elif slot in self._slots:
+                slots = list(self._slots)
+                slots.remove(slot)
+                self._slots = tuple(slots)
+            else:
+                raise TypeError(f"Обработчик не подписан на {self.name}")
+
+    def emit(self, *args):
+        for slot in self._slots:
+            try:
+                slot(*args)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события {self.name}: {e}", exc_info=True)  # Остальные обработчики работают
+
+
+class ConnectorEvents:
+    """События коннектора (те же имена, что у qt_signals.ConnectorSignals)"""
+    NAMES = ("connection_status_changed", "error_occurred", "data_received", "important_data_received",
+             "records_received", "bar_closed", "position_changed", "money_changed", "order_changed",
+             "command_finished")
+
+    def __init__(self):
+        for name in self.NAMES:
+            setattr(self, name, Event(name))
@@ -0,0 +1,400 @@
+# Сетевой шлюз: одна сессия DLL — много клиентов (asyncio, компактные двоичные кадры)
+#
+#   gateway = Gateway(port=3960)
+#   gateway.attach(connector)
+#   gateway.start_thread()                       # свой цикл asyncio в отдельном потоке
+#
+#   client = await GatewayClient.connect("127.0.0.1", 3960)       # в другом процессе или на другой машине
+#   await client.subscribe("alltrades", board="TQBR", seccode="SBER")
+#   result = await client.command('<command id="get_portfolio"><client>C1</client></command>')
+#   async for tag, records in client:            # записи messages.py: AllTrade, Quote, Order...
+#       ...
+#
+# Кадры — FRAME_HEADER (тип, длина) из emulator_protocol.py. Клиент отправляет команды (C),
+# подписки (S) и отписки (U) на корневой тег с фильтром по board/seccode (пустое — любые).
+# Шлюз отвечает результатами команд (R) и данными (D): записи уже разобраны коннектором и
+# передаются кортежами значений в marshal, без повторной отправки XML. Записи из потоков-
+# обработчиков копятся и уходят пачкой: не больше одной записи в сокет клиента за проход
+# цикла. Если клиент не успевает читать и в его буфере больше high_water байт, данные для него
+# выбрасываются (ответы на команды — нет), а когда буфер освободится, клиент получит кадр L с
+# числом пропущенных записей.
+import asyncio  # Сервер и клиент
+import logging  # Для ведения логов
+import marshal  # Компактная сериализация кортежей встроенных типов
+import struct  # Номер запроса в кадрах команд
+import threading  # Цикл шлюза в отдельном потоке, записи — из потоков-обработчиков
+from collections import deque  # Записи от потоков-обработчиков к циклу шлюза
+from concurrent.futures import CancelledError  # Команда отменена до ответа
+from operator import attrgetter  # Значения полей записи одним вызовом
+import messages  # Классы записей для клиента
+from command_pipeline import CommandResult  # Ответ клиенту, если команда не дошла до коннектора
+from emulator_protocol import FRAME_HEADER, FRAME_COMMAND, FRAME_RESULT, FRAME_DATA, frame  # Кадры протокола
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+FRAME_SUBSCRIBE = b"S"  # "тег\tboard\tseccode" в UTF-8
+FRAME_UNSUBSCRIBE = b"U"
+FRAME_LOST = b"L"  # marshal: сколько записей клиент пропустил
+REQUEST = struct.Struct("<IB")  # Номер запроса клиента, confirm
+MAX_FRAME = 1024 * 1024  # Больше от клиента не принимаем
+DRAIN_BATCH = 256  # Пачек записей за один проход _drain: цикл не замирает, когда пачек накопилось много
+RECORD_TYPES = {cls.__name__: cls for cls in vars(messages).values()
+                if isinstance(cls, type) and issubclass(cls, messages.Record) and cls is not messages.Record}
+
+_getters = {}  # Класс записи -> attrgetter всех полей
+
+
+def encode_record(record):
+    """(имя класса, кортеж значений полей) — запись в кадре D"""
+    cls = type(record)
+    getter = _getters.get(cls)
+    if getter is None:
+        getter = _getters[cls] = attrgetter(*cls.__slots__)
+    values = getter(record)
+    return cls.__name__, values if len(cls.__slots__) > 1 else (values,)
+
+
+def decode_record(name, values):
+    """Запись messages.py из (имя класса, значения)"""
+    cls = RECORD_TYPES[name]
+    record = cls.__new__(cls)
+    for slot, value in zip(cls.__slots__, values):
+        setattr(record, slot, value)
+    return record
+
+
+def _parse_topic(payload):
+    tag, board, seccode = (payload.decode("utf-8").split("\t") + ["", ""])[:3]
+    return tag, board or None, seccode or None
+
+
+def _key(board, seccode):
+    """Ключ подписки внутри тега: None — все записи, иначе (board, seccode), где None — любое значение"""
+    return None if board is None and seccode is None else (board, seccode)
+
+
+class _Client:
+    """Подключенный клиент шлюза"""
+    __slots__ = ("writer", "peer", "task", "topics", "congested", "dropped", "sent")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")
+        self.task = asyncio.current_task()  # Задача _serve: ее дожидается close
+        self.topics = set()  # {(tag, board, seccode)}
+        self.congested = False  # Буфер переполнен, данные выбрасываются
+        self.dropped = 0  # Записей выброшено с начала переполнения
+        self.sent = 0  # Записей отправлено
+
+
+class Gateway:
+    """asyncio-сервер: команды клиентов — в очередь коннектора, записи — клиентам по подпискам"""
+    def __init__(self, host="127.0.0.1", port=3960, high_water=4 * 1024 * 1024):
+        self.host = host  # 127.0.0.1 — только локальные клиенты; "0.0.0.0" — все (кадры не шифруются)
+        self.port = port
+        self.high_water = high_water  # Байт в буфере клиента, после которых данные для него выбрасываются
+        self.send = None  # send(bytes, timeout, confirm) -> Future с CommandResult
+        self.clients = set()
+        self._topics = {}  # Тег -> {(board, seccode), (None, seccode), (board, None) или None: {клиенты}}
+        self._handlers = {}  # Тег -> обработчик, подписанный у коннектора
+        self._connector = None
+        self._inbox = deque()  # (тег, записи) из потоков-обработчиков
+        self._scheduled = False  # Проход _drain уже запланирован
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self.dropped = 0  # Записей выброшено для медленных клиентов (всего)
+
+    def attach(self, connector):
+        """Команды — через send_command_async; записи — обработчиками тегов, на которые есть подписки"""
+        self._connector = connector
+        self.send = connector.send_command_async
+
+    # --- Запуск ---
+
+    async def start(self):
+        """Начинает принимать клиентов в текущем цикле asyncio"""
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        logger.info(f"Шлюз слушает {self.host}:{self.port}")
+
+    def start_thread(self):
+        """Запускает цикл asyncio шлюза в отдельном потоке; возвращается, когда сервер слушает порт"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start())
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                return
+            started.set()
+            loop.run_forever()
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="Gateway", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+
+    async def close(self):
+        """Закрывает сервер и соединения клиентов (в цикле шлюза)"""
+        self._server.close()
+        clients = list(self.clients)
+        for client in clients:
+            client.writer.close()
+        await asyncio.gather(*(client.task for client in clients), return_exceptions=True)
+        await self._server.wait_closed()
+
+    def stop(self):
+        """Останавливает шлюз, запущенный start_thread (из любого потока)"""
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    # --- Клиенты ---
+
+    async def _serve(self, reader, writer):
+        client = _Client(writer)
+        self.clients.add(client)
+        logger.info(f"Клиент шлюза подключен: {client.peer}")
+        try:
+            while True:
+                kind, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                if length > MAX_FRAME:
+                    raise ValueError(f"Слишком длинный кадр: {length}")
+                payload = await reader.readexactly(length)
+                if kind == FRAME_COMMAND:
+                    self._command(client, payload)
+                elif kind == FRAME_SUBSCRIBE:
+                    self._subscribe(client, _parse_topic(payload))
+                elif kind == FRAME_UNSUBSCRIBE:
+                    self._unsubscribe(client, _parse_topic(payload))
+                else:
+                    raise ValueError(f"Неизвестный тип кадра: {kind!r}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка клиента шлюза {client.peer}: {e}")
+        finally:
+            for topic in list(client.topics):
+                self._unsubscribe(client, topic)
+            self.clients.discard(client)
+            writer.close()
+            logger.info(f"Клиент шлюза отключен: {client.peer}")
+
+    def _command(self, client, payload):
+        """Команда клиента — в очередь коннектора; результат — кадром R, когда будет готов"""
+        request_id, confirm = REQUEST.unpack_from(payload)
+        try:
+            future = self.send(bytes(payload[REQUEST.size:]), None, bool(confirm))
+        except Exception as e:
+            logger.error(f"Ошибка команды клиента шлюза {client.peer}: {e}")
+            self._send_result(client, request_id, CommandResult(None, False, message=str(e)))
+            return
+        future.add_done_callback(lambda f: self._on_result(client, request_id, f))
+
+    def _on_result(self, client, request_id, future):
+        """Результат команды (в потоке, завершившем future) — в цикл шлюза; ошибка — неудачным результатом"""
+        try:
+            result = future.result()
+        except (Exception, CancelledError) as e:
+            logger.error(f"Команда клиента шлюза {client.peer} завершилась ошибкой: {e!r}")
+            result = CommandResult(None, False, message=str(e) or type(e).__name__)
+        try:
+            self._loop.call_soon_threadsafe(self._send_result, client, request_id, result)
+        except RuntimeError:  # Цикл шлюза уже остановлен
+            pass
+
+    def _send_result(self, client, request_id, result):
+        if client not in self.clients:
+            return
+        order = encode_record(result.order) if result.order is not None else None
+        body = marshal.dumps((request_id, result.success, result.transactionid, result.message, result.raw,
+                              order, result.timed_out))
+        client.writer.write(frame(FRAME_RESULT, body))  # Ответы не выбрасываются даже при переполнении
+
+    def _subscribe(self, client, topic):
+        tag, board, seccode = topic
+        if tag not in messages.DECODERS:
+            raise ValueError(f"Нет декодера для тега {tag}")
+        client.topics.add(topic)
+        key = _key(board, seccode)
+        self._topics.setdefault(tag, {}).setdefault(key, set()).add(client)
+        if tag not in self._handlers and self._connector is not None:
+            handler = self._handlers[tag] = lambda records: self.publish(tag, records)
+            self._connector.add_record_handler(tag, handler)
+
+    def _unsubscribe(self, client, topic):
+        tag, board, seccode = topic
+        client.topics.discard(topic)
+        topics = self._topics.get(tag, {})
+        key = _key(board, seccode)
+        clients = topics.get(key)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del topics[key]
+        if not topics and tag in self._handlers:  # Подписчиков тега не осталось — коннектор его не разбирает
+            self._connector.remove_record_handler(tag, self._handlers.pop(tag))
+
+    # --- Данные ---
+
+    def publish(self, tag, records):
+        """Передает записи клиентам (из любого потока); отправка — пачкой в цикле шлюза"""
+        if not self._topics.get(tag):
+            return
+        self._inbox.append((tag, records))
+        if not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        """Раскладывает накопленные записи по клиентам и пишет в каждый сокет один раз"""
+        self._scheduled = False  # До разбора очереди: новые записи запланируют следующий проход
+        inbox = self._inbox
+        out = {}  # Клиент -> [кадры]
+        counts = {}  # Клиент -> записей в кадрах
+        for _ in range(DRAIN_BATCH):
+            if not inbox:
+                break
+            tag, records = inbox.popleft()
+            topics = self._topics.get(tag)
+            if not topics:
+                continue
+            rows = [encode_record(record) for record in records]
+            everyone = topics.get(None)
+            if everyone:
+                body = frame(FRAME_DATA, marshal.dumps((tag, rows)))  # Один кадр на всех подписчиков тега
+                for client in everyone:
+                    out.setdefault(client, []).append(body)
+                    counts[client] = counts.get(client, 0) + len(rows)
+            if len(topics) > (1 if everyone else 0):  # Есть подписки с фильтром
+                selected = {}
+                for record, row in zip(records, rows):
+                    board = getattr(record, "board", None)
+                    seccode = getattr(record, "seccode", None)
+                    for key in ((board, seccode), (None, seccode), (board, None)):
+                        for client in topics.get(key, ()):
+                            if everyone is None or client not in everyone:
+                                client_rows = selected.setdefault(client, [])
+                                if not client_rows or client_rows[-1] is not row:  # Подходит по двум ключам
+                                    client_rows.append(row)
+                for client, client_rows in selected.items():
+                    out.setdefault(client, []).append(frame(FRAME_DATA, marshal.dumps((tag, client_rows))))
+                    counts[client] = counts.get(client, 0) + len(client_rows)
+        for client, frames in out.items():
+            self._write(client, frames, counts[client])
+        if inbox and not self._scheduled:  # Остальное — следующим проходом, после других задач цикла
+            self._scheduled = True
+            self._loop.call_soon(self._drain)
+
+    def _write(self, client, frames, count):
+        transport = client.writer.transport
+        if transport.is_closing():
+            return
+        buffered = transport.get_write_buffer_size()
+        if buffered > self.high_water:
+            if not client.congested:
+                client.congested = True
+                logger.warning(f"Клиент шлюза {client.peer} не успевает читать, данные для него выбрасываются")
+            client.dropped += count
+            self.dropped += count
+            return
+        if client.congested and buffered < self.high_water // 2:  # Освободилось — сообщаем о пропуске
+            client.congested = False
+            frames.insert(0, frame(FRAME_LOST, marshal.dumps(client.dropped)))
+            client.dropped = 0
+        client.writer.write(b"".join(frames))
+        client.sent += count
+
+    def stats(self):
+        return {"clients": len(self.clients), "dropped": self.dropped,
+                "congested": sum(1 for client in self.clients if client.congested),
+                "sent": sum(client.sent for client in self.clients)}
+
+
+class GatewayClient:
+    """Клиент шлюза для asyncio: команды, подписки и поток записей"""
+    def __init__(self, reader, writer, queue_size=1000):
+        self.reader = reader
+        self.writer = writer
+        self.lost = 0  # Записей шлюз выбросил, пока клиент не успевал читать
+        self._queue = asyncio.Queue(queue_size)  # Полная очередь останавливает чтение сокета
+        self._results = {}  # Номер запроса -> asyncio.Future
+        self._next_id = 0
+        self._task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=3960, queue_size=1000):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer, queue_size)
+
+    async def subscribe(self, tag, board=None, seccode=None):
+        """Подписка на записи тега; board/seccode — фильтр (None — любые)"""
+        self.writer.write(frame(FRAME_SUBSCRIBE, f"{tag}\t{board or ''}\t{seccode or ''}".encode("utf-8")))
+        await self.writer.drain()
+
+    async def unsubscribe(self, tag, board=None, seccode=None):
+        self.writer.write(frame(FRAME_UNSUBSCRIBE, f"{tag}\t{board or ''}\t{seccode or ''}".encode("utf-8")))
+        await self.writer.drain()
+
+    async def command(self, command, confirm=False):
+        """Отправляет команду через очередь коннектора шлюза; возвращает словарь с результатом"""
+        if isinstance(command, str):
+            command = command.encode("utf-8")
+        self._next_id += 1
+        request_id = self._next_id
+        future = self._results[request_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(frame(FRAME_COMMAND, REQUEST.pack(request_id, confirm) + command))
+        await self.writer.drain()
+        return await future
+
+    async def _read_loop(self):
+        reader = self.reader
+        try:
+            while True:
+                kind, length = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                body = marshal.loads(await reader.readexactly(length))
+                if kind == FRAME_DATA:
+                    tag, rows = body
+                    await self._queue.put((tag, [decode_record(name, values) for name, values in rows]))
+                elif kind == FRAME_RESULT:
+                    request_id, success, transactionid, message, raw, order, timed_out = body
+                    future = self._results.pop(request_id, None)
+                    if future is not None and not future.done():
+                        future.set_result({"success": success, "transactionid": transactionid, "message": message,
+                                           "raw": raw, "timed_out": timed_out,
+                                           "order": decode_record(*order) if order is not None else None})
+                elif kind == FRAME_LOST:
+                    self.lost += body
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if self._queue.full():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)  # Конец потока для __anext__
+            for future in self._results.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Шлюз закрыл соединение"))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self._queue.get()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    async def close(self):
+        self.writer.close()
+        self._task.cancel()
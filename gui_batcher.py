@@ -0,0 +1,78 @@
+# Пакетная доставка сообщений из сигналов Connector в окно Qt
+#
+# За кадр выводится не больше max_per_frame сообщений; остальные ждут следующих кадров.
+# Если окно не успевает, вытесняются только самые старые сообщения с данными (категория
+# "data", не больше backlog в очереди) — статусы, ошибки и прочие сообщения доходят все.
+import itertools  # Порядковые номера сообщений
+import time  # Для замера задержки до окна
+from collections import deque  # Буфер сообщений (append/popleft атомарны в CPython)
+from functools import partial  # Для привязки категории к сигналу
+from PyQt5.QtCore import QObject, QTimer, Qt  # Таймер кадров и тип соединения сигналов
+from log_view import CATEGORY_DATA  # Категория сообщений, которые можно вытеснять
+
+
+class SignalBatcher(QObject):
+    """Собирает сообщения в потоке-производителе и выводит их в окно пачками по таймеру"""
+    def __init__(self, sink, max_fps=20, max_per_frame=500, parent=None, latency=None, backlog=None):
+        super().__init__(parent)
+        self.sink = sink  # Функция sink(items, skipped) с парами (категория, текст), вызывается в потоке интерфейса
+        self.max_per_frame = max_per_frame  # Сколько сообщений выводится за один кадр
+        self.backlog = backlog or max_per_frame * max_fps * 5  # Сообщений с данными в очереди (по умолчанию ~5 с)
+        self.latency = latency  # LatencyTracker: отмечает стадию gui для сообщений, собранных при включенном замере
+        # Более старые сообщения с данными вытесняются (в лог-файле они остаются), остальные не вытесняются
+        self._data = deque(maxlen=self.backlog)  # (номер, категория, текст, замер)
+        self._other = deque()
+        self._seq = itertools.count()  # Номера сохраняют общий порядок двух очередей
+        self.collected = 0  # Сколько сообщений собрано всего
+        self.skipped = 0    # Сколько сообщений с данными вытеснено из очереди, не попав в окно
+        self._reported = 0  # Сколько вытесненных уже отмечено в окне
+        self._timer = QTimer(self)  # Таймер живет в потоке интерфейса
+        self._timer.setInterval(max(1, int(1000 / max_fps)))  # Не чаще max_fps раз в секунду
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def connect_signal(self, signal, category="info"):
+        """Подключает сигнал так, чтобы сбор шел прямо в потоке-производителе"""
+        # Без очереди событий Qt на каждое сообщение:
+        signal.connect(partial(self.collect, category=category), Qt.DirectConnection)
+
+    def collect(self, message, category="info"):
+        """Кладет сообщение в буфер (можно вызывать из любого потока)"""
+        latency = self.latency
+        trace = latency.current() if latency is not None and latency.enabled else None
+        if category == CATEGORY_DATA:
+            if len(self._data) >= self.backlog:  # Очередь полна — самое старое будет вытеснено
+                self.skipped += 1
+            self._data.append((next(self._seq), category, message, trace))
+        else:
+            self._other.append((next(self._seq), category, message, trace))
+        self.collected += 1
+
+    def pending(self):
+        """Сколько сообщений ждут вывода"""
+        return len(self._data) + len(self._other)
+
+    def flush(self):
+        """Выводит накопленные сообщения одной пачкой (вызывается таймером)"""
+        data = self._data
+        other = self._other
+        count = min(len(data) + len(other), self.max_per_frame)  # Остальное — в следующих кадрах
+        if not count:
+            return
+        batch = []
+        traced = []
+        for _ in range(count):  # Забираем по порядку номеров из обеих очередей
+            if other and (not data or other[0][0] < data[0][0]):
+                _, category, message, trace = other.popleft()
+            else:
+                _, category, message, trace = data.popleft()
+            batch.append((category, message))
+            if trace is not None:
+                traced.append(trace)
+        skipped = self.skipped - self._reported  # Вытеснено из очереди с прошлого кадра
+        self._reported += skipped
+        self.sink(batch, skipped)
+        if traced:  # Сообщения дошли до окна
+            now = time.monotonic_ns()
+            for trace in traced:
+                self.latency.mark_trace("gui", trace, now)
@@ -0,0 +1,89 @@
+# Работа без окна: подключение по config.xml, переподключение, остановка по Ctrl+C или SIGTERM
+#
+#   python terminal_connector_j.py --headless
+#   python terminal_connector_j.py --headless --host tr2.finam.online:3900   # резервный адрес
+#
+# Логин, пароль и адрес берутся из config.xml, который сохраняет окно программы. PyQt5 не
+# загружается: события коннектора (events.ConnectorEvents) вызывают обработчики прямо в
+# потоках-обработчиках, сообщения о соединении и ошибках идут в лог. Так программу можно
+# запускать службой (systemd, NSSM) или в контейнере.
+import logging  # Для ведения логов
+import os  # Для работы с файлами и путями
+import signal  # Остановка по SIGTERM от менеджера служб
+import threading  # Ожидание сигнала остановки
+import xml.etree.ElementTree as ET  # Для разбора config.xml
+from securities_cache import SecuritiesCache  # Справочник инструментов со снимком на диске
+from subscriptions import SubscriptionManager  # Пакетные подписки на сделки и стаканы
+from connection_supervisor import ConnectionSupervisor  # Переподключение и резервные адреса
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+
+def load_config(path, decrypt_password):
+    """Читает config.xml окна: (login, password, host, port)"""
+    root = ET.parse(path).getroot()
+    return (root.find("login").text, decrypt_password(root.find("password").text),
+            root.find("host").text, root.find("port").text)
+
+
+def parse_host(text):
+    """"адрес:порт" -> (адрес, порт)"""
+    host, _, port = text.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Адрес должен быть вида адрес:порт: {text}")
+    return host, int(port)
+
+
+class HeadlessApp:
+    """Коннектор, справочник, подписки и переподключение без окна"""
+    def __init__(self, connector, path, backup_hosts=()):
+        self.connector = connector
+        self.path = path  # Папка коннектора: config.xml, DLL, лог-файлы, securities.cache
+        self.backup_hosts = list(backup_hosts)  # [(адрес, порт)] — на случай сбоя основного адреса
+        self.securities = SecuritiesCache(os.path.join(path, "securities.cache"))
+        self.securities.attach(connector)
+        self.securities.preload()  # Снимок прошлой сессии читается в фоне
+        self.subscriptions = SubscriptionManager()  # Подписки на данные, повторяются после переподключения
+        self.subscriptions.attach(connector)
+        self.supervisor = ConnectionSupervisor()  # Следит за соединением и переподключается при сбоях
+        self.supervisor.attach(connector)
+        connector.signals.connection_status_changed.connect(logger.info)
+        connector.signals.error_occurred.connect(logger.error)
+        self.stopped = threading.Event()
+
+    def start(self):
+        """Инициализирует коннектор и отправляет команду подключения (не ждет ответа)"""
+        login, password, host, port = load_config(os.path.join(self.path, "config.xml"),
+                                                  self.connector.decrypt_password)
+        logger.info(f"Инициализация: {self.connector.initialize(self.path, 1)}")
+        hosts = [(host, port)] + [address for address in self.backup_hosts if address != (host, int(port))]
+        return self.supervisor.start(hosts, login, password)
+
+    def stop(self, *_):
+        """Останавливает работу (можно вызывать из обработчика сигнала)"""
+        self.stopped.set()
+
+    def shutdown(self):
+        """Отключается и сохраняет справочник"""
+        self.supervisor.stop()  # Отключение — не сбой, переподключаться не нужно
+        logger.info(f"Отключение: {self.connector.uninitialize()}")
+        self.securities.save()  # Для быстрого следующего запуска
+
+    def run(self):
+        """Работает до Ctrl+C или SIGTERM; возвращает код выхода"""
+        signal.signal(signal.SIGINT, self.stop)
+        if hasattr(signal, "SIGTERM"):
+            signal.signal(signal.SIGTERM, self.stop)
+        try:
+            self.start()
+        except Exception as e:
+            logger.error(f"Ошибка подключения: {e}")
+            return 1
+        while not self.stopped.wait(1.0):  # С таймаутом: на Windows Ctrl+C не прерывает бесконечное ожидание
+            pass
+        try:
+            self.shutdown()
+        except Exception as e:
+            logger.error(f"Ошибка отключения: {e}")
+            return 1
+        return 0
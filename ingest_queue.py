@@ -0,0 +1,223 @@
+# Очередь входящих сообщений Transaq между callback DLL и потоками разбора
+#
+# При переполнении политики DROP_OLDEST и COALESCE выбрасывают самое старое сообщение, но
+# никогда — сообщения о заявках, сделках, позициях и состоянии соединения (PROTECTED_TAGS):
+# вместо них выбрасывается самое старое из остальных (стаканы, котировки, сделки рынка).
+# Если выбросить нечего, очередь временно растет сверх maxsize. О выбросах пишется
+# предупреждение в лог (не чаще раза в DROP_WARNING_INTERVAL секунд).
+import logging  # Для ведения логов
+import threading  # Для потоков-обработчиков
+import time  # Для таймаутов ожидания
+from collections import deque  # Быстрая очередь (append/popleft атомарны в CPython)
+from xml_stream import sniff_root_tag  # Определение корневого тега по первым байтам
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+# Политики поведения при переполнении очереди:
+DROP_OLDEST = "drop_oldest"  # Выбрасываем самое старое сообщение
+BLOCK = "block"              # Ждем, пока обработчики освободят место
+COALESCE = "coalesce"        # Заменяем ожидающее сообщение с тем же ключом на новое
+
+POLICIES = (DROP_OLDEST, BLOCK, COALESCE)
+
+# Сообщения, которые нельзя выбрасывать: без них теряется состояние заявок, позиций и соединения
+PROTECTED_TAGS = frozenset((
+    b"server_status", b"error", b"orders", b"stoporders", b"trades", b"positions",
+    b"client", b"messages",
+))
+DROP_WARNING_INTERVAL = 1.0  # Секунд между предупреждениями о выброшенных сообщениях
+
+# Сообщения, где каждое новое полностью заменяет предыдущее (их можно схлопывать). Без
+# server_status (важен каждый переход: разрыв, потом подключение) и client (у каждого счета
+# свое сообщение)
+SNAPSHOT_TAGS = frozenset((
+    b"current_server", b"connector_version", b"markets", b"boards", b"candlekinds", b"union",
+))
+
+
+def is_protected(item):
+    """Сообщение нельзя выбрасывать при переполнении"""
+    return sniff_root_tag(item[1]) in PROTECTED_TAGS
+
+
+def default_coalesce_key(item):
+    """Ключ схлопывания по умолчанию: только сообщения-снимки, по корневому тегу"""
+    tag = sniff_root_tag(item[1])  # Элемент очереди — (время приема, байты)
+    return tag if tag in SNAPSHOT_TAGS else None  # None — сообщение схлопывать нельзя
+
+
+class IngestQueue:
+    """Ограниченная кольцевая очередь сырых сообщений с настраиваемым противодавлением
+
+    Элементы очереди — пары (time.monotonic_ns() приема, bytes сообщения).
+    """
+    def __init__(self, maxsize=65536, policy=DROP_OLDEST, key_func=default_coalesce_key, protect=is_protected):
+        if policy not in POLICIES:  # Проверяем политику переполнения
+            raise ValueError(f"Неизвестная политика очереди: {policy}")
+        self.maxsize = maxsize  # Максимальная глубина очереди
+        self.policy = policy    # Политика при переполнении
+        self.key_func = key_func if policy == COALESCE else None  # Функция ключа для схлопывания
+        self.protect = protect  # protect(item) -> True: сообщение нельзя выбрасывать
+        self._items = deque()  # Элементы [ключ схлопывания, сообщение] (для block — сами сообщения)
+        self._ready = threading.Event()  # Событие "в очереди что-то есть"
+        self._space = threading.Condition()  # Ожидание свободного места (политика block)
+        self._lock = threading.Lock()  # Блокировка для политик drop_oldest и coalesce
+        self._pending = {}  # Ключ -> ожидающий элемент (политика coalesce)
+        self._workers = []  # Потоки-обработчики
+        self._counts = []  # Обработано каждым потоком-обработчиком (пишет только свой поток)
+        self._running = False  # Флаг работы обработчиков
+        self._dropped_logged = 0  # Значение dropped при последнем предупреждении
+        self._drop_warned = 0.0  # Время последнего предупреждения
+
+        # Счетчики:
+        self.pushed = 0     # Сколько сообщений положено в очередь
+        self.dropped = 0    # Сколько сообщений выброшено при переполнении
+        self.coalesced = 0  # Сколько сообщений схлопнуто с более новыми
+        self.max_depth = 0  # Максимальная наблюдавшаяся глубина
+
+    def __len__(self):
+        return len(self._items)  # Текущая глубина очереди
+
+    @property
+    def processed(self):
+        """Сколько сообщений обработано всеми потоками-обработчиками"""
+        return sum(self._counts)
+
+    def put(self, data):
+        """Кладет сообщение в очередь (вызывается из потока DLL)"""
+        if self.policy == BLOCK:
+            if len(self._items) >= self.maxsize:  # Очередь полна — ждем обработчиков
+                with self._space:
+                    while len(self._items) >= self.maxsize and self._running:
+                        self._space.wait(0.1)
+            self._items.append(data)
+        else:
+            self._put_locked(data)
+        self.pushed += 1
+        depth = len(self._items)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if not self._ready.is_set():  # Будим обработчик, только если он спит
+            self._ready.set()
+
+    def _put_locked(self, data):
+        """Кладет сообщение (drop_oldest, coalesce): схлопывает с ожидающим или выбрасывает старое"""
+        key = self.key_func(data) if self.key_func else None
+        with self._lock:
+            if key is not None:
+                entry = self._pending.get(key)
+                if entry is not None:  # Такое сообщение уже ждет обработки — заменяем данные
+                    entry[1] = data
+                    self.coalesced += 1
+                    return
+            if len(self._items) >= self.maxsize:  # Очередь полна — выбрасываем самое старое
+                self._evict()
+            entry = [key, data]
+            if key is not None:
+                self._pending[key] = entry
+            self._items.append(entry)
+        if self.dropped != self._dropped_logged:
+            self._warn_dropped()
+
+    def _evict(self):
+        """Выбрасывает самое старое сообщение, которое можно выбросить; вызывается под блокировкой"""
+        items = self._items
+        protect = self.protect
+        for index, (key, data) in enumerate(items):
+            if protect is None or not protect(data):
+                del items[index]
+                if key is not None:
+                    del self._pending[key]
+                self.dropped += 1
+                return
+        # Все ожидающие сообщения защищены — очередь растет сверх maxsize
+
+    def _warn_dropped(self):
+        """Предупреждение о выброшенных сообщениях, не чаще раза в DROP_WARNING_INTERVAL секунд"""
+        now = time.monotonic()
+        if now - self._drop_warned < DROP_WARNING_INTERVAL:
+            return
+        dropped = self.dropped
+        logger.warning(f"Очередь переполнена ({self.maxsize}): выброшено {dropped - self._dropped_logged} "
+                       f"сообщений, всего {dropped}. Обработчики не успевают за потоком")
+        self._dropped_logged = dropped
+        self._drop_warned = now
+
+    def get(self, timeout=None):
+        """Забирает следующее сообщение; возвращает None по таймауту или при остановке"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            item = self._pop()
+            if item is not None:
+                return item
+            if not self._running and deadline is None:
+                return None
+            self._ready.clear()
+            if self._items:  # Сообщение пришло между pop и clear
+                continue
+            remaining = 0.1 if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._ready.wait(min(remaining, 0.1))
+
+    def _pop(self):
+        """Снимает элемент с головы очереди или возвращает None"""
+        if self.policy != BLOCK:
+            with self._lock:
+                if not self._items:
+                    return None
+                key, data = self._items.popleft()
+                if key is not None:
+                    del self._pending[key]
+                return data
+        try:
+            data = self._items.popleft()
+        except IndexError:
+            return None
+        with self._space:  # Сообщаем ожидающему потоку DLL о свободном месте
+            self._space.notify()
+        return data
+
+    def start_workers(self, handler, count=1, name="IngestWorker"):
+        """Запускает потоки, которые забирают сообщения и передают их в handler"""
+        self._running = True
+        for i in range(count):  # При count > 1 порядок обработки сообщений не гарантируется
+            self._counts.append(0)
+            worker = threading.Thread(target=self._worker_loop, args=(handler, len(self._counts) - 1),
+                                      name=f"{name}-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker_loop(self, handler, slot):
+        """Цикл потока-обработчика; slot — его счетчик в _counts"""
+        counts = self._counts
+        while self._running or self._items:
+            data = self.get()
+            if data is None:
+                continue
+            try:
+                handler(data)  # Разбор и рассылка сообщения
+            except Exception as e:
+                logger.error(f"Ошибка обработки сообщения: {e}", exc_info=True)
+            counts[slot] += 1  # У каждого потока свой счетчик: += из нескольких потоков теряет значения
+
+    def stop(self, timeout=5.0):
+        """Останавливает обработчики, дав им разобрать остаток очереди"""
+        self._running = False
+        self._ready.set()  # Будим спящие потоки
+        with self._space:
+            self._space.notify_all()  # Отпускаем заблокированный поток DLL
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def stats(self):
+        """Возвращает счетчики очереди"""
+        return {
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "pushed": self.pushed,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
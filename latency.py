@@ -0,0 +1,189 @@
+# Замер задержек сообщений от callback DLL до лог-файла и окна (включается по желанию)
+#
+# Каждая стадия отмечается временем, прошедшим с момента приема сообщения транспортом:
+#   receive  — сообщение взято из очереди потоком-обработчиком
+#   decode   — байты декодированы в текст (terminal_connector_j.py)
+#   parse    — определен тип сообщения
+#   dispatch — типизированные записи переданы подписчикам
+#   log      — строка передана в Log.write_log
+#   gui      — сообщение выведено в окно (поток интерфейса)
+# Значения копятся в гистограммах с логарифмическими корзинами (как HdrHistogram)
+# отдельно для каждого корневого тега.
+import logging  # Для вывода отчета
+import threading  # Текущее сообщение потока и периодический отчет
+import time  # Для монотонного времени
+from xml_stream import sniff_root_tag  # Тег сообщения по первым байтам
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+STAGES = ("receive", "decode", "parse", "dispatch", "log", "gui")
+SUB_BITS = 5  # 32 корзины на каждую степень двойки: погрешность не больше ~3%
+_SUB_COUNT = 1 << SUB_BITS
+_HALF = _SUB_COUNT // 2
+BUCKETS = (64 - SUB_BITS + 1) * _HALF + _HALF  # Хватает на любое значение до 2**63 нс
+
+
+def bucket_index(value):
+    """Номер корзины для значения в нс"""
+    if value < _SUB_COUNT:
+        return value if value > 0 else 0
+    shift = value.bit_length() - SUB_BITS
+    return shift * _HALF + (value >> shift)
+
+
+def bucket_value(index):
+    """Середина корзины в нс (обратное к bucket_index)"""
+    if index < _SUB_COUNT:
+        return index
+    shift = index // _HALF - 1
+    return ((index - shift * _HALF) << shift) + (1 << shift) // 2
+
+
+class Histogram:
+    """Гистограмма задержек с логарифмическими корзинами постоянного размера
+
+    Запись — одна операция со списком, без блокировок: при одновременной записи
+    из нескольких потоков единичные отсчеты могут теряться, для статистики это
+    несущественно.
+    """
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.max = 0
+
+    def record(self, value):
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Значение p-го перцентиля (0..100) в нс"""
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * p / 100 + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= target:
+                    return min(bucket_value(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        """Добавляет отсчеты другой гистограммы"""
+        counts = self.counts
+        for index, n in enumerate(other.counts):
+            if n:
+                counts[index] += n
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+
+class LatencyTracker:
+    """Отметки времени по стадиям для сообщения, которое обрабатывает текущий поток
+
+    Когда замер выключен (enabled=False), вызывающий код проверяет только этот
+    флаг и больше ничего не делает.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._local = threading.local()  # Текущее сообщение потока: (время приема, тег)
+        self._histograms = {}  # (тег, стадия) -> Histogram
+        self._lock = threading.Lock()  # Только для создания новых гистограмм
+        self._periodic = None
+        self._periodic_stop = threading.Event()
+
+    def begin(self, recv_ns, data):
+        """Начинает отслеживание сообщения в текущем потоке и отмечает стадию receive"""
+        trace = (recv_ns, sniff_root_tag(data))
+        self._local.trace = trace
+        self.record("receive", trace[1], time.monotonic_ns() - recv_ns)
+
+    def current(self):
+        """Сообщение, которое обрабатывает текущий поток: (время приема, тег) или None"""
+        return getattr(self._local, "trace", None)
+
+    def end(self):
+        """Заканчивает отслеживание сообщения в текущем потоке"""
+        self._local.trace = None
+
+    def mark(self, stage):
+        """Отмечает, что текущее сообщение дошло до стадии stage"""
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            self.record(stage, trace[1], time.monotonic_ns() - trace[0])
+
+    def mark_trace(self, stage, trace, now=None):
+        """Отмечает стадию для сообщения, переданного в другой поток (например, в окно)"""
+        self.record(stage, trace[1], (now or time.monotonic_ns()) - trace[0])
+
+    def record(self, stage, tag, value):
+        """Добавляет значение в нс в гистограмму стадии для тега"""
+        key = (tag, stage)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        histogram.record(value)
+
+    def reset(self):
+        """Сбрасывает накопленную статистику"""
+        with self._lock:
+            self._histograms = {}
+
+    def report(self):
+        """Возвращает {тег: {стадия: {count, p50, p99, p99.9, max}}} со значениями в мкс"""
+        result = {}
+        for (tag, stage), histogram in list(self._histograms.items()):
+            name = tag.decode("utf-8", "replace") if tag else "?"
+            result.setdefault(name, {})[stage] = {
+                "count": histogram.count,
+                "p50": histogram.percentile(50) / 1000,
+                "p99": histogram.percentile(99) / 1000,
+                "p99.9": histogram.percentile(99.9) / 1000,
+                "max": histogram.max / 1000,
+            }
+        return result
+
+    def format_report(self):
+        """Отчет в виде текста: строка на каждую пару (тег, стадия)"""
+        lines = [f"{'тег':<16}{'стадия':<10}{'count':>10}{'p50 мкс':>12}{'p99 мкс':>12}{'p99.9 мкс':>12}{'max мкс':>12}"]
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        for tag, stages in sorted(self.report().items()):
+            for stage, s in sorted(stages.items(), key=lambda item: order.get(item[0], len(order))):
+                lines.append(f"{tag:<16}{stage:<10}{s['count']:>10}{s['p50']:>12.1f}{s['p99']:>12.1f}"
+                             f"{s['p99.9']:>12.1f}{s['max']:>12.1f}")
+        return "\n".join(lines)
+
+    def dump(self, write=None):
+        """Выводит отчет (по умолчанию — в логгер модуля)"""
+        text = "Задержки от приема сообщения:\n" + self.format_report()
+        if write is None:
+            logger.info(text)
+        else:
+            write(text)
+
+    def start_periodic(self, interval=60.0, write=None):
+        """Выводит отчет каждые interval секунд в отдельном потоке"""
+        self.stop_periodic()
+        self._periodic_stop.clear()
+
+        def loop():
+            while not self._periodic_stop.wait(interval):
+                try:
+                    self.dump(write)
+                except Exception as e:
+                    logger.error(f"Ошибка отчета о задержках: {e}")
+
+        self._periodic = threading.Thread(target=loop, name="LatencyReport", daemon=True)
+        self._periodic.start()
+
+    def stop_periodic(self):
+        """Останавливает периодический отчет"""
+        if self._periodic is not None:
+            self._periodic_stop.set()
+            self._periodic.join()
+            self._periodic = None
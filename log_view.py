@@ -0,0 +1,152 @@
+# Журнал сообщений с ограниченным кольцевым буфером (модель/представление Qt)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel  # Модели Qt
+from PyQt5.QtGui import QBrush, QColor, QPainter  # Цвет ошибок и подсказка в пустом журнале
+from PyQt5.QtWidgets import QWidget, QListView, QCheckBox, QHBoxLayout, QVBoxLayout, QLabel  # Элементы интерфейса
+
+# Категории сообщений журнала:
+CATEGORY_INFO = "info"      # Служебные сообщения окна
+CATEGORY_STATUS = "status"  # Состояние соединения
+CATEGORY_ERROR = "error"    # Ошибки
+CATEGORY_DATA = "data"      # Данные от сервера
+
+CATEGORY_NAMES = {  # Подписи для переключателей фильтра
+    CATEGORY_INFO: "Служебные",
+    CATEGORY_STATUS: "Статус",
+    CATEGORY_ERROR: "Ошибки",
+    CATEGORY_DATA: "Данные",
+}
+
+CategoryRole = Qt.UserRole + 1  # Роль, по которой модель отдает категорию строки
+
+
+class RingLogModel(QAbstractListModel):
+    """Модель журнала поверх кольцевого буфера фиксированной емкости"""
+    def __init__(self, capacity=100000, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity  # Максимум строк в журнале
+        self._buffer = [None] * capacity  # Кольцевой буфер пар (категория, текст)
+        self._start = 0  # Индекс самой старой строки в буфере
+        self._count = 0  # Сколько строк сейчас в буфере
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def item(self, row):
+        """Возвращает пару (категория, текст) по номеру строки за O(1)"""
+        return self._buffer[(self._start + row) % self.capacity]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        category, text = self.item(index.row())
+        if role == Qt.DisplayRole:
+            return text
+        if role == CategoryRole:
+            return category
+        if role == Qt.ForegroundRole and category == CATEGORY_ERROR:
+            return QBrush(QColor("darkred"))  # Ошибки выделяем цветом
+        return None
+
+    def append_rows(self, items):
+        """Добавляет пачку строк, вытесняя самые старые при переполнении"""
+        if not items:
+            return
+        if len(items) > self.capacity:  # Больше емкости — нужны только последние
+            items = items[-self.capacity:]
+        overflow = self._count + len(items) - self.capacity
+        if overflow > 0:  # Сначала удаляем самые старые строки
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            self._start = (self._start + overflow) % self.capacity
+            self._count -= overflow
+            self.endRemoveRows()
+        first = self._count
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        for offset, item in enumerate(items):
+            self._buffer[(self._start + first + offset) % self.capacity] = item
+        self._count += len(items)
+        self.endInsertRows()
+
+    def clear(self):
+        """Очищает журнал"""
+        self.beginResetModel()
+        self._buffer = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+        self.endResetModel()
+
+
+class CategoryFilterModel(QSortFilterProxyModel):
+    """Фильтр строк журнала по категориям (текст строк при этом не перестраивается)"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._hidden = set()  # Скрытые категории
+
+    def set_category_visible(self, category, visible):
+        """Показывает или скрывает строки категории"""
+        if visible:
+            self._hidden.discard(category)
+        else:
+            self._hidden.add(category)
+        self.invalidateFilter()  # Пересчитываем только список видимых строк
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._hidden:  # Фильтр выключен — быстрый путь
+            return True
+        return self.sourceModel().item(source_row)[0] not in self._hidden
+
+
+class _LogListView(QListView):
+    """Список строк журнала с подсказкой, пока журнал пуст"""
+    def __init__(self, placeholder="", parent=None):
+        super().__init__(parent)
+        self.placeholder = placeholder  # Текст подсказки
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.placeholder and self.model() is not None and self.model().rowCount() == 0:
+            painter = QPainter(self.viewport())
+            painter.setPen(self.palette().placeholderText().color())
+            painter.drawText(self.viewport().rect().adjusted(4, 4, -4, -4),
+                             Qt.AlignTop | Qt.AlignLeft | Qt.TextWordWrap, self.placeholder)
+
+
+class LogView(QWidget):
+    """Виджет журнала: ограниченная модель, фильтр по категориям и отрисовка только видимых строк"""
+    def __init__(self, capacity=100000, categories=tuple(CATEGORY_NAMES), placeholder="", parent=None):
+        super().__init__(parent)
+        self.model = RingLogModel(capacity, self)  # Кольцевой буфер строк
+        self.proxy = CategoryFilterModel(self)  # Фильтр по категориям
+        self.proxy.setSourceModel(self.model)
+
+        self.view = _LogListView(placeholder)
+        self.view.setModel(self.proxy)
+        self.view.setUniformItemSizes(True)  # Одинаковая высота строк: прокрутка и отрисовка не зависят от размера журнала
+        self.view.setSelectionMode(QListView.ExtendedSelection)
+
+        # Переключатели категорий:
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Показывать:"))
+        for category in categories:
+            checkbox = QCheckBox(CATEGORY_NAMES.get(category, category))
+            checkbox.setChecked(True)
+            checkbox.toggled.connect(lambda checked, c=category: self.proxy.set_category_visible(c, checked))
+            filter_layout.addWidget(checkbox)
+        filter_layout.addStretch()
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.view)
+        self.setLayout(layout)
+
+    def append_messages(self, items):
+        """Добавляет пачку пар (категория, текст) и прокручивает вниз, если журнал был внизу"""
+        scrollbar = self.view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()  # Пользователь не листает историю
+        self.model.append_rows(items)
+        if at_bottom:
+            self.view.scrollToBottom()
+
+    def clear(self):
+        """Очищает журнал"""
+        self.model.clear()
@@ -0,0 +1,195 @@
+# Асинхронная буферизованная запись лог-файла (фоновый поток, ротация, счетчики)
+#
+# Очередь строк ограничена max_queue: если диск не успевает, write_log ждет, пока поток
+# записи освободит место (строки не теряются, память не растет). При выходе из программы
+# все открытые логи дописываются одним обработчиком atexit.
+import atexit  # Чтобы дописать буфер при выходе из программы
+import logging  # Для сообщений об ошибках записи
+import os  # Для работы с файлами и путями
+import threading  # Для фонового потока записи
+import time  # Для монотонного времени
+import weakref  # Список открытых логов для atexit, не мешающий удалять объекты
+from collections import deque  # Очередь строк (append/popleft атомарны в CPython)
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+_active = weakref.WeakSet()  # Логи, которые сейчас пишут в файл
+
+
+@atexit.register
+def _stop_all():
+    """Финальный сброс всех открытых логов, даже если stop_logging не вызвали"""
+    for log in list(_active):
+        log.stop_logging()
+
+
+class Log:
+    """Класс для записи логов в файл: строки копятся в памяти и пишутся фоновым потоком"""
+    def __init__(self, flush_bytes=256 * 1024, flush_interval=0.5,
+                 max_bytes=100 * 1024 * 1024, rotate_interval=24 * 3600, backup_count=10, max_queue=200000):
+        self.log_flag = False  # Флаг, разрешена ли запись логов
+        self.log_file = None   # Файл, куда пишутся логи
+        self.path = None       # Путь к текущему файлу
+        self.flush_bytes = flush_bytes        # Сброс на диск, когда накопилось столько байт
+        self.flush_interval = flush_interval  # ...или прошло столько секунд
+        self.max_bytes = max_bytes            # Ротация по размеру файла, проверяется между пачками (0 — выключена)
+        self.rotate_interval = rotate_interval  # Ротация по времени, сек (None — выключена)
+        self.backup_count = backup_count      # Сколько старых файлов хранить (path.1 ... path.N)
+        self.max_queue = max_queue            # Строк в очереди, после которых write_log ждет поток записи
+
+        self._queue = deque()  # Пары (монотонное время в нс, строка или байты)
+        self._space = threading.Condition()  # Ожидание места в очереди
+        self._pending = 0      # Примерный объем неподтвержденных данных
+        self._wake = threading.Event()  # Разбудить поток записи раньше таймаута
+        self._thread = None    # Поток записи
+        self._running = False
+        self._file_size = 0    # Текущий размер файла
+        self._rotate_at = None  # Монотонное время следующей ротации по времени
+        self._wall_base = 0    # Пара для перевода монотонного времени в настенное
+        self._mono_base = 0
+        self._second = None    # Секунда, для которой отформатирован префикс времени
+        self._prefix = b""     # Отформатированное "ЧЧ:ММ:СС" этой секунды
+
+        # Счетчики пропускной способности:
+        self.lines_total = 0     # Всего записано строк
+        self.bytes_total = 0     # Всего записано байт
+        self.lines_per_sec = 0.0  # Скорость за последний интервал
+        self.bytes_per_sec = 0.0
+        self._rate_time = time.monotonic()
+        self._rate_lines = 0
+        self._rate_bytes = 0
+        self.waits = 0  # Сколько раз write_log ждал места в очереди
+
+    def write_log(self, log_str):
+        """Кладет строку (str или bytes) в буфер; на диск ее запишет фоновый поток"""
+        if self.log_flag:  # Если запись разрешена
+            if len(self._queue) >= self.max_queue:  # Диск не успевает — ждем поток записи
+                self._wait_space()
+            self._queue.append((time.monotonic_ns(), log_str))  # Время фиксируем дешево, форматируем потом
+            self._pending += len(log_str)
+            if self._pending >= self.flush_bytes and not self._wake.is_set():
+                self._wake.set()  # Буфер заполнен — пишем, не дожидаясь таймера
+
+    def _wait_space(self):
+        """Ждет, пока поток записи освободит место в очереди"""
+        self.waits += 1
+        self._wake.set()
+        with self._space:
+            while len(self._queue) >= self.max_queue and self._running:
+                self._space.wait(0.1)
+
+    def start_logging(self, path):
+        """Начинает запись логов в указанный файл"""
+        if self.log_flag:  # Повторный вызов — сначала закрываем предыдущий файл
+            self.stop_logging()
+        self.path = path
+        self._open()
+        self._running = True
+        self.log_flag = True  # Разрешаем запись
+        self._thread = threading.Thread(target=self._writer_loop, name="LogWriter", daemon=True)
+        self._thread.start()
+        _active.add(self)
+        self.write_log("START LOGGING")  # Пишем первую запись
+
+    def stop_logging(self):
+        """Останавливает запись логов, дописав весь буфер на диск"""
+        if self.log_flag and self.log_file:  # Если запись была активна
+            self.write_log("STOP LOGGING")  # Пишем последнюю запись
+        self.log_flag = False  # Запрещаем дальнейшую запись
+        _active.discard(self)
+        if self._thread is not None:
+            self._running = False
+            self._wake.set()
+            self._thread.join()  # Поток сам дописывает остаток очереди перед выходом
+            self._thread = None
+        if self.log_file:
+            self.log_file.close()  # Закрываем файл
+            self.log_file = None
+
+    def stats(self):
+        """Возвращает счетчики: строки/с, байты/с, глубину очереди и итоги"""
+        return {
+            "lines_per_sec": self.lines_per_sec,
+            "bytes_per_sec": self.bytes_per_sec,
+            "queue_depth": len(self._queue),
+            "waits": self.waits,
+            "lines_total": self.lines_total,
+            "bytes_total": self.bytes_total,
+        }
+
+    def _open(self):
+        """Открывает файл в двоичном режиме добавления и калибрует часы"""
+        self.log_file = open(self.path, "ab")
+        self._file_size = self.log_file.tell()
+        self._wall_base = time.time_ns()  # Настенное время для перевода монотонного
+        self._mono_base = time.monotonic_ns()
+        if self.rotate_interval:
+            self._rotate_at = self._mono_base + int(self.rotate_interval * 1e9)
+
+    def _rotate(self):
+        """Переименовывает файлы path -> path.1 -> ... -> path.N и открывает новый"""
+        self.log_file.close()
+        for i in range(self.backup_count - 1, 0, -1):  # Сдвигаем старые файлы
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _writer_loop(self):
+        """Цикл потока записи: сброс по размеру буфера или по таймеру"""
+        while self._running or self._queue:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._write_batch()
+            except OSError as e:  # Ошибка диска не должна убивать поток
+                logger.error(f"Ошибка записи лога: {e}")
+
+    def _write_batch(self):
+        """Форматирует и записывает на диск все накопленные строки одной операцией"""
+        count = len(self._queue)
+        if count == 0:
+            self._update_rates()
+            return
+        chunks = []
+        size = 0
+        offset = self._wall_base - self._mono_base  # Перевод монотонного времени в настенное
+        for _ in range(count):
+            mono, data = self._queue.popleft()
+            wall_ms = (mono + offset) // 1_000_000
+            second = wall_ms // 1000
+            if second != self._second:  # Префикс времени форматируем не чаще раза в секунду
+                self._second = second
+                self._prefix = time.strftime("%H:%M:%S", time.localtime(second)).encode("ascii")
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            line = b"%s.%03d %s\n" % (self._prefix, wall_ms % 1000, data)
+            chunks.append(line)
+            size += len(line)
+        with self._space:  # Место в очереди освободилось
+            self._space.notify_all()
+        self._pending = max(0, self._pending - size)
+        if (self.max_bytes and self._file_size + size > self.max_bytes and self._file_size > 0) or \
+                (self._rotate_at is not None and time.monotonic_ns() >= self._rotate_at):
+            self._rotate()
+        self.log_file.write(b"".join(chunks))  # Одна запись на всю пачку
+        self.log_file.flush()
+        self._file_size += size
+        self.lines_total += count
+        self.bytes_total += size
+        self._update_rates()
+
+    def _update_rates(self):
+        """Пересчитывает скорость записи примерно раз в секунду"""
+        now = time.monotonic()
+        elapsed = now - self._rate_time
+        if elapsed >= 1.0:
+            self.lines_per_sec = (self.lines_total - self._rate_lines) / elapsed
+            self.bytes_per_sec = (self.bytes_total - self._rate_bytes) / elapsed
+            self._rate_time = now
+            self._rate_lines = self.lines_total
+            self._rate_bytes = self.bytes_total
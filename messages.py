@@ -0,0 +1,429 @@
+# Типизированные записи для основных сообщений Transaq и реестр декодеров по корневому тегу
+import calendar  # Для перевода даты в секунды эпохи (UTC)
+from xml_stream import root_attrib, parse_root, iter_children  # Потоковый разбор XML
+
+PRICE_DIGITS = 6  # Сколько знаков после запятой хранится в цене
+PRICE_SCALE = 10 ** PRICE_DIGITS  # Цена хранится как целое: 251.37 -> 251370000
+
+_DAY_CACHE = {}  # Кэш "дд.мм.гггг" -> миллисекунды начала дня (UTC)
+
+
+def to_scaled(text):
+    """Переводит десятичную строку в целое, умноженное на PRICE_SCALE (без float)"""
+    if not text:
+        return None
+    negative = text[0] == "-"  # Знак обрабатываем отдельно, чтобы не потерять "-0.5"
+    if negative:
+        text = text[1:]
+    whole, _, frac = text.partition(".")
+    value = int(whole or 0) * PRICE_SCALE + int((frac + "000000")[:PRICE_DIGITS] or 0)
+    return -value if negative else value
+
+
+def from_scaled(value):
+    """Переводит целую цену обратно в строку для команд и журнала"""
+    if value is None:
+        return ""
+    sign = "-" if value < 0 else ""
+    whole, frac = divmod(abs(value), PRICE_SCALE)
+    frac = str(frac).rjust(PRICE_DIGITS, "0").rstrip("0")
+    return f"{sign}{whole}.{frac}" if frac else f"{sign}{whole}"
+
+
+def to_int(text):
+    """Переводит строку в целое (None для пустых значений)"""
+    return int(text) if text else None
+
+
+def to_bool(text):
+    """Переводит "true"/"false" в bool"""
+    return text == "true" if text else None
+
+
+def to_time(text):
+    """Переводит время Transaq "дд.мм.гггг чч:мм:сс[.ммм]" в миллисекунды эпохи (UTC)"""
+    if not text:
+        return None
+    day = _DAY_CACHE.get(text[:10])
+    if day is None:  # Дата встречается впервые — считаем начало дня и запоминаем
+        day = calendar.timegm((int(text[6:10]), int(text[3:5]), int(text[0:2]), 0, 0, 0)) * 1000
+        _DAY_CACHE[text[:10]] = day
+    ms = int(text[20:23]) if len(text) > 20 else 0
+    return day + ((int(text[11:13]) * 60 + int(text[14:16])) * 60 + int(text[17:19])) * 1000 + ms
+
+
+class Record:
+    """Базовая запись: поля в __slots__, значения по умолчанию — None"""
+    __slots__ = ()
+    tag = None  # Имя XML-элемента записи
+    fields = {}  # XML-имя поля (атрибут или дочерний тег) -> (имя слота, преобразование)
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    @classmethod
+    def from_element(cls, elem):
+        """Создает запись из XML-элемента за один проход по дочерним тегам"""
+        record = cls()
+        fields = cls.fields
+        for key, value in elem.attrib.items():  # Атрибуты (secid, transactionid и т.п.)
+            spec = fields.get(key)
+            if spec is not None:
+                setattr(record, spec[0], spec[1](value))
+        for child in elem:  # Дочерние теги
+            spec = fields.get(child.tag)
+            if spec is not None:
+                setattr(record, spec[0], spec[1](child.text))
+        return record
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+def _text(value):
+    """Строковое поле без преобразования"""
+    return value
+
+
+class ServerStatus(Record):
+    """Состояние соединения с сервером (<server_status>)"""
+    __slots__ = ("connected", "recover", "server_id", "server_tz", "message")
+    tag = "server_status"
+    fields = {
+        "connected": ("connected", _text),  # "true", "false" или "error"
+        "recover": ("recover", to_bool),    # true — коннектор сам восстанавливает связь
+        "id": ("server_id", to_int),
+        "server_tz": ("server_tz", _text),
+    }
+
+
+class Quote(Record):
+    """Уровень стакана (<quotes>/<quote>); buy/sell = -1 означает удаление уровня"""
+    __slots__ = ("secid", "board", "seccode", "price", "source", "yld", "buy", "sell")
+    tag = "quote"
+    fields = {
+        "secid": ("secid", to_int),
+        "board": ("board", _text),
+        "seccode": ("seccode", _text),
+        "price": ("price", to_scaled),
+        "source": ("source", _text),
+        "yield": ("yld", to_scaled),
+        "buy": ("buy", to_int),
+        "sell": ("sell", to_int),
+    }
+
+
+class Quotation(Record):
+    """Котировка инструмента (<quotations>/<quotation>); в обновлении есть только изменившиеся поля"""
+    __slots__ = ("secid", "board", "seccode", "last", "quantity", "time", "change", "bid", "biddepth",
+                 "biddeptht", "numbids", "offer", "offerdepth", "offerdeptht", "numoffers", "numtrades",
+                 "voltoday", "valtoday", "openpositions", "open", "high", "low", "waprice", "closeprice",
+                 "status", "tradingstatus")
+    tag = "quotation"
+    fields = {
+        "secid": ("secid", to_int),
+        "board": ("board", _text),
+        "seccode": ("seccode", _text),
+        "last": ("last", to_scaled),
+        "quantity": ("quantity", to_int),
+        "time": ("time", _text),            # "чч:мм:сс" — без даты
+        "change": ("change", to_scaled),
+        "bid": ("bid", to_scaled),
+        "biddepth": ("biddepth", to_int),
+        "biddeptht": ("biddeptht", to_int),
+        "numbids": ("numbids", to_int),
+        "offer": ("offer", to_scaled),
+        "offerdepth": ("offerdepth", to_int),
+        "offerdeptht": ("offerdeptht", to_int),
+        "numoffers": ("numoffers", to_int),
+        "numtrades": ("numtrades", to_int),
+        "voltoday": ("voltoday", to_int),
+        "valtoday": ("valtoday", to_scaled),
+        "openpositions": ("openpositions", to_int),
+        "open": ("open", to_scaled),
+        "high": ("high", to_scaled),
+        "low": ("low", to_scaled),
+        "waprice": ("waprice", to_scaled),
+        "closeprice": ("closeprice", to_scaled),
+        "status": ("status", _text),
+        "tradingstatus": ("tradingstatus", _text),
+    }
+
+
+class AllTrade(Record):
+    """Обезличенная сделка (<alltrades>/<trade>)"""
+    __slots__ = ("secid", "board", "seccode", "tradeno", "time", "price", "quantity",
+                 "buysell", "openinterest", "period")
+    tag = "trade"
+    fields = {
+        "secid": ("secid", to_int),
+        "board": ("board", _text),
+        "seccode": ("seccode", _text),
+        "tradeno": ("tradeno", to_int),
+        "time": ("time", to_time),
+        "price": ("price", to_scaled),
+        "quantity": ("quantity", to_int),
+        "buysell": ("buysell", _text),
+        "openinterest": ("openinterest", to_int),
+        "period": ("period", _text),
+    }
+
+
+class Order(Record):
+    """Заявка клиента (<orders>/<order>)"""
+    __slots__ = ("transactionid", "orderno", "secid", "board", "seccode", "client", "union",
+                 "status", "buysell", "time", "price", "quantity", "balance", "result")
+    tag = "order"
+    fields = {
+        "transactionid": ("transactionid", to_int),
+        "orderno": ("orderno", to_int),
+        "secid": ("secid", to_int),
+        "board": ("board", _text),
+        "seccode": ("seccode", _text),
+        "client": ("client", _text),
+        "union": ("union", _text),
+        "status": ("status", _text),
+        "buysell": ("buysell", _text),
+        "time": ("time", to_time),
+        "price": ("price", to_scaled),
+        "quantity": ("quantity", to_int),
+        "balance": ("balance", to_int),
+        "result": ("result", _text),
+    }
+
+
+class Trade(Record):
+    """Собственная сделка клиента (<trades>/<trade>)"""
+    __slots__ = ("secid", "tradeno", "orderno", "board", "seccode", "client", "union",
+                 "buysell", "time", "price", "quantity", "comission", "currentpos")
+    tag = "trade"
+    fields = {
+        "secid": ("secid", to_int),
+        "tradeno": ("tradeno", to_int),
+        "orderno": ("orderno", to_int),
+        "board": ("board", _text),
+        "seccode": ("seccode", _text),
+        "client": ("client", _text),
+        "union": ("union", _text),
+        "buysell": ("buysell", _text),
+        "time": ("time", to_time),
+        "price": ("price", to_scaled),
+        "quantity": ("quantity", to_int),
+        "comission": ("comission", to_scaled),
+        "currentpos": ("currentpos", to_int),
+    }
+
+
+class SecPosition(Record):
+    """Позиция по бумаге (<positions>/<sec_position>)"""
+    __slots__ = ("secid", "market", "seccode", "register", "client", "union", "shortname",
+                 "saldoin", "saldo", "bought", "sold", "ordbuy", "ordsell")
+    tag = "sec_position"
+    fields = {
+        "secid": ("secid", to_int),
+        "market": ("market", to_int),
+        "seccode": ("seccode", _text),
+        "register": ("register", _text),
+        "client": ("client", _text),
+        "union": ("union", _text),
+        "shortname": ("shortname", _text),
+        "saldoin": ("saldoin", to_int),
+        "saldo": ("saldo", to_int),
+        "bought": ("bought", to_int),
+        "sold": ("sold", to_int),
+        "ordbuy": ("ordbuy", to_int),
+        "ordsell": ("ordsell", to_int),
+    }
+
+
+class MoneyPosition(Record):
+    """Денежная позиция (<positions>/<money_position>); суммы масштабированы как цены"""
+    __slots__ = ("client", "union", "asset", "shortname", "saldoin", "saldo", "bought",
+                 "sold", "ordbuy", "comission")
+    tag = "money_position"
+    fields = {
+        "client": ("client", _text),
+        "union": ("union", _text),
+        "asset": ("asset", _text),
+        "shortname": ("shortname", _text),
+        "saldoin": ("saldoin", to_scaled),
+        "saldo": ("saldo", to_scaled),
+        "bought": ("bought", to_scaled),
+        "sold": ("sold", to_scaled),
+        "ordbuy": ("ordbuy", to_scaled),
+        "comission": ("comission", to_scaled),
+    }
+
+
+class Candle(Record):
+    """Свеча из ответа на gethistorydata (<candles>/<candle>); board, seccode и period — из корня"""
+    __slots__ = ("board", "seccode", "period", "time", "open", "high", "low", "close", "volume", "oi")
+    tag = "candle"
+    fields = {
+        "date": ("time", to_time),
+        "open": ("open", to_scaled),
+        "high": ("high", to_scaled),
+        "low": ("low", to_scaled),
+        "close": ("close", to_scaled),
+        "volume": ("volume", to_int),
+        "oi": ("oi", to_int),
+    }
+
+
+class CandleKind(Record):
+    """Вид свечей (<candlekinds>/<kind>): id для gethistorydata и длительность в секундах"""
+    __slots__ = ("kind_id", "period", "name")
+    tag = "kind"
+    fields = {
+        "id": ("kind_id", to_int),
+        "period": ("period", to_int),
+        "name": ("name", _text),
+    }
+
+
+class Security(Record):
+    """Инструмент из справочника (<securities>/<security>); isin приходит отдельно в <sec_info>"""
+    __slots__ = ("secid", "active", "seccode", "instrclass", "board", "market", "currency", "shortname",
+                 "decimals", "minstep", "lotsize", "point_cost", "sectype", "isin")
+    tag = "security"
+    fields = {
+        "secid": ("secid", to_int),
+        "active": ("active", to_bool),
+        "seccode": ("seccode", _text),
+        "instrclass": ("instrclass", _text),
+        "board": ("board", _text),
+        "market": ("market", to_int),
+        "currency": ("currency", _text),
+        "shortname": ("shortname", _text),
+        "decimals": ("decimals", to_int),
+        "minstep": ("minstep", to_scaled),
+        "lotsize": ("lotsize", to_int),
+        "point_cost": ("point_cost", to_scaled),
+        "sectype": ("sectype", _text),
+        "isin": ("isin", _text),
+    }
+
+
+class Market(Record):
+    """Рынок (<markets>/<market id="...">название</market>)"""
+    __slots__ = ("market_id", "name")
+    tag = "market"
+    fields = {"id": ("market_id", to_int)}
+
+
+class Board(Record):
+    """Режим торгов (<boards>/<board id="...">)"""
+    __slots__ = ("board_id", "name", "market", "board_type")
+    tag = "board"
+    fields = {
+        "id": ("board_id", _text),
+        "name": ("name", _text),
+        "market": ("market", to_int),
+        "type": ("board_type", to_int),
+    }
+
+
+# Реестр декодеров: корневой тег -> функция(bytes) -> список записей
+DECODERS = {}
+
+
+def decoder(tag):
+    """Декоратор: регистрирует функцию-декодер для корневого тега"""
+    def register(func):
+        DECODERS[tag] = func
+        return func
+    return register
+
+
+def decode(tag, data):
+    """Декодирует сообщение в список записей или возвращает None, если декодера нет"""
+    func = DECODERS.get(tag)
+    return func(data) if func is not None else None
+
+
+def _children_decoder(record_cls):
+    """Создает декодер, который строит записи из дочерних элементов корня"""
+    element_tag = record_cls.tag
+    from_element = record_cls.from_element
+
+    def decode_children(data):
+        return [from_element(elem) for elem in iter_children(data, element_tag)]
+    return decode_children
+
+
+class _AttribOnly:
+    """Обертка над словарем атрибутов, похожая на элемент без детей"""
+    __slots__ = ("attrib",)
+
+    def __init__(self, attrib):
+        self.attrib = attrib
+
+    def __iter__(self):
+        return iter(())
+
+
+@decoder("server_status")
+def decode_server_status(data):
+    """<server_status connected="..."> — атрибуты корня и текст ошибки"""
+    attrib = root_attrib(data)
+    record = ServerStatus.from_element(_AttribOnly(attrib))
+    if record.connected == "error":  # Текст ошибки есть только в этом случае
+        record.message = parse_root(data).text
+    return [record]
+
+
+decoder("quotes")(_children_decoder(Quote))
+decoder("quotations")(_children_decoder(Quotation))
+decoder("alltrades")(_children_decoder(AllTrade))
+decoder("orders")(_children_decoder(Order))
+decoder("trades")(_children_decoder(Trade))
+decoder("candlekinds")(_children_decoder(CandleKind))
+decoder("securities")(_children_decoder(Security))
+decoder("boards")(_children_decoder(Board))
+
+
+@decoder("markets")
+def decode_markets(data):
+    """<markets> — название рынка записано текстом элемента"""
+    records = []
+    for elem in iter_children(data, Market.tag):
+        record = Market.from_element(elem)
+        record.name = elem.text
+        records.append(record)
+    return records
+
+
+@decoder("candles")
+def decode_candles(data):
+    """<candles board="..." seccode="..." period="..." status="..."> — свечи истории"""
+    attrib = root_attrib(data)
+    board = attrib.get("board")
+    seccode = attrib.get("seccode")
+    period = to_int(attrib.get("period"))
+    records = []
+    for elem in iter_children(data, Candle.tag):
+        record = Candle.from_element(elem)
+        record.board = board
+        record.seccode = seccode
+        record.period = period
+        records.append(record)
+    return records
+
+
+@decoder("positions")
+def decode_positions(data):
+    """<positions> — денежные позиции и позиции по бумагам (прочие виды пропускаются)"""
+    records = []
+    for elem in iter_children(data):
+        if elem.tag == "sec_position":
+            records.append(SecPosition.from_element(elem))
+        elif elem.tag == "money_position":
+            records.append(MoneyPosition.from_element(elem))
+    return records
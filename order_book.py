@@ -0,0 +1,189 @@
+# Стаканы заявок, собранные из обновлений <quotes> (по каждой паре board/seccode)
+#
+# Подключение к Connector:
+#   books = OrderBooks()
+#   books.attach(connector)                     # подписка на записи Quote
+#   book = books.get("TQBR", "SBER")
+#   book.best_bid(), book.best_ask(), book.depth(10)
+import threading  # Стакан читается из других потоков
+from array import array  # Цены и объемы уровней в непрерывных массивах int64
+from bisect import bisect_left  # Двоичный поиск уровня
+
+
+class BookSide:
+    """Одна сторона стакана: уровни отсортированы по ключу, лучший уровень — последний
+
+    Ключ — целая цена (в единицах PRICE_SCALE) со знаком: для покупки ключ равен
+    цене, для продажи — цене с минусом. Так у обеих сторон лучший уровень в конце
+    массива, и частые изменения у края стакана почти не сдвигают элементы.
+    """
+    __slots__ = ("sign", "keys", "quantities")
+
+    def __init__(self, sign):
+        self.sign = sign  # 1 — покупка, -1 — продажа
+        self.keys = array("q")
+        self.quantities = array("q")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set(self, price, quantity):
+        """Устанавливает объем уровня; quantity <= 0 (в Transaq -1) удаляет уровень"""
+        key = price * self.sign
+        keys = self.keys
+        i = bisect_left(keys, key)
+        found = i < len(keys) and keys[i] == key
+        if quantity > 0:
+            if found:
+                self.quantities[i] = quantity
+            else:
+                keys.insert(i, key)
+                self.quantities.insert(i, quantity)
+        elif found:
+            del keys[i]
+            del self.quantities[i]
+
+    def best(self):
+        """Лучший уровень (цена, объем) или None"""
+        if not self.keys:
+            return None
+        return self.keys[-1] * self.sign, self.quantities[-1]
+
+    def levels(self, count=None):
+        """Уровни от лучшего к худшему: список (цена, объем)"""
+        keys = self.keys
+        size = len(keys)
+        start = 0 if count is None else max(0, size - count)
+        sign = self.sign
+        quantities = self.quantities
+        return [(keys[i] * sign, quantities[i]) for i in range(size - 1, start - 1, -1)]
+
+    def clear(self):
+        del self.keys[:]
+        del self.quantities[:]
+
+
+class BookSnapshot:
+    """Копия стакана на момент запроса"""
+    __slots__ = ("board", "seccode", "bids", "asks", "updates")
+
+    def __init__(self, board, seccode, bids, asks, updates):
+        self.board = board
+        self.seccode = seccode
+        self.bids = bids  # [(цена, объем)], лучший уровень первым
+        self.asks = asks
+        self.updates = updates  # Номер последнего обновления (растет с каждым <quotes>)
+
+    def __repr__(self):
+        return f"BookSnapshot({self.board}/{self.seccode}, bids={len(self.bids)}, asks={len(self.asks)})"
+
+
+class OrderBook:
+    """Стакан одной бумаги; изменения и чтения защищены блокировкой"""
+    def __init__(self, board, seccode, secid=None):
+        self.board = board
+        self.seccode = seccode
+        self.secid = secid
+        self.bids = BookSide(1)
+        self.asks = BookSide(-1)
+        self.updates = 0  # Счетчик примененных сообщений
+        self._lock = threading.Lock()
+
+    def apply(self, quotes):
+        """Применяет записи Quote этой бумаги (buy/sell = -1 — удаление уровня)"""
+        with self._lock:
+            for quote in quotes:
+                price = quote.price
+                if price is None:
+                    continue
+                if quote.buy is not None:
+                    self.bids.set(price, quote.buy)
+                if quote.sell is not None:
+                    self.asks.set(price, quote.sell)
+            self.updates += 1
+
+    def best_bid(self):
+        """Лучшая покупка (цена, объем) или None"""
+        with self._lock:
+            return self.bids.best()
+
+    def best_ask(self):
+        """Лучшая продажа (цена, объем) или None"""
+        with self._lock:
+            return self.asks.best()
+
+    def spread(self):
+        """Разница лучших цен продажи и покупки или None, если одной из сторон нет"""
+        with self._lock:
+            bid = self.bids.best()
+            ask = self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return ask[0] - bid[0]
+
+    def depth(self, count=10):
+        """Первые count уровней: (покупки, продажи), лучший уровень первым"""
+        with self._lock:
+            return self.bids.levels(count), self.asks.levels(count)
+
+    def snapshot(self):
+        """Полная копия стакана"""
+        with self._lock:
+            return BookSnapshot(self.board, self.seccode, self.bids.levels(), self.asks.levels(), self.updates)
+
+    def clear(self):
+        """Очищает стакан (например, перед повторной подпиской)"""
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            self.updates += 1
+
+    def __repr__(self):
+        return f"OrderBook({self.board}/{self.seccode}, bids={len(self.bids)}, asks={len(self.asks)})"
+
+
+class OrderBooks:
+    """Все стаканы по ключу (board, seccode), обновляемые из записей Quote"""
+    def __init__(self):
+        self.books = {}  # (board, seccode) -> OrderBook
+        self._lock = threading.Lock()  # Только для создания новых стаканов
+
+    def attach(self, connector):
+        """Подписывается на сообщения <quotes> коннектора"""
+        connector.add_record_handler("quotes", self.on_quotes)
+
+    def on_quotes(self, quotes):
+        """Обработчик записей одного сообщения <quotes>: группирует по бумагам и применяет"""
+        groups = {}
+        for quote in quotes:
+            key = (quote.board, quote.seccode)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = group = [quote]
+            else:
+                group.append(quote)
+        for (board, seccode), group in groups.items():
+            book = self.books.get((board, seccode))
+            if book is None:
+                book = self._create(board, seccode, group[0].secid)
+            book.apply(group)
+
+    def _create(self, board, seccode, secid):
+        with self._lock:
+            book = self.books.get((board, seccode))
+            if book is None:
+                book = self.books[(board, seccode)] = OrderBook(board, seccode, secid)
+            return book
+
+    def get(self, board, seccode):
+        """Стакан бумаги или None, если по ней еще не было котировок"""
+        return self.books.get((board, seccode))
+
+    def keys(self):
+        """Список пар (board, seccode), по которым есть стаканы"""
+        return list(self.books)
+
+    def clear(self):
+        """Очищает все стаканы"""
+        for book in list(self.books.values()):
+            book.clear()
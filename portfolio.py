@@ -0,0 +1,256 @@
+# Состояние портфеля: позиции, средние цены, реализованный и текущий результат, деньги и заявки
+#
+# Подключение к Connector:
+#   portfolio = Portfolio(order_books=books, securities=securities)   # оба необязательны
+#   portfolio.attach(connector)        # сигналы position_changed, money_changed, order_changed
+#   portfolio.snapshot()
+#
+# Цены и результат — в единицах PRICE_SCALE (как в messages.py). Результат считается
+# в штуках: количество в лотах умножается на размер лота из справочника (если он есть).
+# Позиции различаются по (client, board, seccode). В <sec_position> режима торгов нет: он
+# берется из справочника по secid, иначе — у уже известной позиции клиента по этой бумаге,
+# иначе позиция ждет первой сделки, которая его сообщит. Реализованный результат хранится
+# в лотах, поэтому размер лота, найденный позже, не искажает уже посчитанное. Стоимость
+# открытой позиции и реализованный результат — целые числа; средняя цена считается при чтении,
+# поэтому ошибка округления не накапливается от сделки к сделке.
+import threading  # Обработчики в потоках-обработчиках, снимки из любых потоков
+
+FINAL_ORDER_STATUSES = frozenset(("matched", "cancelled", "denied", "disabled", "expired", "failed", "rejected",
+                                  "removed", "refused"))  # Заявка больше не активна
+
+
+class Position:
+    """Позиция по бумаге: количество и средняя цена по собственным сделкам, остаток брокера"""
+    __slots__ = ("client", "seccode", "board", "secid", "quantity", "cost", "realized_lots", "last_price",
+                 "saldo", "lotsize")
+
+    def __init__(self, client, seccode, board=None, secid=None, lotsize=None):
+        self.client = client
+        self.seccode = seccode
+        self.board = board
+        self.secid = secid
+        self.quantity = 0  # Лоты: > 0 — длинная позиция, < 0 — короткая
+        self.cost = 0  # Сумма цена * лоты открытой позиции (со знаком количества)
+        self.realized_lots = 0  # Реализованный результат в расчете на лоты (без размера лота)
+        self.last_price = None  # Цена последней сделки по бумаге
+        self.saldo = None  # Текущий остаток по данным брокера (<sec_position>)
+        self.lotsize = lotsize  # None — в справочнике еще не найден (считается как 1)
+
+    @property
+    def avg_price(self):
+        """Средняя цена открытой позиции (0, если позиции нет)"""
+        return self.cost / self.quantity if self.quantity else 0.0
+
+    @property
+    def realized(self):
+        """Реализованный результат в штуках"""
+        return self.realized_lots * (self.lotsize or 1)
+
+    def apply_trade(self, quantity, price):
+        """Учитывает сделку (quantity со знаком: покупка > 0) по методу средней цены"""
+        position = self.quantity
+        if position == 0 or (position > 0) == (quantity > 0):  # Открытие или наращивание
+            self.cost += price * quantity
+            self.quantity = position + quantity
+            return
+        closed = min(abs(quantity), abs(position))  # Сокращение, закрытие или переворот
+        removed = self.cost if closed == abs(position) else self.cost * closed // abs(position)
+        direction = 1 if position > 0 else -1
+        self.realized_lots += price * closed * direction - removed
+        self.cost -= removed
+        self.quantity = position + quantity
+        if self.quantity and (self.quantity > 0) != (position > 0):  # Переворот: остаток по цене сделки
+            self.cost = price * self.quantity
+
+    def unrealized(self, mark):
+        """Текущий результат открытой позиции при цене mark"""
+        if mark is None or not self.quantity:
+            return 0.0
+        return (mark * self.quantity - self.cost) * (self.lotsize or 1)
+
+    def copy(self):
+        position = Position(self.client, self.seccode, self.board, self.secid, self.lotsize)
+        for name in self.__slots__:
+            setattr(position, name, getattr(self, name))
+        return position
+
+    def __repr__(self):
+        return (f"Position({self.client} {self.board}/{self.seccode}: quantity={self.quantity}, "
+                f"avg_price={self.avg_price:.0f}, realized={self.realized:.0f}, saldo={self.saldo})")
+
+
+class Portfolio:
+    """Позиции, деньги и активные заявки, обновляемые по каждому сообщению
+
+    Текущий результат считается при запросе по цене из стакана (середина лучших
+    цен) или по последней сделке — без пересчета истории.
+    """
+    def __init__(self, order_books=None, securities=None,
+                 on_position_changed=None, on_money_changed=None, on_order_changed=None):
+        self.order_books = order_books  # OrderBooks для оценки по стакану (необязательно)
+        self.securities = securities  # SecuritiesCache для размера лота (необязательно)
+        # Функции f(запись), вызываются в потоке-обработчике: позиции — копии, деньги и заявки — записи
+        # сообщения, общие для всех обработчиков (их нельзя изменять)
+        self.on_position_changed = on_position_changed
+        self.on_money_changed = on_money_changed
+        self.on_order_changed = on_order_changed
+        self.positions = {}  # (client, board, seccode) -> Position; board None — режим торгов еще не известен
+        self.money = {}  # (client, asset) -> MoneyPosition
+        self.orders = {}  # transactionid -> Order (только активные)
+        self._held = {}  # (board, seccode) -> [Position] с ненулевым количеством (для цены последней сделки)
+        self._tradenos = set()  # Уже учтенные собственные сделки
+        self._lock = threading.Lock()
+
+    def attach(self, connector):
+        """Подписывается на сообщения коннектора; уведомления — в сигналы ConnectorSignals"""
+        connector.add_record_handler("trades", self.on_trades)
+        connector.add_record_handler("orders", self.on_orders)
+        connector.add_record_handler("positions", self.on_positions)
+        connector.add_record_handler("alltrades", self.on_alltrades)
+        signals = connector.signals
+        if self.on_position_changed is None:
+            self.on_position_changed = signals.position_changed.emit
+        if self.on_money_changed is None:
+            self.on_money_changed = signals.money_changed.emit
+        if self.on_order_changed is None:
+            self.on_order_changed = signals.order_changed.emit
+
+    def _position(self, client, seccode, board=None, secid=None):
+        """Позиция клиента по бумаге (создается при первом обращении); вызывается под блокировкой"""
+        if board is None:
+            board = self._find_board(client, seccode, secid)
+        position = self.positions.get((client, board, seccode))
+        if position is None and board is not None:
+            position = self.positions.pop((client, None, seccode), None)  # Позиция из <sec_position> без режима
+            if position is not None:
+                position.board = board
+                position.lotsize = None  # Размер лота — уже для известного режима торгов
+                self.positions[(client, board, seccode)] = position
+        if position is None:
+            position = self.positions[(client, board, seccode)] = Position(client, seccode, board, secid)
+        if position.secid is None:
+            position.secid = secid
+        if position.lotsize is None and position.board is not None:
+            position.lotsize = self._lotsize(position.board, seccode)
+        return position
+
+    def _find_board(self, client, seccode, secid):
+        """Режим торгов для записи без board: по secid из справочника или у единственной позиции по бумаге"""
+        if self.securities is not None and secid is not None:
+            security = self.securities.get(secid)
+            if security is not None and security.board:
+                return security.board
+        boards = {board for (owner, board, code) in self.positions if owner == client and code == seccode}
+        boards.discard(None)
+        return boards.pop() if len(boards) == 1 else None
+
+    def _lotsize(self, board, seccode):
+        """Размер лота из справочника или None, если инструмента там (пока) нет"""
+        if self.securities is None:
+            return None
+        security = self.securities.find(board, seccode)
+        return security.lotsize if security is not None and security.lotsize else None
+
+    def _track(self, position):
+        """Обновляет список бумаг с открытыми позициями"""
+        held = self._held.setdefault((position.board, position.seccode), [])
+        if position.quantity and position not in held:
+            held.append(position)
+        elif not position.quantity and position in held:
+            held.remove(position)
+
+    def on_trades(self, trades):
+        """Собственные сделки: количество, средняя цена, реализованный результат"""
+        changed = []
+        with self._lock:
+            for trade in trades:
+                if trade.tradeno is not None:
+                    if trade.tradeno in self._tradenos:
+                        continue  # Повтор после переподключения
+                    self._tradenos.add(trade.tradeno)
+                if trade.price is None or not trade.quantity:
+                    continue
+                position = self._position(trade.client, trade.seccode, trade.board, trade.secid)
+                position.apply_trade(trade.quantity if trade.buysell == "B" else -trade.quantity, trade.price)
+                position.last_price = trade.price
+                self._track(position)
+                changed.append(position.copy())
+        self._notify(self.on_position_changed, changed)
+
+    def on_positions(self, records):
+        """<positions>: остатки по бумагам от брокера и денежные позиции"""
+        positions = []
+        money = []
+        with self._lock:
+            for record in records:
+                if record.tag == "money_position":
+                    self.money[(record.client, record.asset)] = record
+                    money.append(record)
+                else:
+                    position = self._position(record.client, record.seccode, secid=record.secid)
+                    position.saldo = record.saldo
+                    positions.append(position.copy())
+        self._notify(self.on_position_changed, positions)
+        self._notify(self.on_money_changed, money)
+
+    def on_orders(self, orders):
+        """Заявки: активные хранятся, исполненные и снятые удаляются; слушатели получают сами записи"""
+        with self._lock:
+            for order in orders:
+                if order.status in FINAL_ORDER_STATUSES:
+                    self.orders.pop(order.transactionid, None)
+                else:
+                    self.orders[order.transactionid] = order
+        self._notify(self.on_order_changed, orders)
+
+    def on_alltrades(self, trades):
+        """Цена последней сделки для бумаг с открытой позицией (остальные сделки пропускаются)"""
+        held = self._held
+        with self._lock:
+            for trade in trades:
+                positions = held.get((trade.board, trade.seccode))
+                if positions:
+                    for position in positions:
+                        position.last_price = trade.price
+
+    def mark_price(self, position):
+        """Цена оценки: середина лучших цен стакана, иначе последняя сделка"""
+        books = self.order_books
+        if books is not None and position.board is not None:
+            book = books.get(position.board, position.seccode)
+            if book is not None:
+                bid = book.best_bid()
+                ask = book.best_ask()
+                if bid is not None and ask is not None:
+                    return (bid[0] + ask[0]) / 2
+        return position.last_price
+
+    def position(self, client, board, seccode):
+        """Копия позиции или None"""
+        with self._lock:
+            position = self.positions.get((client, board, seccode))
+            return position.copy() if position is not None else None
+
+    def snapshot(self):
+        """Согласованная копия состояния с текущим результатом по каждой позиции"""
+        with self._lock:
+            positions = [position.copy() for position in self.positions.values()]
+            money = list(self.money.values())
+            orders = list(self.orders.values())
+        rows = []
+        realized = unrealized = 0.0
+        for position in positions:
+            mark = self.mark_price(position)
+            open_result = position.unrealized(mark)
+            realized += position.realized
+            unrealized += open_result
+            rows.append((position, mark, open_result))
+        return {"positions": rows, "money": money, "orders": orders,
+                "realized": realized, "unrealized": unrealized}
+
+    @staticmethod
+    def _notify(callback, items):
+        if callback is None:
+            return
+        for item in items:
+            callback(item)
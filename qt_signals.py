@@ -0,0 +1,20 @@
+# Сигналы коннектора для окна Qt: события из потоков-обработчиков доставляются в поток интерфейса
+#
+#   connector = Connector(signals=ConnectorSignals())
+#
+# Импортируется только программами с окном; коннектор без окна использует events.ConnectorEvents.
+from PyQt5.QtCore import QObject, pyqtSignal  # Сигналы для связи между компонентами
+
+
+class ConnectorSignals(QObject):
+    """Класс для сигналов (событий) в программе"""
+    connection_status_changed = pyqtSignal(str)  # Сигнал об изменении статуса соединения
+    error_occurred = pyqtSignal(str)  # Сигнал об ошибке
+    data_received = pyqtSignal(str)  # Сигнал о получении данных
+    important_data_received = pyqtSignal(str)  # Сигнал о получении важных данных (не все данные, а только ключевые)
+    records_received = pyqtSignal(str, list)  # Сигнал с типизированными записями (корневой тег, записи)
+    bar_closed = pyqtSignal(str, str, str, object)  # Сигнал о закрытой свече (board, seccode, таймфрейм, Bar)
+    position_changed = pyqtSignal(object)  # Сигнал об изменении позиции (копия Position)
+    money_changed = pyqtSignal(object)  # Сигнал об изменении денежной позиции (MoneyPosition)
+    order_changed = pyqtSignal(object)  # Сигнал об изменении заявки (Order)
+    command_finished = pyqtSignal(int, object)  # Сигнал о результате асинхронной команды (номер запроса, CommandResult)
@@ -0,0 +1,284 @@
+# Кэш справочника инструментов (<securities>, <markets>, <boards>) с двоичным снимком на диске
+#
+# При каждом подключении сервер заново присылает весь справочник. Кэш сразу после
+# запуска отвечает на запросы по снимку прошлой сессии, а поток сервера применяет
+# как разницу: элементы <security>, байты которых не изменились, повторно не разбираются.
+#
+#   securities = SecuritiesCache(os.path.join(folder, "securities.cache"))   # рядом с config.xml
+#   securities.attach(connector)
+#   securities.find("TQBR", "SBER"), securities.by_ticker("SBER"), securities.by_isin("RU0009029540")
+import atexit  # Чтобы сохранить снимок при выходе из программы
+import logging  # Для ведения логов
+import marshal  # Быстрая сериализация кортежей встроенных типов
+import os  # Для работы с файлами и путями
+import re  # Поиск элементов <security> в сыром сообщении
+import struct  # Заголовок файла снимка
+import threading  # Обработчики и поиск из разных потоков, фоновая загрузка
+import weakref  # Список кэшей для atexit, не мешающий удалять объекты
+import zlib  # Сжатие снимка и контрольные суммы элементов
+from messages import Security, Market, Board, decode  # Записи справочника
+from xml_stream import sniff_root_tag, parse_root, root_attrib, ParseError  # Разбор отдельных элементов
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+SNAPSHOT_MAGIC = b"TQSEC1\0\0"
+SNAPSHOT_HEADER = struct.Struct("<8sII")  # magic, версия формата marshal, crc32 сжатых данных
+_SECURITY_RE = re.compile(rb"<security\b.*?</security>", re.S)  # Элемент инструмента целиком
+_SECID_RE = re.compile(rb'secid="(\d+)"')
+
+_active = weakref.WeakSet()  # Кэши со снимком на диске
+
+
+@atexit.register
+def _save_all():
+    """Сохраняет снимки всех кэшей при выходе из программы"""
+    for cache in list(_active):
+        cache.save()
+
+
+class SecuritiesCache:
+    """Справочник инструментов с хеш-индексами по secid, (board, seccode), тикеру и ISIN"""
+    def __init__(self, path=None):
+        self.path = path  # Файл снимка (None — без сохранения на диск)
+        self.securities = {}  # secid -> Security
+        self.markets = {}  # id рынка -> Market
+        self.boards = {}  # id режима торгов -> Board
+        self._by_code = {}  # (board, seccode) -> Security
+        self._by_ticker = {}  # seccode -> [Security] (одна бумага на нескольких режимах торгов)
+        self._by_isin = {}  # isin -> [Security]
+        self._digests = {}  # secid -> crc32 байтов элемента <security>
+        self._loaded = False
+        self._dirty = False  # Есть изменения, которых нет в снимке
+        self._lock = threading.RLock()
+        self.added = 0  # Счетчики применения потока сервера как разницы
+        self.changed = 0
+        self.unchanged = 0
+        if path is not None:
+            _active.add(self)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.securities)
+
+    # --- Загрузка и сохранение снимка ---
+
+    def preload(self):
+        """Загружает снимок в фоновом потоке, чтобы не задерживать запуск окна"""
+        threading.Thread(target=self._ensure_loaded, name="SecuritiesCache", daemon=True).start()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        """Читает снимок; поврежденный или устаревший снимок пропускается"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, version, crc = SNAPSHOT_HEADER.unpack_from(data)
+            body = data[SNAPSHOT_HEADER.size:]
+            if magic != SNAPSHOT_MAGIC or version != marshal.version or zlib.crc32(body) != crc:
+                logger.info(f"Снимок справочника {self.path} устарел, будет создан заново")
+                return
+            snapshot = marshal.loads(zlib.decompress(body))
+            if snapshot["fields"] != (Security.__slots__, Market.__slots__, Board.__slots__):
+                return  # Изменился состав полей записей
+        except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error, zlib.error) as e:
+            logger.error(f"Ошибка чтения снимка справочника: {e}")
+            return
+        for values in snapshot["securities"]:
+            self._index(Security(**dict(zip(Security.__slots__, values))))
+        self.markets = {values[0]: Market(**dict(zip(Market.__slots__, values))) for values in snapshot["markets"]}
+        self.boards = {values[0]: Board(**dict(zip(Board.__slots__, values))) for values in snapshot["boards"]}
+        self._digests = snapshot["digests"]
+        logger.info(f"Справочник из снимка: {len(self.securities)} инструментов")
+
+    def save(self):
+        """Записывает снимок, если справочник изменился (через временный файл)"""
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            snapshot = {
+                "fields": (Security.__slots__, Market.__slots__, Board.__slots__),
+                "securities": [_values(record) for record in self.securities.values()],
+                "markets": [_values(record) for record in self.markets.values()],
+                "boards": [_values(record) for record in self.boards.values()],
+                "digests": dict(self._digests),
+            }
+            self._dirty = False
+        body = zlib.compress(marshal.dumps(snapshot), 1)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, marshal.version, zlib.crc32(body)))
+                f.write(body)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Ошибка записи снимка справочника: {e}")
+            self._dirty = True
+
+    # --- Применение потока сервера ---
+
+    def attach(self, connector):
+        """Подписывается на справочные сообщения коннектора"""
+        connector.add_raw_handler("securities", self.on_securities)
+        connector.add_raw_handler("sec_info", self.on_sec_info)
+        connector.add_raw_handler("sec_info_upd", self.on_sec_info)
+        connector.add_record_handler("markets", self.on_markets)
+        connector.add_record_handler("boards", self.on_boards)
+
+    def on_securities(self, data):
+        """Применяет <securities>: разбираются только новые и изменившиеся элементы"""
+        self._ensure_loaded()
+        changed = []
+        total = 0
+        with self._lock:
+            digests = self._digests
+            for match in _SECURITY_RE.finditer(data):
+                total += 1
+                element = match.group()
+                secid = _SECID_RE.search(element)
+                if secid is None:
+                    continue
+                secid = int(secid.group(1))
+                digest = zlib.crc32(element)
+                if digests.get(secid) == digest and secid in self.securities:
+                    self.unchanged += 1
+                    continue
+                changed.append((secid, digest, element))
+        records = []
+        if changed and len(changed) == total:  # Снимка нет — один разбор всего сообщения быстрее поэлементного
+            try:
+                parsed = decode("securities", data)
+            except ParseError:
+                parsed = []
+            if len(parsed) == total:
+                records = [(digest, record) for (_, digest, _), record in zip(changed, parsed)]
+        if not records:
+            for secid, digest, element in changed:  # Разбор — вне блокировки
+                try:
+                    records.append((digest, Security.from_element(parse_root(element))))
+                except ParseError as e:
+                    logger.error(f"Ошибка разбора инструмента {secid}: {e}")
+        if not records:
+            return
+        with self._lock:
+            for digest, record in records:
+                old = self.securities.get(record.secid)
+                if old is None:
+                    self.added += 1
+                else:
+                    self.changed += 1
+                    record.isin = record.isin or old.isin  # ISIN приходит в <sec_info>
+                self._index(record)
+                self._digests[record.secid] = digest
+            self._dirty = True
+
+    def on_sec_info(self, data):
+        """Дополняет инструмент ISIN из <sec_info>/<sec_info_upd>"""
+        self._ensure_loaded()
+        try:
+            secid = root_attrib(data).get("secid")
+            root = parse_root(data)
+        except ParseError:
+            return
+        isin = root.findtext("isin")
+        secid = int(secid) if secid else None
+        if not isin or secid is None:
+            return
+        with self._lock:
+            record = self.securities.get(secid)
+            if record is None or record.isin == isin:
+                return
+            self._unindex(record)
+            record.isin = isin
+            self._index(record)
+            self._dirty = True
+
+    def on_markets(self, markets):
+        self._ensure_loaded()
+        with self._lock:
+            for market in markets:
+                old = self.markets.get(market.market_id)
+                if old != market:
+                    self.markets[market.market_id] = market
+                    self._dirty = True
+
+    def on_boards(self, boards):
+        self._ensure_loaded()
+        with self._lock:
+            for board in boards:
+                old = self.boards.get(board.board_id)
+                if old != board:
+                    self.boards[board.board_id] = board
+                    self._dirty = True
+
+    def load_message(self, data):
+        """Применяет сохраненное сообщение справочника (например, из файла записи *.tqc)"""
+        tag = sniff_root_tag(data)
+        if tag == b"securities":
+            self.on_securities(data)
+        elif tag in (b"sec_info", b"sec_info_upd"):
+            self.on_sec_info(data)
+        elif tag == b"markets":
+            self.on_markets(decode("markets", data))
+        elif tag == b"boards":
+            self.on_boards(decode("boards", data))
+
+    # --- Индексы ---
+
+    def _index(self, record):
+        """Добавляет запись во все индексы (старая версия с тем же secid удаляется)"""
+        old = self.securities.get(record.secid)
+        if old is not None:
+            self._unindex(old)
+        self.securities[record.secid] = record
+        self._by_code[(record.board, record.seccode)] = record
+        self._by_ticker.setdefault(record.seccode, []).append(record)
+        if record.isin:
+            self._by_isin.setdefault(record.isin, []).append(record)
+
+    def _unindex(self, record):
+        if self._by_code.get((record.board, record.seccode)) is record:
+            del self._by_code[(record.board, record.seccode)]
+        for index, key in ((self._by_ticker, record.seccode), (self._by_isin, record.isin)):
+            same = index.get(key)
+            if same is not None:
+                same = [r for r in same if r is not record]
+                if same:
+                    index[key] = same
+                else:
+                    del index[key]
+
+    # --- Поиск ---
+
+    def get(self, secid):
+        """Инструмент по secid или None"""
+        self._ensure_loaded()
+        return self.securities.get(secid)
+
+    def find(self, board, seccode):
+        """Инструмент по режиму торгов и коду или None"""
+        self._ensure_loaded()
+        return self._by_code.get((board, seccode))
+
+    def by_ticker(self, seccode):
+        """Все инструменты с этим кодом (на разных режимах торгов)"""
+        self._ensure_loaded()
+        return list(self._by_ticker.get(seccode, ()))
+
+    def by_isin(self, isin):
+        """Все инструменты с этим ISIN"""
+        self._ensure_loaded()
+        return list(self._by_isin.get(isin, ()))
+
+
+def _values(record):
+    """Значения слотов записи в виде кортежа (для снимка)"""
+    return tuple(getattr(record, name) for name in record.__slots__)
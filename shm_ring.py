@@ -0,0 +1,432 @@
+# Раздача потока сообщений другим процессам через кольцевой буфер в общей памяти
+#
+#   ring = RingWriter("transaq")                 # в процессе с DLL
+#   ring.attach(connector)                       # quotes, alltrades, orders... -> буфер
+#   ring.start_periodic(10)                      # раз в 10 с — предупреждения о медленных читателях
+#
+#   reader = RingReader("transaq")               # в любом другом процессе на этой машине
+#   for message in reader.poll():                # Message(seq, ns, tag, payload)
+#       records = decode(message.tag, message.payload)
+#
+# Писатель один и никогда не ждет читателей: если читатель отстал больше чем на размер
+# буфера, его непрочитанные записи перезаписываются, а читатель при следующем poll
+# переходит к самой старой уцелевшей записи и считает потерянные по номерам записей.
+# Читатели держат свой курсор в таблице слотов в той же памяти — по ней писатель видит
+# отставание каждого читателя. Слот занимается и освобождается под файловой блокировкой
+# (файл рядом с временными файлами системы); слот, процесс которого завершился не закрыв
+# читателя, считается свободным. poll(copy=False) отдает memoryview прямо из буфера без
+# копирования; тогда после обработки нужно вызвать check(): False — записи успели
+# перезаписать и их нельзя считать верными.
+#
+# Раскладка: заголовок (HEADER_SIZE байт), слоты читателей, данные. Позиции head и tail —
+# абсолютные (растут без переполнения), в буфере — позиция % capacity. Писатель сначала
+# сдвигает tail за записи, которые собирается затереть, потом пишет данные и только после
+# этого сдвигает head, поэтому читатель, проверив tail после чтения, знает, цела ли запись.
+import logging  # Для ведения логов
+import os  # Номер процесса читателя
+import struct  # Заголовок, слоты и заголовки записей
+import sys  # Для аргументов командной строки
+import tempfile  # Каталог файлов блокировки слотов
+import threading  # Блокировка писателя (пишут потоки-обработчики) и периодическая проверка
+import time  # Время записей и отметки активности читателей
+from collections import Counter, namedtuple  # Счетчики по тегам и запись для читателя
+from contextlib import contextmanager  # Блокировка таблицы слотов
+from functools import partial  # Тег для обработчика сырых сообщений
+from multiprocessing import shared_memory  # Общая память между процессами
+
+if os.name == "nt":
+    import ctypes  # Проверка, жив ли процесс читателя
+    import msvcrt  # Блокировка файла в Windows
+else:
+    import fcntl  # Блокировка файла в Linux/macOS
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+MAGIC = 0x42525154  # "TQRB"
+VERSION = 1
+HEADER = struct.Struct("<IHHQ")  # magic, версия, число слотов, capacity
+HEADER_SIZE = 64
+# Позиции head, tail, счетчик записей seq и поля слотов — 8-байтовые слова, которые читаются и пишутся через
+# memoryview.cast("Q") одним копированием. struct.pack_into для них не подходит: он сначала обнуляет поле,
+# и другой процесс может увидеть tail == 0
+HEAD_WORD, TAIL_WORD, SEQ_WORD = 2, 3, 4
+SLOT_WORDS = 5  # pid, курсор, ожидаемый номер записи, потеряно записей, время активности (нс)
+PID, CURSOR, EXPECTED, LOST, UPDATED = range(SLOT_WORDS)
+RECORD = struct.Struct("<IIHHQQ4x")  # Размер записи, длина данных, длина тега, флаги, номер, время (нс)
+WRAP = 0xFFFF  # Длина тега у заполнителя до конца буфера
+ALIGN = 8
+STREAM_TAGS = ("quotes", "quotations", "alltrades", "orders", "trades", "positions", "server_status")
+
+Message = namedtuple("Message", "seq ns tag payload")  # payload — bytes или memoryview (poll(copy=False))
+
+
+def _align(size):
+    return (size + ALIGN - 1) & ~(ALIGN - 1)
+
+
+def _attach(name):
+    """Подключается к существующей памяти, не передавая ее удаление resource_tracker этого процесса"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        if os.name == "posix":  # Иначе при выходе читателя память была бы удалена и у писателя
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+@contextmanager
+def _slots_locked(name):
+    """Межпроцессная блокировка таблицы слотов буфера name; снимается ОС, если процесс завершился"""
+    path = os.path.join(tempfile.gettempdir(), f"shm_ring_{name.lstrip('/')}.lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # Ждет до 10 с, потом OSError
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _alive(pid):
+    """True — процесс pid существует (или нет прав это проверить)"""
+    if os.name == "nt":  # os.kill в Windows завершает процесс, поэтому через OpenProcess
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED — процесс есть
+        try:
+            code = ctypes.c_ulong()
+            return not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)) or code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RingWriter:
+    """Писатель кольцевого буфера (один на буфер); никогда не ждет читателей"""
+    def __init__(self, name=None, capacity=64 * 1024 * 1024, slots=16, slow_fraction=0.5, stale_after=10.0):
+        self.capacity = _align(capacity)  # Байт под записи
+        self.slots = slots  # Сколько читателей может подключиться
+        self.slow_fraction = slow_fraction  # Читатель медленный, если отстал больше чем на эту долю буфера
+        self.stale_after = stale_after  # Читатель не читает, если не вызывал poll столько секунд
+        self._data = HEADER_SIZE + slots * SLOT_WORDS * 8  # Смещение области записей
+        self.shm = shared_memory.SharedMemory(name, create=True, size=self._data + self.capacity)
+        self.name = self.shm.name
+        self._buf = self.shm.buf
+        self._buf[:self._data] = bytes(self._data)  # Пустые заголовок и слоты
+        HEADER.pack_into(self._buf, 0, MAGIC, VERSION, slots, self.capacity)
+        self._words = self._buf[:self._data].cast("Q")  # Счетчики заголовка и слоты читателей
+        self.head = self.tail = self.seq = 0
+        self.published = 0  # Записей опубликовано
+        self.dropped = 0  # Записей больше половины буфера — не публикуются
+        self._lock = threading.Lock()
+        self._periodic = None
+        self._periodic_stop = threading.Event()
+
+    def attach(self, connector, tags=STREAM_TAGS):
+        """Публикует сырые сообщения с корневыми тегами tags из потоков-обработчиков коннектора"""
+        for tag in tags:
+            connector.add_raw_handler(tag, partial(self.publish, tag))
+
+    def publish(self, tag, payload, ns=None):
+        """Записывает сообщение (bytes) в буфер; False — сообщение слишком большое для буфера"""
+        tag = tag.encode("ascii")
+        length = len(payload)
+        size = _align(RECORD.size + len(tag) + length)
+        if size > self.capacity // 2:
+            self.dropped += 1
+            return False
+        if ns is None:
+            ns = time.monotonic_ns()
+        buf = self._buf
+        data = self._data
+        capacity = self.capacity
+        with self._lock:
+            head = self.head
+            pos = head % capacity
+            if pos + size > capacity:  # Запись не помещается до конца — заполнитель и переход в начало
+                rest = capacity - pos
+                self._reclaim(head + rest + size)
+                if rest >= RECORD.size:
+                    RECORD.pack_into(buf, data + pos, rest, 0, WRAP, 0, 0, 0)
+                head += rest
+                pos = 0
+            else:
+                self._reclaim(head + size)
+            start = data + pos
+            RECORD.pack_into(buf, start, size, length, len(tag), 0, self.seq, ns)
+            start += RECORD.size
+            buf[start:start + len(tag)] = tag
+            start += len(tag)
+            buf[start:start + length] = payload
+            self.seq += 1
+            self.head = head + size
+            self._words[SEQ_WORD] = self.seq
+            self._words[HEAD_WORD] = self.head  # После данных: читатели видят только целые записи
+            self.published += 1
+        return True
+
+    def _reclaim(self, end):
+        """Сдвигает tail за записи, которые затрет запись до позиции end"""
+        tail = self.tail
+        limit = end - self.capacity
+        if tail >= limit:
+            return
+        buf = self._buf
+        while tail < limit:
+            pos = tail % self.capacity
+            rest = self.capacity - pos
+            if rest < RECORD.size:
+                tail += rest
+            else:
+                tail += RECORD.unpack_from(buf, self._data + pos)[0]
+        self.tail = tail
+        self._words[TAIL_WORD] = tail  # До записи данных: читатели узнают о перезаписи
+
+    # --- Читатели ---
+
+    def readers(self):
+        """Состояние подключенных читателей: список словарей"""
+        now = time.monotonic_ns()
+        head, tail = self.head, self.tail
+        result = []
+        for index in range(self.slots):
+            base = HEADER_SIZE // 8 + index * SLOT_WORDS
+            pid, cursor, expected, lost, updated = self._words[base:base + SLOT_WORDS]
+            if not pid:
+                continue
+            lag = head - cursor
+            result.append({"slot": index, "pid": pid, "lag_bytes": lag, "lag_messages": self.seq - expected,
+                           "lost": lost, "overrun": cursor < tail,
+                           "slow": cursor < tail or lag > self.capacity * self.slow_fraction,
+                           "idle": (now - updated) / 1e9})
+        return result
+
+    def check_readers(self):
+        """Пишет в лог предупреждения о медленных и остановившихся читателях; возвращает их список.
+        Слоты завершившихся процессов освобождает"""
+        problems = []
+        for reader in self.readers():
+            if not _alive(reader["pid"]):
+                self._free(reader["slot"], reader["pid"])
+            elif reader["slow"]:
+                logger.warning(f"Читатель {reader['pid']} отстает: {reader['lag_messages']} записей, "
+                               f"{reader['lag_bytes'] / 1024 / 1024:.1f} МБ, потеряно {reader['lost']}")
+            elif reader["idle"] > self.stale_after:
+                logger.warning(f"Читатель {reader['pid']} не читает {reader['idle']:.0f} с")
+            else:
+                continue
+            problems.append(reader)
+        return problems
+
+    def _free(self, index, pid):
+        base = HEADER_SIZE // 8 + index * SLOT_WORDS
+        with _slots_locked(self.name):
+            if self._words[base + PID] != pid:  # Слот уже освободили или заняли заново
+                return
+            self._words[base:base + SLOT_WORDS] = memoryview(bytes(SLOT_WORDS * 8)).cast("Q")
+        logger.warning(f"Освобожден слот {index} завершившегося читателя {pid}")
+
+    def start_periodic(self, interval=10.0):
+        """Проверяет читателей каждые interval секунд в отдельном потоке"""
+        self.stop_periodic()
+        self._periodic_stop.clear()
+
+        def loop():
+            while not self._periodic_stop.wait(interval):
+                try:
+                    self.check_readers()
+                except Exception as e:
+                    logger.error(f"Ошибка проверки читателей: {e}")
+
+        self._periodic = threading.Thread(target=loop, name="RingReaders", daemon=True)
+        self._periodic.start()
+
+    def stop_periodic(self):
+        """Останавливает периодическую проверку"""
+        if self._periodic is not None:
+            self._periodic_stop.set()
+            self._periodic.join()
+            self._periodic = None
+
+    def stats(self):
+        return {"published": self.published, "dropped": self.dropped, "head": self.head, "tail": self.tail,
+                "readers": len(self.readers())}
+
+    def close(self):
+        """Закрывает и удаляет буфер (читатели дочитывают уже полученные копии)"""
+        self.stop_periodic()
+        self._words.release()
+        self._buf.release()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RingReader:
+    """Читатель кольцевого буфера со своим курсором; start="head" — только новые записи, "tail" — все уцелевшие"""
+    def __init__(self, name, start="head"):
+        self.shm = _attach(name)
+        self.name = name
+        self._buf = self.shm.buf
+        magic, version, self.slots, self.capacity = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self._buf.release()
+            self.shm.close()
+            raise ValueError(f"{name} — не буфер shm_ring версии {VERSION}")
+        self._data = HEADER_SIZE + self.slots * SLOT_WORDS * 8
+        self._words = self._buf[:self._data].cast("Q")
+        self.cursor = self._words[HEAD_WORD if start == "head" else TAIL_WORD]
+        self.expected = None  # Номер следующей записи (узнаем по первой прочитанной)
+        self.lost = 0  # Записей перезаписано раньше, чем прочитано
+        self.overruns = 0  # Сколько раз писатель обгонял читателя
+        self.received = 0
+        self._batch_start = None  # Курсор начала последней пачки poll(copy=False)
+        try:
+            self._slot = self._claim()
+        except Exception:  # Иначе память не закрыть: на нее остаются ссылки memoryview
+            self._slot = None
+            self.close()
+            raise
+
+    def _claim(self):
+        """Занимает свободный слот под блокировкой; слоты завершившихся процессов освобождает"""
+        words = self._words
+        with _slots_locked(self.name):
+            for index in range(self.slots):
+                base = HEADER_SIZE // 8 + index * SLOT_WORDS
+                pid = words[base + PID]
+                if pid:
+                    if _alive(pid):
+                        continue
+                    logger.warning(f"Освобожден слот {index} завершившегося читателя {pid}")
+                words[base:base + SLOT_WORDS] = memoryview(bytes(SLOT_WORDS * 8)).cast("Q")
+                words[base + CURSOR] = self.cursor
+                words[base + UPDATED] = time.monotonic_ns()
+                words[base + PID] = os.getpid()  # Последним: писатель видит слот уже заполненным
+                return base
+        raise RuntimeError(f"Нет свободных слотов читателей ({self.slots})")
+
+    def poll(self, max_messages=1000, copy=True):
+        """Новые записи (не больше max_messages) — список Message; не ждет, если записей нет"""
+        buf = self._buf
+        data = self._data
+        capacity = self.capacity
+        words = self._words
+        head = words[HEAD_WORD]
+        cursor = self.cursor
+        self._batch_start = cursor
+        messages = []
+        while cursor < head and len(messages) < max_messages:
+            tail = words[TAIL_WORD]
+            if cursor < tail:  # Писатель обогнал: переходим к самой старой уцелевшей записи
+                cursor = self._overrun(tail)
+                continue
+            pos = cursor % capacity
+            rest = capacity - pos
+            if rest < RECORD.size:
+                cursor += rest
+                continue
+            size, length, tag_length, _, seq, ns = RECORD.unpack_from(buf, data + pos)
+            if tag_length == WRAP:
+                cursor += rest
+                continue
+            start = data + pos + RECORD.size
+            tag = buf[start:start + tag_length].tobytes()
+            start += tag_length
+            payload = buf[start:start + length]
+            if copy:
+                payload = payload.tobytes()
+            tail = words[TAIL_WORD]
+            if tail > cursor:  # Запись затерли, пока мы ее читали
+                cursor = self._overrun(tail)
+                continue
+            if self.expected is not None and seq != self.expected:
+                self.lost += seq - self.expected
+            self.expected = seq + 1
+            messages.append(Message(seq, ns, tag.decode("ascii"), payload))
+            cursor += size
+        self.cursor = cursor
+        self.received += len(messages)
+        slot = self._slot
+        words[slot + CURSOR] = cursor
+        words[slot + EXPECTED] = self.expected or 0
+        words[slot + LOST] = self.lost
+        words[slot + UPDATED] = time.monotonic_ns()
+        return messages
+
+    def check(self):
+        """После обработки poll(copy=False): True — отданные memoryview не были перезаписаны"""
+        tail = self._words[TAIL_WORD]
+        if self._batch_start is None or tail <= self._batch_start:
+            return True
+        self._overrun(tail)
+        return False
+
+    def _overrun(self, tail):
+        self.overruns += 1
+        if self.overruns == 1 or self.overruns % 100 == 0:
+            logger.warning(f"Писатель обогнал читателя (раз: {self.overruns}), часть записей потеряна")
+        self.cursor = max(self.cursor, tail)
+        return tail
+
+    def lag(self):
+        """Сколько записей опубликовано, но еще не прочитано"""
+        return self._words[SEQ_WORD] - (self.expected or 0)
+
+    def close(self):
+        """Освобождает слот и отключается от памяти (memoryview из poll(copy=False) должны быть освобождены)"""
+        if self._slot is not None:
+            with _slots_locked(self.name):
+                self._words[self._slot:self._slot + SLOT_WORDS] = memoryview(bytes(SLOT_WORDS * 8)).cast("Q")
+            self._slot = None
+        self._words.release()
+        self._buf.release()
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":  # Читатель для проверки: python shm_ring.py transaq
+    logging.basicConfig(level=logging.INFO)
+    with RingReader(sys.argv[1] if len(sys.argv) > 1 else "transaq") as reader:
+        counts = Counter()
+        reported = time.monotonic()
+        try:
+            while True:
+                messages = reader.poll(10000)
+                counts.update(message.tag for message in messages)
+                if not messages:
+                    time.sleep(0.001)
+                if time.monotonic() - reported >= 1.0:
+                    print(f"{dict(counts)} потеряно: {reader.lost}, отставание: {reader.lag()}")
+                    counts.clear()
+                    reported = time.monotonic()
+        except KeyboardInterrupt:
+            pass
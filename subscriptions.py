@@ -0,0 +1,209 @@
+# Подписки на сделки и стаканы: желаемые и действующие наборы, минимальные пакетные команды
+#
+#   subscriptions = SubscriptionManager()
+#   subscriptions.attach(connector)          # команды через send_command_async, повтор после переподключения
+#   with subscriptions.batch():              # одна пара команд subscribe/unsubscribe на весь блок
+#       subscriptions.subscribe("alltrades", [("TQBR", "SBER"), ("TQBR", "GAZP")])
+#       subscriptions.unsubscribe("quotes", [("TQBR", "LKOH")])
+#
+# Менеджер хранит, на что подписаться нужно (desired) и на что подписка уже подтверждена
+# сервером (active). sync() отправляет только разницу: все виды данных — в одной команде,
+# не больше batch_size бумаг в команде. После потери связи действующие подписки
+# забываются, и когда сервер снова пишет connected="true", весь набор отправляется заново.
+import logging  # Для ведения логов
+import threading  # Изменения из потока интерфейса, результаты — из потока-отправителя
+from contextlib import contextmanager  # Для batch()
+from orders import security_part  # Фрагмент <security> в байтах
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+KINDS = ("alltrades", "quotations", "quotes")  # Виды данных команды subscribe
+
+
+class SubscriptionManager:
+    """Желаемые и действующие подписки по видам данных; отправляет разницу пакетами"""
+    def __init__(self, send=None, batch_size=500):
+        self.send = send  # send(bytes) -> Future с CommandResult, например Connector.send_command_async
+        self.batch_size = batch_size  # Не больше стольких бумаг в одной команде
+        self.desired = {kind: set() for kind in KINDS}  # Вид -> {(board, seccode)}
+        self.active = {kind: set() for kind in KINDS}  # Подтвержденные сервером
+        self._pending = {kind: {} for kind in KINDS}  # Вид -> {(board, seccode): True — подписка, False — отписка}
+        self._connected = False  # Подписки отправляются только при установленном соединении
+        self._epoch = 0  # Растет при каждой потере связи: ответы на старые команды не учитываются
+        self._batch_depth = 0
+        self._lock = threading.Lock()
+        self.sent = 0  # Сколько команд отправлено
+
+    def attach(self, connector, connected=False):
+        """Команды — через send_command_async коннектора; повторная подписка по <server_status>
+
+        connected=True — если соединение уже установлено (иначе подписки ждут connected="true").
+        """
+        if self.send is None:
+            self.send = connector.send_command_async
+        connector.add_record_handler("server_status", self.on_server_status)
+        self._connected = connected
+
+    # --- Желаемый набор ---
+
+    def subscribe(self, kind, securities):
+        """Добавляет бумаги [(board, seccode)] к подпискам вида kind"""
+        self._check_kind(kind)
+        with self._lock:
+            self.desired[kind].update(securities)
+        self._maybe_sync()
+
+    def unsubscribe(self, kind, securities):
+        """Убирает бумаги [(board, seccode)] из подписок вида kind"""
+        self._check_kind(kind)
+        with self._lock:
+            self.desired[kind].difference_update(securities)
+        self._maybe_sync()
+
+    def set(self, kind, securities):
+        """Заменяет весь набор бумаг вида kind"""
+        self._check_kind(kind)
+        with self._lock:
+            self.desired[kind] = set(securities)
+        self._maybe_sync()
+
+    def clear(self):
+        """Отписывается от всего"""
+        with self._lock:
+            for kind in KINDS:
+                self.desired[kind] = set()
+        self._maybe_sync()
+
+    @contextmanager
+    def batch(self):
+        """Откладывает отправку до конца блока, чтобы изменения ушли одной парой команд"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self._maybe_sync()
+
+    @staticmethod
+    def _check_kind(kind):
+        if kind not in KINDS:
+            raise ValueError(f"Неизвестный вид подписки: {kind} (допустимы {', '.join(KINDS)})")
+
+    def _maybe_sync(self):
+        if not self._batch_depth:
+            self.sync()
+
+    # --- Отправка разницы ---
+
+    def diff(self):
+        """Что нужно отправить: ({вид: [бумаги для подписки]}, {вид: [бумаги для отписки]})"""
+        with self._lock:
+            return self._diff()
+
+    def _diff(self):
+        add = {}
+        remove = {}
+        for kind in KINDS:
+            expected = set(self.active[kind])  # Каким набор станет после ответов на отправленные команды
+            for key, on in self._pending[kind].items():
+                if on:
+                    expected.add(key)
+                else:
+                    expected.discard(key)
+            desired = self.desired[kind]
+            if desired - expected:
+                add[kind] = sorted(desired - expected)
+            if expected - desired:
+                remove[kind] = sorted(expected - desired)
+        return add, remove
+
+    def sync(self):
+        """Отправляет минимальные команды subscribe/unsubscribe; возвращает список Future"""
+        if self.send is None:
+            raise RuntimeError("SubscriptionManager не подключен: вызовите attach(connector) или задайте send")
+        with self._lock:
+            if not self._connected:
+                return []  # Отправим все сразу после connected="true"
+            add, remove = self._diff()
+            epoch = self._epoch
+            for changes, on in ((remove, False), (add, True)):
+                for kind, keys in changes.items():
+                    pending = self._pending[kind]
+                    for key in keys:
+                        pending[key] = on
+        futures = []
+        for changes, command in ((remove, "unsubscribe"), (add, "subscribe")):  # Сначала отписка
+            for chunk in self._chunks(changes):
+                future = self.send(encode_subscription(command, chunk))
+                self.sent += 1
+                future.add_done_callback(
+                    lambda f, chunk=chunk, on=command == "subscribe": self._on_result(f, chunk, on, epoch))
+                futures.append(future)
+        return futures
+
+    def _chunks(self, changes):
+        """Делит {вид: [бумаги]} на части не больше batch_size бумаг (все виды в одной части)"""
+        chunk = {}
+        size = 0
+        for kind, keys in changes.items():
+            for key in keys:
+                chunk.setdefault(kind, []).append(key)
+                size += 1
+                if size == self.batch_size:
+                    yield chunk
+                    chunk = {}
+                    size = 0
+        if chunk:
+            yield chunk
+
+    def _on_result(self, future, chunk, on, epoch):
+        """Результат команды: подтвержденные бумаги переходят в active (или уходят из него)"""
+        result = future.result()
+        with self._lock:
+            if epoch != self._epoch:
+                return  # Связь терялась — после переподключения отправим заново
+            for kind, keys in chunk.items():
+                pending = self._pending[kind]
+                active = self.active[kind]
+                for key in keys:
+                    if pending.get(key) is on:
+                        del pending[key]
+                    if result.success:
+                        if on:
+                            active.add(key)
+                        else:
+                            active.discard(key)
+        if not result.success:
+            logger.error(f"Не удалось {'подписаться' if on else 'отписаться'}: {result.message}")
+
+    # --- Состояние соединения ---
+
+    def on_server_status(self, records):
+        """<server_status>: при потере связи подписки забываются, при connected="true" — отправляются снова"""
+        for status in records:
+            connected = status.connected == "true" and not status.recover
+            with self._lock:
+                if connected == self._connected:
+                    continue
+                self._connected = connected
+                if not connected:  # Сервер забыл подписки, ответы на отправленные команды не учитываем
+                    self._epoch += 1
+                    for kind in KINDS:
+                        self.active[kind].clear()
+                        self._pending[kind].clear()
+            if connected:
+                logger.info("Соединение установлено, отправляем подписки")
+                self.sync()
+
+
+def encode_subscription(command, securities):
+    """Команда subscribe/unsubscribe (bytes) для {вид: [(board, seccode)]}"""
+    parts = [b'<command id="%s">' % command.encode("ascii")]
+    for kind in KINDS:
+        keys = securities.get(kind)
+        if keys:
+            parts.append(b"<%s>" % kind.encode("ascii"))
+            parts += [security_part(board, seccode) for board, seccode in keys]
+            parts.append(b"</%s>" % kind.encode("ascii"))
+    parts.append(b"</command>")
+    return b"".join(parts)
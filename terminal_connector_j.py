@@ -1,15 +1,9 @@
 # Импортируем необходимые библиотеки
 import os  # Для работы с файлами и путями
 import logging  # Для ведения логов (записей о работе программы)
-import ctypes  # Для работы с DLL (библиотеками Windows)
-import xml.etree.ElementTree as ET  # Для разбора XML-данных
-from cryptography.fernet import Fernet  # Для шифрования паролей
-from datetime import datetime  # Для работы с датой и временем
-from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, 
-                             QHBoxLayout, QComboBox, QFormLayout, QTextEdit, QApplication)  # Элементы интерфейса
-from PyQt5.QtCore import QObject, pyqtSignal  # Сигналы для связи между компонентами
-from PyQt5.QtGui import QIcon  # Иконки для кнопок
+import argparse  # Для аргументов командной строки
 import sys  # Для работы с системными функциями (например, выход из программы)
+from connector_core import Connector as CoreConnector  # Коннектор без интерфейса (PyQt5 не нужен)
 
 # Настраиваем логгер (запись событий в консоль)
 logging.basicConfig(level=logging.INFO)  # Уровень INFO (вывод информационных сообщений)
@@ -17,387 +11,58 @@ logger = logging.getLogger(__name__)  # Создаем логгер с имен
 
 # Ключ шифрования для паролей (замените на свой, сгенерированный через generate_key.py)
 KEY = b'ваш сгенерированный ключ разработчика'
-cipher_suite = Fernet(KEY)  # Объект для шифрования/расшифровки
 
-class Log:
-    """Класс для записи логов в файл"""
-    def __init__(self):
-        self.log_flag = False  # Флаг, разрешена ли запись логов
-        self.log_file = None   # Файл, куда пишутся логи
-
-    def write_log(self, log_str):
-        """Записывает строку в лог-файл"""
-        if self.log_flag and self.log_file:  # Если запись разрешена и файл открыт
-            timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]  # Текущее время
-            self.log_file.write(f"{timestamp} {log_str}\n")  # Пишем строку в файл
-            self.log_file.flush()  # Сразу сохраняем изменения
-
-    def start_logging(self, path):
-        """Начинает запись логов в указанный файл"""
-        if not os.path.exists(path):  # Если файла нет — создаем
-            open(path, 'w').close()
-        self.log_file = open(path, 'a')  # Открываем файл в режиме добавления
-        self.log_flag = True  # Разрешаем запись
-        self.write_log("START LOGGING")  # Пишем первую запись
-
-    def stop_logging(self):
-        """Останавливает запись логов"""
-        if self.log_flag and self.log_file:  # Если запись была активна
-            self.write_log("STOP LOGGING")  # Пишем последнюю запись
-            self.log_file.close()  # Закрываем файл
-        self.log_flag = False  # Запрещаем дальнейшую запись
-
-class ConnectorSignals(QObject):
-    """Класс для сигналов (событий) в программе"""
-    connection_status_changed = pyqtSignal(str)  # Сигнал об изменении статуса соединения
-    error_occurred = pyqtSignal(str)  # Сигнал об ошибке
-    data_received = pyqtSignal(str)  # Сигнал о получении данных
-
-class Connector:
+class Connector(CoreConnector):
     """Основной класс для работы с Transaq Connector"""
-    def __init__(self):
-        self.signals = ConnectorSignals()  # Создаем объект сигналов
-        self.log = Log()  # Создаем логгер
-        self._load_dll()  # Загружаем DLL
-
-    def _load_dll(self):
-        """Загружает DLL-библиотеку для работы с Transaq"""
-        script_dir = os.path.dirname(os.path.abspath(__file__))  # Папка, где лежит программа
-        dll_path = os.path.join(script_dir, "txmlconnector64.dll")  # Путь к DLL
-        os.environ['PATH'] += os.pathsep + script_dir  # Добавляем путь в системный PATH
-
-        try:
-            self.txml = ctypes.WinDLL(dll_path)  # Загружаем DLL
-            logger.info(f"DLL успешно загружена из {dll_path}")  # Пишем в лог
-            self._setup_dll_functions()  # Настраиваем функции DLL
-            self._setup_callbacks()  # Настраиваем обработчики событий
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке DLL: {e}")  # Если ошибка — пишем в лог
-            raise  # Прерываем выполнение
-
-    def _setup_dll_functions(self):
-        """Настраивает типы аргументов и возвращаемых значений для функций DLL"""
-        self.CALLBACK_TYPE = ctypes.CFUNCTYPE(ctypes.c_bool, ctypes.c_void_p)  # Тип callback-функции
-        
-        # Настройка функций DLL:
-        self.txml.SetCallback.argtypes = [self.CALLBACK_TYPE]  # Устанавливаем callback
-        self.txml.SetCallback.restype = ctypes.c_bool
-        
-        self.txml.SendCommand.argtypes = [ctypes.c_char_p]  # Отправка команды
-        self.txml.SendCommand.restype = ctypes.c_void_p
-        
-        self.txml.FreeMemory.argtypes = [ctypes.c_void_p]  # Освобождение памяти
-        self.txml.FreeMemory.restype = None
-        
-        self.txml.Initialize.argtypes = [ctypes.c_char_p, ctypes.c_int]  # Инициализация
-        self.txml.Initialize.restype = ctypes.c_void_p
-        
-        self.txml.UnInitialize.argtypes = []  # Деинициализация
-        self.txml.UnInitialize.restype = ctypes.c_void_p
-
-    def _setup_callbacks(self):
-        """Настраивает callback-функцию для обработки входящих данных"""
-        @self.CALLBACK_TYPE
-        def callback(pData):
-            try:
-                if pData:  # Если данные получены
-                    data_ptr = ctypes.cast(pData, ctypes.c_char_p)  # Преобразуем указатель
-                    if data_ptr:
-                        data = data_ptr.value.decode('utf-8')  # Декодируем строку
-                        self._handle_data(data)  # Обрабатываем данные
-                        self.txml.FreeMemory(pData)  # Освобождаем память
-                return True
-            except Exception as e:
-                logger.error(f"Ошибка в callback: {e}", exc_info=True)  # Логируем ошибку
-                return False
-
-        self.callback_func = callback  # Сохраняем callback
-        
-        if not self.txml.SetCallback(self.callback_func):  # Устанавливаем callback
-            raise RuntimeError("Не удалось установить callback")  # Если ошибка
-
-    def _handle_data(self, data):
-        """Обрабатывает входящие данные (XML или текст)"""
-        self.log.write_log(data)  # Пишем в лог-файл
-        self.signals.data_received.emit(data)  # Отправляем данные в интерфейс
-        
-        try:
-            root = ET.fromstring(data)  # Пытаемся разобрать XML
-            if root.tag == "server_status":  # Если это статус сервера
-                status = root.get("connected", "unknown")  # Получаем статус
-                self.signals.connection_status_changed.emit(f"Состояние соединения: {status}")
-            elif root.tag == "error":  # Если это ошибка
-                self.signals.error_occurred.emit(f"Ошибка: {root.text}")
-        except ET.ParseError as e:
-            logger.debug(f"Не XML данные: {data[:100]}...")  # Если не XML — логируем
-
-    def send_command(self, command):
-        """Отправляет команду на сервер"""
-        try:
-            cmd_ptr = ctypes.c_char_p(command.encode('utf-8'))  # Преобразуем команду в байты
-            result_ptr = self.txml.SendCommand(cmd_ptr)  # Отправляем команду
-            
-            if result_ptr:  # Если есть ответ
-                result = ctypes.cast(result_ptr, ctypes.c_char_p).value.decode('utf-8')  # Декодируем
-                self.txml.FreeMemory(result_ptr)  # Освобождаем память
-                return result
-            return ""  # Если ответа нет
-        except Exception as e:
-            logger.error(f"Ошибка при отправке команды: {e}")  # Логируем ошибку
-            raise  # Прерываем выполнение
-
-    def initialize(self, path, log_level):
-        """Инициализирует подключение к серверу"""
-        try:
-            path_ptr = ctypes.c_char_p(path.encode('utf-8'))  # Путь к конфигурации
-            result_ptr = self.txml.Initialize(path_ptr, log_level)  # Инициализация
-            
-            if result_ptr:
-                result = ctypes.cast(result_ptr, ctypes.c_char_p).value.decode('utf-8')  # Ответ
-                self.txml.FreeMemory(result_ptr)  # Освобождаем память
-                
-                log_path = os.path.join(path, "transaq.log")  # Путь к лог-файлу
-                self.log.start_logging(log_path)  # Начинаем запись логов
-                
-                return result
-            return ""
-        except Exception as e:
-            logger.error(f"Ошибка инициализации: {e}")
-            raise
-
-    def uninitialize(self):
-        """Отключает соединение с сервером"""
-        try:
-            result_ptr = self.txml.UnInitialize()  # Деинициализация
-            
-            if result_ptr:
-                result = ctypes.cast(result_ptr, ctypes.c_char_p).value.decode('utf-8')
-                self.txml.FreeMemory(result_ptr)
-                
-                self.log.stop_logging()  # Останавливаем запись логов
-                
-                return result
-            return ""
-        except Exception as e:
-            logger.error(f"Ошибка деинициализации: {e}")
-            raise
-
-    def encrypt_password(self, password):
-        """Шифрует пароль"""
-        return cipher_suite.encrypt(password.encode()).decode()  # Возвращает зашифрованную строку
-
-    def decrypt_password(self, encrypted_password):
-        """Расшифровывает пароль"""
-        return cipher_suite.decrypt(encrypted_password.encode()).decode()  # Возвращает расшифрованный пароль
-
-class ConnectionWindow(QDialog):
-    """Главное окно программы"""
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Соединение с Transaq")  # Заголовок окна
-        self.setGeometry(370, 240, 920, 660)  # Позиция и размер окна
-
-        self.connector = Connector()  # Создаем объект Connector
-        
-        # Подключаем сигналы к методам:
-        self.connector.signals.data_received.connect(self._add_log_message)
-        self.connector.signals.error_occurred.connect(self._add_log_message)
-        self.connector.signals.connection_status_changed.connect(self._add_log_message)
-
-        main_layout = QVBoxLayout()  # Основной макет (вертикальный)
-        
-        # Форма для ввода данных:
-        form_layout = QFormLayout()
-        
-        # Поля ввода:
-        self.login_input = QLineEdit()  # Поле для логина
-        self.password_input = QLineEdit()  # Поле для пароля
-        self.password_input.setEchoMode(QLineEdit.Password)  # Скрываем пароль
-        
-        # Кнопка показа пароля:
-        self.toggle_password_btn = QPushButton()
-        self.toggle_password_btn.setIcon(QIcon("eye_icon.png"))  # Иконка глаза
-        self.toggle_password_btn.setCheckable(True)  # Кнопка-переключатель
-        self.toggle_password_btn.toggled.connect(self._toggle_password_visibility)  # Обработчик
-        
-        # Компоновка поля пароля:
-        password_layout = QHBoxLayout()
-        password_layout.addWidget(self.password_input)
-        password_layout.addWidget(self.toggle_password_btn)
-        
-        # Выбор сервера:
-        self.server_combo = QComboBox()
-        self.server_combo.addItems([
-            "АО «ФИНАМ» Основной адрес",
-            "АО «ФИНАМ» Резервный адрес",
-            "АО «Банк Финам» Основной адрес",
-            "АО «Банк Финам» Резервный адрес"
-        ])
-        
-        # Параметры серверов:
-        self.server_params = {
-            "АО «ФИНАМ» Основной адрес": {"ip": "tr1.finam.ru", "port": "3900"},
-            "АО «ФИНАМ» Резервный адрес": {"ip": "tr2.finam.online", "port": "3900"},
-            "АО «Банк Финам» Основной адрес": {"ip": "tr1.finambank.ru", "port": "3324"},
-            "АО «Банк Финам» Резервный адрес": {"ip": "tr2.finambank.ru", "port": "3324"},
-        }
-        
-        # Добавляем элементы в форму:
-        form_layout.addRow("Логин:", self.login_input)
-        form_layout.addRow("Пароль:", password_layout)
-        form_layout.addRow("Сервер:", self.server_combo)
-        
-        # Кнопки управления:
-        button_layout = QHBoxLayout()
-        self.clear_btn = QPushButton("Стереть")  # Кнопка очистки
-        self.clear_btn.clicked.connect(self._on_clear_clicked)
-        self.disconnect_btn = QPushButton("Отключить")  # Кнопка отключения
-        self.disconnect_btn.clicked.connect(self._on_disconnect_clicked)
-        self.disconnect_btn.setEnabled(False)  # По умолчанию выключена
-        self.connect_btn = QPushButton("Подключить")  # Кнопка подключения
-        self.connect_btn.clicked.connect(self._on_connect_clicked)
-        
-        button_layout.addWidget(self.clear_btn)
-        button_layout.addWidget(self.disconnect_btn)
-        button_layout.addWidget(self.connect_btn)
-        
-        # Журнал сообщений:
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)  # Только для чтения
-        
-        # Компоновка интерфейса:
-        main_layout.addLayout(form_layout)
-        main_layout.addLayout(button_layout)
-        main_layout.addWidget(QLabel("Журнал:"))
-        main_layout.addWidget(self.log_text)
-        
-        self.setLayout(main_layout)  # Устанавливаем макет
-        
-        self._load_saved_credentials()  # Загружаем сохраненные данные
-
-    def _toggle_password_visibility(self, checked):
-        """Показывает или скрывает пароль"""
-        self.password_input.setEchoMode(QLineEdit.Normal if checked else QLineEdit.Password)
-
-    def _load_saved_credentials(self):
-        """Загружает сохраненные логин и пароль из файла"""
-        config_path = os.path.join(os.path.dirname(__file__), "config.xml")
-        if os.path.exists(config_path):
-            try:
-                tree = ET.parse(config_path)  # Читаем XML
-                root = tree.getroot()
-                
-                login = root.find("login").text  # Логин
-                password = self.connector.decrypt_password(root.find("password").text)  # Пароль
-                host = root.find("host").text  # Адрес сервера
-                port = root.find("port").text  # Порт
-                
-                self.login_input.setText(login)  # Заполняем поле логина
-                self.password_input.setText(password)  # Заполняем поле пароля
-                
-                # Устанавливаем выбранный сервер:
-                for server, params in self.server_params.items():
-                    if params["ip"] == host and params["port"] == port:
-                        self.server_combo.setCurrentText(server)
-                        break
-                        
-                self._add_log_message("Конфигурация загружена")
-            except Exception as e:
-                self._add_log_message(f"Ошибка загрузки конфигурации: {e}")
-
-    def _save_config(self, login, password, host, port):
-        """Сохраняет настройки в файл config.xml"""
-        config_path = os.path.join(os.path.dirname(__file__), "config.xml")
-        
-        config = ET.Element("config")  # Создаем XML-структуру
-        ET.SubElement(config, "login").text = login
-        ET.SubElement(config, "password").text = self.connector.encrypt_password(password)  # Шифруем пароль
-        ET.SubElement(config, "host").text = host
-        ET.SubElement(config, "port").text = port
-        ET.SubElement(config, "language").text = "ru"
-        ET.SubElement(config, "autopos").text = "true"
-        ET.SubElement(config, "milliseconds").text = "true"
-        ET.SubElement(config, "utc_time").text = "true"
-
-        tree = ET.ElementTree(config)
-        tree.write(config_path, encoding="utf-8", xml_declaration=True)  # Сохраняем в файл
-        
-        self._add_log_message("Конфигурация сохранена")
-
-    def _add_log_message(self, message):
-        """Добавляет сообщение в журнал"""
-        self.log_text.append(message)  # Добавляем текст
-        self.log_text.ensureCursorVisible()  # Прокручиваем вниз
-
-    def _on_connect_clicked(self):
-        """Обработчик нажатия кнопки 'Подключить'"""
-        login = self.login_input.text()  # Получаем логин
-        password = self.password_input.text()  # Получаем пароль
-        server = self.server_combo.currentText()  # Получаем выбранный сервер
-        
-        if not login or not password:  # Если логин или пароль пустые
-            self._add_log_message("Ошибка: необходимо указать логин и пароль")
-            return
-            
-        if server not in self.server_params:  # Если сервер не найден
-            self._add_log_message("Ошибка: выбран несуществующий сервер")
-            return
-            
-        server_info = self.server_params[server]  # Получаем параметры сервера
-        
-        try:
-            self._save_config(login, password, server_info["ip"], server_info["port"])  # Сохраняем настройки
-            
-            result = self.connector.initialize(os.path.dirname(__file__), 1)  # Инициализация
-            self._add_log_message(f"Инициализация: {result}")
-            
-            # Формируем команду подключения в XML:
-            connect_cmd = f"""<command id="connect">
-                <login>{login}</login>
-                <password>{password}</password>
-                <host>{server_info['ip']}</host>
-                <port>{server_info['port']}</port>
-                <language>ru</language>
-                <autopos>true</autopos>
-                <milliseconds>true</milliseconds>
-                <utc_time>true</utc_time>
-            </command>"""
-            
-            response = self.connector.send_command(connect_cmd)  # Отправляем команду
-            self._add_log_message(f"Ответ сервера: {response}")
-            
-            self.connect_btn.setEnabled(False)  # Отключаем кнопку подключения
-            self.disconnect_btn.setEnabled(True)  # Включаем кнопку отключения
-            
-        except Exception as e:
-            self._add_log_message(f"Ошибка подключения: {e}")
-
-    def _on_disconnect_clicked(self):
-        """Обработчик нажатия кнопки 'Отключить'"""
-        try:
-            result = self.connector.uninitialize()  # Отключаемся
-            self._add_log_message(f"Отключение: {result}")
-            self.connect_btn.setEnabled(True)  # Включаем кнопку подключения
-            self.disconnect_btn.setEnabled(False)  # Отключаем кнопку отключения
-        except Exception as e:
-            self._add_log_message(f"Ошибка отключения: {e}")
-
-    def _on_clear_clicked(self):
-        """Обработчик нажатия кнопки 'Стереть'"""
-        config_path = os.path.join(os.path.dirname(__file__), "config.xml")
-        if os.path.exists(config_path):  # Если файл конфигурации существует
-            try:
-                os.remove(config_path)  # Удаляем его
-                self.login_input.clear()  # Очищаем поле логина
-                self.password_input.clear()  # Очищаем поле пароля
-                self._add_log_message("Конфигурация очищена")
-            except Exception as e:
-                self._add_log_message(f"Ошибка очистки: {e}")
-        else:
-            self._add_log_message("Конфигурация не найдена")
+    password_key = KEY  # Ключ для шифрования пароля в config.xml
+
+def main(argv=None):
+    """Запуск с окном или, с --headless, без окна и без PyQt5"""
+    parser = argparse.ArgumentParser(description="Соединение с Transaq")
+    parser.add_argument("--headless", action="store_true", help="без окна: подключение по config.xml")
+    parser.add_argument("--host", action="append", default=[], help="резервный адрес:порт для --headless (можно несколько)")
+    parser.add_argument("--shm", metavar="ИМЯ", help="раздавать поток другим процессам через общую память (shm_ring.py)")
+    parser.add_argument("--gateway", metavar="ПОРТ", type=int,
+                        help="принимать подписки и команды других программ по TCP на 127.0.0.1 (gateway.py)")
+    parser.add_argument("--capture", action="store_true", help="записывать все сырые сообщения в capture_*.tqc")
+    args = parser.parse_args(argv)
+    path = os.path.dirname(os.path.abspath(__file__))  # Папка программы: config.xml, DLL, лог-файлы
+    ring = None
+    if args.shm:
+        from shm_ring import RingWriter  # Раздача потока другим процессам через общую память
+        ring = RingWriter(args.shm)
+        ring.start_periodic()  # Предупреждения о медленных читателях — в лог
+    gateway = None
+    if args.gateway:
+        from gateway import Gateway  # Шлюз для других программ
+        gateway = Gateway(port=args.gateway)  # Порт открывается, когда появится коннектор
+    try:
+        if args.headless:
+            from headless import HeadlessApp, parse_host  # Работа без окна
+            connector = Connector(capture=args.capture)
+            if ring is not None:
+                ring.attach(connector)
+            if gateway is not None:
+                gateway.attach(connector)
+                gateway.start_thread()
+            return HeadlessApp(connector, path, [parse_host(host) for host in args.host]).run()
+        from PyQt5.QtWidgets import QApplication  # Окно и PyQt5 загружаются только здесь
+        from connection_window import ConnectionWindow
+        app = QApplication(sys.argv)  # Создаем приложение
+        window = ConnectionWindow(Connector)  # Создаем окно
+        window.connector.capture_enabled = args.capture  # Файл записи открывается при инициализации
+        if ring is not None:
+            ring.attach(window.connector)
+        if gateway is not None:
+            gateway.attach(window.connector)
+            gateway.start_thread()
+        window.show()  # Показываем окно
+        return app.exec_()  # Запускаем цикл обработки событий
+    finally:
+        if ring is not None:
+            ring.close()
+        if gateway is not None:
+            gateway.stop()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)  # Создаем приложение
-    window = ConnectionWindow()  # Создаем окно
-    window.show()  # Показываем окно
-    sys.exit(app.exec_())  # Запускаем цикл обработки событий
\ No newline at end of file
+    sys.exit(main())
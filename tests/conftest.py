@@ -0,0 +1,5 @@
+# Модули программы лежат в корне репозитория, без пакета — добавляем его в путь поиска
+import os  # Путь к корню репозитория
+import sys  # Путь поиска модулей
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+from candles import Bar, CandleSeries
+
+MINUTE = 60_000
+NOW = 100 * MINUTE + 30_000  # Середина сотой минуты
+
+
+def history(*bars):
+    return [Bar(start, price, price + 2, price - 1, price + 1, volume) for start, price, volume in bars]
+
+
+def test_trades_build_bars():
+    series = CandleSeries(MINUTE)
+    assert series.add_trade(0, 10, 1) is None
+    series.add_trade(1000, 12, 2)
+    closed = series.add_trade(MINUTE + 5, 11, 1)
+    assert closed == Bar(0, 10, 12, 10, 12, 3)
+    series.add_trade(2000, 9, 4)  # Опоздала, но ее свеча последняя закрытая
+    series.add_trade(3 * MINUTE, 1, 1)
+    series.add_trade(0, 1, 1)  # Опоздала больше чем на свечу
+    assert series.closed[0] == Bar(0, 10, 12, 9, 9, 7) and series.late == 1
+
+
+def test_history_then_live_trades_in_same_interval():
+    series = CandleSeries(MINUTE)
+    series.merge_history(history((98 * MINUTE, 10, 5), (99 * MINUTE, 11, 7), (100 * MINUTE, 12, 3)), now=NOW)
+    assert [bar.time for bar in series.bars()] == [98 * MINUTE, 99 * MINUTE]  # Недостроенная свеча пропущена
+    series.add_trade(99 * MINUTE + 59_000, 50, 100)  # Уже в свече истории
+    series.add_trade(100 * MINUTE + 10_000, 13, 2)
+    series.add_trade(100 * MINUTE + 40_000, 14, 1)
+    bars = series.bars()
+    assert bars[1] == history((99 * MINUTE, 11, 7))[0]
+    assert bars[2] == Bar(100 * MINUTE, 13, 14, 13, 14, 3) and series.late == 0
+
+
+def test_history_replaces_trade_bars_before_current():
+    series = CandleSeries(MINUTE)
+    series.add_trade(99 * MINUTE + 50_000, 20, 1)
+    series.add_trade(100 * MINUTE, 21, 1)
+    series.merge_history(history((99 * MINUTE, 11, 7), (100 * MINUTE, 12, 3)), now=101 * MINUTE)
+    assert series.bars() == history((99 * MINUTE, 11, 7)) + [Bar(100 * MINUTE, 21, 21, 21, 21, 1)]
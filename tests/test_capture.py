@@ -0,0 +1,58 @@
+import os
+import time
+from datetime import datetime
+
+from capture import CaptureReader, CaptureWriter, TAGS, tag_code
+
+
+def write(path, payloads, block_records=2):
+    writer = CaptureWriter(str(path), block_records=block_records)
+    base = time.monotonic_ns()
+    for i, payload in enumerate(payloads):
+        writer.write(payload, base + i * 1_000_000)
+    writer.close()
+
+
+PAYLOADS = [b'<server_status connected="true"/>', b"<stoporders><stoporder/></stoporders>",
+            b"<quotes><quote/></quotes>", b"<custom_tag/>", b"not xml",
+            b"<positions><sec_position/></positions>"]
+
+
+def test_tag_list_append_only():
+    assert TAGS[:8] == (None, "server_status", "result", "error", "quotes", "alltrades", "quotations", "ticks")
+    assert len(set(TAGS)) == len(TAGS)
+    for tag in ("stoporders", "sec_position", "money_position", "news"):
+        assert tag_code(tag) > 0
+
+
+def test_roundtrip_with_unknown_tags(tmp_path):
+    path = tmp_path / "capture.tqc"
+    write(path, PAYLOADS)
+    records = list(CaptureReader(str(path)))
+    assert [payload for _, _, payload in records] == PAYLOADS
+    assert [tag for _, tag, _ in records] == ["server_status", "stoporders", "quotes", "custom_tag", None,
+                                              "positions"]
+
+
+def test_filter_by_tags(tmp_path):
+    path = tmp_path / "capture.tqc"
+    write(path, PAYLOADS)
+    reader = CaptureReader(str(path))
+    assert [tag for _, tag, _ in reader.read(tags=["stoporders"])] == ["stoporders"]
+    assert [tag for _, tag, _ in reader.read(tags=["custom_tag", "quotes"])] == ["quotes", "custom_tag"]
+    assert list(reader.read(tags=["absent"])) == []
+
+
+def test_time_range_and_rebuilt_index(tmp_path):
+    path = tmp_path / "capture.tqc"
+    write(path, PAYLOADS)
+    first, *_, last = [ts for ts, _, _ in CaptureReader(str(path))]
+    os.remove(str(path) + ".idx")
+    reader = CaptureReader(str(path))
+    assert len(reader.blocks) == 3
+    expected = [first + i * 1_000_000 for i in range(1, 5)]
+    assert [ts for ts, _, _ in reader.read(start_ns=first + 1, end_ns=last - 1)] == expected
+    seconds = first // 1_000_000_000  # Целые секунды эпохи — тоже секунды, а не наносекунды
+    assert len(list(reader.read(seconds, seconds + 60))) == len(PAYLOADS)
+    assert list(reader.read(start=seconds + 60)) == []
+    assert list(reader.read(datetime.fromtimestamp(seconds + 60))) == []
@@ -0,0 +1,144 @@
+import threading
+import time
+
+from command_pipeline import CommandPipeline
+from command_scheduler import CommandScheduler
+from messages import decode
+
+NEWORDER = b'<command id="neworder"><seccode>SBER</seccode></command>'
+CANCEL = b'<command id="cancelorder"><transactionid>7</transactionid></command>'
+SUBSCRIBE = b'<command id="subscribe"><quotes/></command>'
+
+
+def moveorder(transactionid, price):
+    return (f'<command id="moveorder"><transactionid>{transactionid}</transactionid>'
+            f'<price>{price}</price></command>').encode()
+
+
+class Recorder:
+    """Поддельный SendCommand: запоминает команды и отвечает заданным ответом"""
+    def __init__(self, reply=b'<result success="true"/>', hold=None):
+        self.reply = reply
+        self.hold = hold  # threading.Event: send ждет его (зависший SendCommand)
+        self.sent = []
+
+    def __call__(self, command):
+        self.sent.append(command)
+        if self.hold is not None:
+            self.hold.wait(5)
+        return self.reply
+
+
+def test_result_without_confirm():
+    pipeline = CommandPipeline(Recorder())
+    try:
+        result = pipeline.submit(NEWORDER).result(2)
+    finally:
+        pipeline.stop()
+    assert result.success and not result.timed_out
+    assert result.elapsed >= result.queued >= 0
+
+
+def test_confirm_matched_by_orders():
+    pipeline = CommandPipeline(Recorder(b'<result success="true" transactionid="42"/>'))
+    try:
+        future = pipeline.submit(NEWORDER, confirm=True)
+        for _ in range(200):
+            if pipeline.pending():
+                break
+            time.sleep(0.01)
+        pipeline.on_orders(decode("orders", b'<orders><order transactionid="42"><status>active</status>'
+                                            b'</order></orders>'))
+        result = future.result(2)
+    finally:
+        pipeline.stop()
+    assert result.success and result.order.transactionid == 42
+
+
+def test_confirm_timeout():
+    pipeline = CommandPipeline(Recorder(b'<result success="true" transactionid="42"/>'))
+    try:
+        result = pipeline.submit(NEWORDER, timeout=0.1, confirm=True).result(2)
+    finally:
+        pipeline.stop()
+    assert result.timed_out and not result.success
+    assert result.transactionid == 42  # Ответ SendCommand сохраняется
+    assert pipeline.timeouts == 1 and pipeline.pending() == 0
+
+
+def test_queued_command_times_out_and_is_not_sent():
+    send = Recorder()
+    scheduler = CommandScheduler(limits={"subscribe": (0.5, 1)})  # Второй subscribe ждет токен 2 с
+    pipeline = CommandPipeline(send, scheduler=scheduler)
+    try:
+        assert pipeline.submit(SUBSCRIBE).result(2).success
+        result = pipeline.submit(SUBSCRIBE, timeout=0.2).result(1)
+        assert result.timed_out and result.message == "Не отправлена в срок"
+        assert len(scheduler) == 0  # Убрана из очереди планировщика
+        time.sleep(0.1)
+    finally:
+        pipeline.stop()
+    assert send.sent == [SUBSCRIBE]
+
+
+def test_hung_send_times_out():
+    hold = threading.Event()
+    send = Recorder(hold=hold)
+    finished = []
+    pipeline = CommandPipeline(send, on_finished=lambda request_id, result: finished.append(request_id))
+    try:
+        first = pipeline.submit(NEWORDER, timeout=0.2)
+        second = pipeline.submit(NEWORDER, timeout=0.2)  # Ждет в очереди за зависшей командой
+        assert first.result(1).message == "SendCommand не ответил в срок"
+        assert second.result(1).message == "Не отправлена в срок"
+        hold.set()
+        time.sleep(0.1)
+    finally:
+        pipeline.stop()
+    assert send.sent == [NEWORDER]
+    assert sorted(finished) == [first.request_id, second.request_id]  # Ответ после срока не повторяет callback
+
+
+def test_moveorder_coalesced():
+    hold = threading.Event()
+    send = Recorder(hold=hold)
+    pipeline = CommandPipeline(send)
+    try:
+        pipeline.submit(NEWORDER)  # Занимает отправителя, пока moveorder стоят в очереди
+        time.sleep(0.05)
+        old = pipeline.submit(moveorder(5, 100))
+        new = pipeline.submit(moveorder(5, 101))
+        assert old.result(1).superseded_by == new.request_id
+        hold.set()
+        assert new.result(2).success
+    finally:
+        pipeline.stop()
+    assert send.sent == [NEWORDER, moveorder(5, 101)]
+
+
+def test_priority_order():
+    hold = threading.Event()
+    send = Recorder(hold=hold)
+    pipeline = CommandPipeline(send)
+    try:
+        pipeline.submit(NEWORDER)
+        time.sleep(0.05)
+        futures = [pipeline.submit(command) for command in (SUBSCRIBE, NEWORDER, CANCEL)]
+        hold.set()
+        for future in futures:
+            future.result(2)
+    finally:
+        pipeline.stop()
+    assert send.sent == [NEWORDER, CANCEL, NEWORDER, SUBSCRIBE]
+
+
+def test_scheduler_discard():
+    scheduler = CommandScheduler()
+    first, second = object(), object()
+    scheduler.put(moveorder(5, 100), first)
+    scheduler.put(NEWORDER, second)
+    assert scheduler.discard(first)
+    assert not scheduler.discard(first)
+    assert scheduler.put(moveorder(5, 101), "new") is None  # Склеивать больше не с чем
+    assert scheduler.get(0) is second
+    assert scheduler.get(0) == "new"
@@ -0,0 +1,76 @@
+import queue
+import time
+
+import pytest
+
+from command_scheduler import CommandScheduler, command_id
+
+
+def command(name, transactionid=None, price=None):
+    body = "" if transactionid is None else f"<transactionid>{transactionid}</transactionid>"
+    body += "" if price is None else f"<price>{price}</price>"
+    return f'<command id="{name}">{body}</command>'.encode()
+
+
+def drain(scheduler):
+    items = []
+    while True:
+        try:
+            items.append(scheduler.get(0))
+        except queue.Empty:
+            return items
+
+
+def test_command_id():
+    assert command_id(command("neworder")) == "neworder"
+    assert command_id(b"<command id='get_securities'/>") == "get_securities" and command_id(b"<x/>") is None
+
+
+def test_priorities():
+    scheduler = CommandScheduler(limits={})
+    for name in ("subscribe", "neworder", "get_markets", "cancelorder", "connect"):
+        scheduler.put(command(name), name)
+    assert drain(scheduler) == ["cancelorder", "neworder", "connect", "subscribe", "get_markets"]
+
+
+def test_rate_limit_throttles():
+    scheduler = CommandScheduler(limits={"transactions": (20.0, 2)})
+    for i in range(4):
+        scheduler.put(command("neworder"), i)
+    started = time.monotonic()
+    assert [scheduler.get(1) for _ in range(4)] == [0, 1, 2, 3]
+    assert time.monotonic() - started >= 0.08  # Два сверх запаса — по 1/20 с
+    report = scheduler.report()["neworder"]
+    assert report["count"] == 4 and report["throttled"] == 2
+
+
+def test_waiting_bucket_not_bypassed_by_lower_priority():
+    scheduler = CommandScheduler(limits={"transactions": (1.0, 1), "subscribe": (100.0, 10)})
+    scheduler.buckets["transactions"].tokens = 0.0
+    scheduler.put(command("cancelorder", 1), "cancel")
+    scheduler.put(command("neworder"), "new")  # Та же корзина, что у ждущей отмены
+    scheduler.put(command("subscribe"), "subscribe")  # Другая корзина — уходит сразу
+    assert drain(scheduler) == ["subscribe"]
+    assert scheduler.throttled == {"cancelorder": 1, "neworder": 1}
+    with pytest.raises(queue.Empty):
+        scheduler.get(0.05)
+
+
+def test_moveorder_coalesced():
+    scheduler = CommandScheduler(limits={})
+    assert scheduler.put(command("moveorder", 5, 100), "a") is None
+    scheduler.put(command("moveorder", 6, 100), "b")
+    assert scheduler.put(command("moveorder", 5, 101), "c") == "a"
+    assert drain(scheduler) == ["c", "b"] and scheduler.coalesced == 1
+    assert scheduler.put(command("moveorder", 5, 102), "d") is None  # Прежняя уже ушла
+
+
+def test_close_and_acquire():
+    scheduler = CommandScheduler(limits={"transactions": (50.0, 1)})
+    scheduler.put(command("neworder"), "x")
+    scheduler.close()
+    assert scheduler.get(1) == "x" and scheduler.get(1) is None
+    started = time.monotonic()
+    scheduler.acquire(command("cancelorder", 1))  # Токен забрала neworder — ждем следующий
+    assert time.monotonic() - started >= 0.01 and scheduler.throttled["cancelorder"] == 1
+    scheduler.acquire(command("get_markets"))  # Без лимита — сразу
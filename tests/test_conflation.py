@@ -0,0 +1,71 @@
+import threading
+
+from conflation import Conflator, merge
+from messages import decode
+
+
+def quotes(*levels):
+    """levels: (seccode, price, buy)"""
+    return decode("quotes", b"<quotes>" + b"".join(
+        b'<quote secid="1"><board>TQBR</board><seccode>%s</seccode><price>%s</price><buy>%d</buy></quote>' % (
+            seccode.encode(), price.encode(), buy) for seccode, price, buy in levels) + b"</quotes>")
+
+
+def quotation(seccode, **fields):
+    return decode("quotations", b'<quotations><quotation secid="1"><board>TQBR</board><seccode>%s</seccode>%s'
+                  b'</quotation></quotations>' % (seccode.encode(), b"".join(
+                      b"<%s>%s</%s>" % (name.encode(), value.encode(), name.encode())
+                      for name, value in fields.items())))
+
+
+def trades(number):
+    return decode("alltrades", b'<alltrades><trade secid="1"><board>TQBR</board><seccode>SBER</seccode>'
+                  b'<tradeno>%d</tradeno><price>1</price><quantity>1</quantity><buysell>B</buysell></trade>'
+                  b'</alltrades>' % number)
+
+
+def test_merge_keeps_missing_fields():
+    old, new = quotation("SBER", last="100", bid="99")[0], quotation("SBER", last="101")[0]
+    merged = merge(old, new)
+    assert (merged.last, merged.bid) == (new.last, old.bid)
+    assert old.last != new.last  # Исходные записи не изменились
+
+
+def test_levels_conflated_trades_kept():
+    conflator = Conflator()
+    conflator.on_conflated("quotes", quotes(("SBER", "100", 1), ("SBER", "101", 2)))
+    conflator.on_lossless("alltrades", trades(1))
+    conflator.on_conflated("quotes", quotes(("SBER", "100", 5), ("SBER", "101", -1), ("GAZP", "160", 3)))
+    conflator.on_lossless("alltrades", trades(2))
+    conflator.on_conflated("quotations", quotation("SBER", last="100", bid="99"))
+    conflator.on_conflated("quotations", quotation("SBER", last="101"))
+    batches = conflator.poll(0)
+    assert [tag for tag, _ in batches] == ["alltrades", "alltrades", "quotes", "quotations"]
+    assert [records[0].tradeno for _, records in batches[:2]] == [1, 2]
+    levels = {(record.seccode, record.buy) for record in batches[2][1]}
+    assert levels == {("SBER", 5), ("SBER", -1), ("GAZP", 3)}  # Удаление уровня тоже доходит
+    (sber,) = batches[3][1]
+    assert sber.last == quotation("SBER", last="101")[0].last and sber.bid is not None
+    assert conflator.poll(0) == []
+    report = conflator.report()
+    assert report[("TQBR", "SBER")] == {"received": 6, "delivered": 3, "ratio": 2.0}
+    assert conflator.stats()["passed"] == 2
+
+
+def test_consumer_thread():
+    conflator = Conflator()
+    got = []
+    done = threading.Event()
+
+    def consume(batches):
+        got.extend(batches)
+        if any(tag == "alltrades" for tag, _ in got):
+            done.set()
+
+    conflator.start(consume)
+    try:
+        conflator.on_lossless("alltrades", trades(1))
+        assert done.wait(5)
+    finally:
+        conflator.stop()
+    assert conflator._thread is None
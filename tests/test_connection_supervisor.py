@@ -0,0 +1,105 @@
+from concurrent.futures import Future
+
+import pytest
+
+from command_pipeline import CommandResult
+from connection_supervisor import (ConnectionSupervisor, CONNECTED, CONNECTING, FAILED, WAITING,
+                                   build_connect_command, is_fatal)
+from messages import decode
+
+
+def status(connected, text=""):
+    return decode("server_status", f'<server_status connected="{connected}">{text}</server_status>'.encode())
+
+
+class Sender:
+    def __init__(self, result=None):
+        self.commands = []
+        self.result = result or CommandResult(1, True)
+
+    def __call__(self, command):
+        self.commands.append(command)
+        future = Future()
+        future.set_result(self.result)
+        return future
+
+
+def supervisor(sender, fatal):
+    sup = ConnectionSupervisor(backoff_initial=10.0, probe_timeout=0, on_status=lambda text: None,
+                               on_fatal=fatal.append)
+    sup.send = sender
+    return sup
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Неверный логин или пароль", True), ("Password expired", True), ("Счет заблокирован", True),
+    ("Invalid login or password", True), ("Не указан пароль", True),
+    ("Сервер не отвечает", False), ("Связь не восстановилась", False), ("", False), (None, False),
+    ("Сервер входа (login) временно недоступен", False), ("Login server is busy, try later", False),
+    ("Смена пароля временно недоступна", False), ("Connection to host locked by another session", False),
+])
+def test_is_fatal(text, expected):
+    assert is_fatal(text) is expected
+
+
+def test_connect_command_escapes():
+    command = build_connect_command("u<1", "p&2", "host", 3900, rqdelay=100, milliseconds=None)
+    assert b"<login>u&lt;1</login>" in command and b"<password>p&amp;2</password>" in command
+    assert b"<rqdelay>100</rqdelay>" in command and b"milliseconds" not in command
+
+
+def test_transient_failure_retries():
+    fatal = []
+    sup = supervisor(Sender(), fatal)
+    sup.start([("a", 1), ("b", 2)], "login", "password")
+    assert sup.state == CONNECTING
+    sup.on_server_status(status("error", "Сервер не отвечает"))
+    try:
+        assert sup.state == WAITING and sup._timer is not None
+        assert sup.endpoints[0].failures == 1 and not fatal
+        assert sup.best() is sup.endpoints[1]
+    finally:
+        sup.stop()
+
+
+def test_transient_error_mentioning_login_retries():
+    fatal = []
+    sup = supervisor(Sender(), fatal)
+    sup.start([("a", 1)], "login", "password")
+    sup.on_server_status(status("error", "Login server is busy, try later"))
+    try:
+        assert sup.state == WAITING and sup._timer is not None and not fatal
+    finally:
+        sup.stop()
+
+
+def test_bad_credentials_stop_retrying():
+    fatal = []
+    sup = supervisor(Sender(), fatal)
+    sup.start([("a", 1)], "login", "wrong")
+    sup.on_server_status(status("error", "Неверный логин или пароль"))
+    assert sup.state == FAILED and sup._timer is None
+    assert sup.last_error == "Неверный логин или пароль" and fatal == ["Неверный логин или пароль"]
+    sup.on_server_status(status("false"))  # Разрыв после ошибки входа — не повод для повтора
+    assert sup.state == FAILED and len(fatal) == 1
+
+
+def test_failed_connect_result_is_fatal():
+    fatal = []
+    sup = supervisor(Sender(CommandResult(1, False, message="Не указан логин")), fatal)
+    sup.start([("a", 1)], "", "password")
+    assert sup.state == FAILED and fatal == ["Не указан логин"]
+
+
+def test_restart_after_fatal():
+    fatal = []
+    sender = Sender()
+    sup = supervisor(sender, fatal)
+    sup.start([("a", 1)], "login", "wrong")
+    sup.on_server_status(status("error", "Неверный пароль"))
+    sup.start([("a", 1)], "login", "right")
+    sup.on_server_status(status("true"))
+    try:
+        assert sup.state == CONNECTED and sup.last_error is None and len(sender.commands) == 2
+    finally:
+        sup.stop()
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from connector_core import Connector
+from transport import OK_RESULT, Transport
+
+
+class FakeTransport(Transport):
+    """Транспорт без DLL: запоминает, из какого потока отправлена каждая команда"""
+    def __init__(self, reply=OK_RESULT, error=None):
+        super().__init__()
+        self.reply = reply
+        self.error = error
+        self.threads = []
+
+    def initialize(self, path, log_level):
+        return OK_RESULT
+
+    def send_command(self, command):
+        self.threads.append(threading.current_thread().name)
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+    def uninitialize(self):
+        return OK_RESULT
+
+
+@pytest.fixture
+def connector():
+    connectors = []
+
+    def make(transport, **options):
+        connectors.append(Connector(transport=transport, **options))
+        return connectors[-1]
+
+    yield make
+    for item in connectors:
+        item.commands.stop(timeout=1.0)
+        item.queue.stop(timeout=1.0)
+
+
+def test_sync_send_goes_through_pipeline(connector):
+    transport = FakeTransport()
+    sync = connector(transport).send_command('<command id="get_markets"/>')
+    assert sync == OK_RESULT.decode() and transport.threads == ["CommandSender"]
+
+
+def test_sync_send_failures(connector):
+    assert connector(FakeTransport(reply=None)).send_command('<command id="get_markets"/>') == ""
+    with pytest.raises(RuntimeError, match="нет связи"):
+        connector(FakeTransport(error=OSError("нет связи"))).send_command('<command id="get_markets"/>')
+
+
+def test_capture_is_opt_in(connector, tmp_path):
+    plain = connector(FakeTransport())
+    plain.initialize(str(tmp_path), 1)
+    plain.uninitialize()
+    assert not list(tmp_path.glob("capture_*.tqc"))
+    recording = connector(FakeTransport(), capture=True)
+    recording.initialize(str(tmp_path), 1)
+    recording.uninitialize()
+    assert len(list(tmp_path.glob("capture_*.tqc"))) == 1
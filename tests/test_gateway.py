@@ -0,0 +1,121 @@
+import asyncio
+from concurrent.futures import Future
+
+from command_pipeline import CommandResult
+from gateway import Gateway, GatewayClient
+from messages import decode
+
+
+def alltrades(*instruments):
+    return decode("alltrades", b"<alltrades>" + b"".join(
+        b'<trade secid="1"><seccode>%s</seccode><board>%s</board><tradeno>%d</tradeno><price>1</price>'
+        b'<quantity>1</quantity><buysell>B</buysell></trade>' % (seccode, board, number)
+        for number, (board, seccode) in enumerate(instruments, 1)) + b"</alltrades>")
+
+
+class FakeConnector:
+    def __init__(self):
+        self.handlers = {}
+        self.commands = []
+        self.reply = None  # Future, которым ответит send_command_async
+
+    def add_record_handler(self, tag, handler):
+        self.handlers[tag] = handler
+
+    def remove_record_handler(self, tag, handler):
+        assert self.handlers.pop(tag) is handler
+
+    def send_command_async(self, command, timeout=None, confirm=False):
+        self.commands.append(command)
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+async def started(connector):
+    gateway = Gateway(port=0)
+    gateway.attach(connector)
+    await gateway.start()
+    port = gateway._server.sockets[0].getsockname()[1]
+    return gateway, port
+
+
+async def receive(client, timeout=0.3):
+    """Все (board, seccode), полученные клиентом за timeout"""
+    got = []
+    try:
+        while True:
+            _, records = await asyncio.wait_for(client.__anext__(), timeout)
+            got += [(record.board, record.seccode) for record in records]
+    except asyncio.TimeoutError:
+        return got
+
+
+def test_filters():
+    async def run():
+        connector = FakeConnector()
+        gateway, port = await started(connector)
+        clients = [await GatewayClient.connect(port=port) for _ in range(4)]
+        await clients[0].subscribe("alltrades")
+        await clients[1].subscribe("alltrades", board="TQBR")
+        await clients[2].subscribe("alltrades", seccode="SBER")
+        await clients[3].subscribe("alltrades", board="TQBR", seccode="SBER")
+        await clients[3].subscribe("alltrades", seccode="SBER")  # Запись приходит один раз
+        await asyncio.sleep(0.1)
+        connector.handlers["alltrades"](alltrades((b"TQBR", b"SBER"), (b"TQBR", b"GAZP"), (b"SMAL", b"SBER")))
+        got = [await receive(client) for client in clients]
+        for client in clients:
+            await client.close()
+        await gateway.close()
+        return got
+
+    everything, board, seccode, both = asyncio.run(run())
+    assert everything == [("TQBR", "SBER"), ("TQBR", "GAZP"), ("SMAL", "SBER")]
+    assert board == [("TQBR", "SBER"), ("TQBR", "GAZP")]  # Только режим торгов, не все записи
+    assert seccode == [("TQBR", "SBER"), ("SMAL", "SBER")]
+    assert both == [("TQBR", "SBER"), ("SMAL", "SBER")]
+
+
+def test_handler_removed_with_last_subscriber():
+    async def run():
+        connector = FakeConnector()
+        gateway, port = await started(connector)
+        client = await GatewayClient.connect(port=port)
+        await client.subscribe("alltrades", board="TQBR")
+        await asyncio.sleep(0.1)
+        subscribed = "alltrades" in connector.handlers
+        await client.unsubscribe("alltrades", board="TQBR")
+        await asyncio.sleep(0.1)
+        await client.close()
+        await gateway.close()
+        return subscribed, dict(connector.handlers), gateway._topics
+
+    subscribed, handlers, topics = asyncio.run(run())
+    assert subscribed and not handlers and not topics.get("alltrades")
+
+
+def test_command_results():
+    async def run():
+        connector = FakeConnector()
+        gateway, port = await started(connector)
+        client = await GatewayClient.connect(port=port)
+        connector.reply = Future()
+        connector.reply.set_result(CommandResult(1, True, 42))
+        ok = await client.command('<command id="neworder"/>')
+        connector.reply = Future()
+        connector.reply.set_exception(RuntimeError("очередь закрыта"))
+        failed = await asyncio.wait_for(client.command('<command id="neworder"/>'), 2)
+        connector.reply = Future()
+        connector.reply.cancel()
+        cancelled = await asyncio.wait_for(client.command('<command id="neworder"/>'), 2)
+        connector.reply = ConnectionError("нет соединения")
+        refused = await asyncio.wait_for(client.command('<command id="neworder"/>'), 2)
+        await client.close()
+        await gateway.close()
+        return ok, failed, cancelled, refused
+
+    ok, failed, cancelled, refused = asyncio.run(run())
+    assert ok["success"] and ok["transactionid"] == 42
+    assert not failed["success"] and failed["message"] == "очередь закрыта"
+    assert not cancelled["success"]
+    assert not refused["success"] and refused["message"] == "нет соединения"
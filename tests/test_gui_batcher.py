@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from gui_batcher import SignalBatcher  # noqa: E402
+
+
+class Sink:
+    def __init__(self):
+        self.frames = []
+
+    def __call__(self, items, skipped):
+        self.frames.append((list(items), skipped))
+
+
+def make(max_per_frame=3, backlog=5):
+    sink = Sink()
+    batcher = SignalBatcher(sink, max_per_frame=max_per_frame, backlog=backlog)
+    batcher._timer.stop()  # Кадры вызываются тестом
+    return batcher, sink
+
+
+def test_frame_limited_and_backlog_kept():
+    batcher, sink = make()
+    for i in range(5):
+        batcher.collect(i, "data")
+    batcher.flush()
+    batcher.flush()
+    batcher.flush()
+    assert sink.frames == [([("data", 0), ("data", 1), ("data", 2)], 0), ([("data", 3), ("data", 4)], 0)]
+
+
+def test_only_data_evicted():
+    batcher, sink = make(max_per_frame=100, backlog=2)
+    batcher.collect("connected", "status")
+    for i in range(4):
+        batcher.collect(i, "data")
+    batcher.collect("fail", "error")
+    batcher.flush()
+    assert sink.frames == [([("status", "connected"), ("data", 2), ("data", 3), ("error", "fail")], 2)]
+
+
+def test_status_not_evicted_by_flood():
+    batcher, sink = make(max_per_frame=10, backlog=10)
+    for i in range(1000):
+        batcher.collect(i, "data")
+        if i % 100 == 0:
+            batcher.collect(i, "status")
+    while batcher.pending():
+        batcher.flush()
+    status = [text for items, _ in sink.frames for category, text in items if category == "status"]
+    assert status == list(range(0, 1000, 100))
+    assert all(len(items) <= 10 for items, _ in sink.frames)
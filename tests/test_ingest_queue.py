@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+
+import pytest
+
+from ingest_queue import IngestQueue, DROP_OLDEST, BLOCK, COALESCE
+
+
+def message(body):
+    return (time.monotonic_ns(), body)
+
+
+def drain(queue):
+    items = []
+    while True:
+        item = queue.get(timeout=0)
+        if item is None:
+            return [data for _, data in items]
+        items.append(item)
+
+
+QUOTES = b'<quotes><quote secid="1"/></quotes>'
+ORDERS = b'<orders><order transactionid="1"/></orders>'
+STATUS = b'<server_status connected="true"/>'
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        IngestQueue(policy="lifo")
+
+
+def test_drop_oldest_keeps_newest():
+    queue = IngestQueue(maxsize=3, policy=DROP_OLDEST)
+    for i in range(5):
+        queue.put(message(b"<quotes>%d</quotes>" % i))
+    assert drain(queue) == [b"<quotes>2</quotes>", b"<quotes>3</quotes>", b"<quotes>4</quotes>"]
+    assert queue.dropped == 2 and queue.pushed == 5 and queue.max_depth == 3
+
+
+@pytest.mark.parametrize("policy", [DROP_OLDEST, COALESCE])
+def test_protected_messages_never_dropped(policy):
+    queue = IngestQueue(maxsize=2, policy=policy)
+    queue.put(message(ORDERS))
+    queue.put(message(QUOTES))
+    queue.put(message(QUOTES + b" "))  # Выбрасывается quotes, а не более старые orders
+    assert drain(queue) == [ORDERS, QUOTES + b" "]
+    queue.put(message(ORDERS))
+    queue.put(message(STATUS))
+    queue.put(message(ORDERS))  # Выбросить нечего — очередь растет
+    assert drain(queue) == [ORDERS, STATUS, ORDERS]
+    assert queue.dropped == 1
+
+
+def test_drop_warning_logged(caplog):
+    queue = IngestQueue(maxsize=1, policy=DROP_OLDEST)
+    with caplog.at_level(logging.WARNING, logger="ingest_queue"):
+        for _ in range(10):
+            queue.put(message(QUOTES))
+    warnings = [record for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1  # Не чаще раза в секунду
+    assert "выброшено 1" in warnings[0].getMessage()
+
+
+def test_coalesce_replaces_snapshot_in_place():
+    queue = IngestQueue(maxsize=10, policy=COALESCE)
+    queue.put(message(b"<markets>1</markets>"))
+    queue.put(message(QUOTES))
+    queue.put(message(b"<markets>2</markets>"))
+    assert drain(queue) == [b"<markets>2</markets>", QUOTES]
+    assert queue.coalesced == 1 and queue.dropped == 0
+
+
+def test_coalesce_keeps_reconnect_and_accounts():
+    queue = IngestQueue(maxsize=10, policy=COALESCE)
+    disconnected = b'<server_status connected="false"/>'
+    clients = [b'<client id="A1" remove="false"/>', b'<client id="B2" remove="false"/>']
+    for data in (disconnected, STATUS, *clients):
+        queue.put(message(data))
+    assert drain(queue) == [disconnected, STATUS, *clients]  # Разрыв не теряется, счета — все
+    assert queue.coalesced == 0
+
+
+def test_coalesce_overflow_releases_key():
+    queue = IngestQueue(maxsize=1, policy=COALESCE, protect=None)
+    queue.put(message(b"<markets>1</markets>"))
+    queue.put(message(QUOTES))  # Выбрасывает markets
+    queue.put(message(b"<markets>2</markets>"))  # Уже не схлопывается с выброшенным
+    assert drain(queue) == [b"<markets>2</markets>"]
+    assert queue.coalesced == 0 and queue.dropped == 2
+
+
+def test_block_waits_for_workers():
+    queue = IngestQueue(maxsize=2, policy=BLOCK)
+    handled = []
+    release = threading.Event()
+
+    def handler(item):
+        release.wait(2)
+        handled.append(item[1])
+
+    queue.start_workers(handler)
+    for i in range(6):
+        if i == 4:
+            release.set()
+        queue.put(message(b"<quotes>%d</quotes>" % i))
+    queue.stop()
+    assert handled == [b"<quotes>%d</quotes>" % i for i in range(6)]
+    assert queue.dropped == 0
+
+
+def test_processed_counted_across_workers():
+    queue = IngestQueue(maxsize=100000, policy=BLOCK)
+    queue.start_workers(lambda item: None, count=4)
+    for i in range(20000):
+        queue.put(message(QUOTES))
+    queue.stop()
+    assert queue.processed == 20000
+    assert queue.stats()["processed"] == 20000
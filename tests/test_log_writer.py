@@ -0,0 +1,72 @@
+import atexit
+import threading
+import time
+
+import log_writer
+from log_writer import Log
+
+
+def read_lines(path):
+    with open(path, "rb") as f:
+        return [line.split(b" ", 1)[1] for line in f.read().splitlines()]
+
+
+def test_lines_written_in_order(tmp_path):
+    path = tmp_path / "log.txt"
+    log = Log(flush_interval=0.01)
+    log.start_logging(str(path))
+    for i in range(1000):
+        log.write_log(f"строка {i}" if i % 2 else b"bytes %d" % i)
+    log.stop_logging()
+    lines = read_lines(path)
+    assert lines[0] == b"START LOGGING" and lines[-1] == b"STOP LOGGING"
+    assert lines[1:4] == [b"bytes 0", "строка 1".encode(), b"bytes 2"] and len(lines) == 1002
+    assert log.stats()["lines_total"] == 1002
+
+
+def test_rotation_by_size(tmp_path):
+    path = tmp_path / "log.txt"
+    log = Log(flush_interval=0.01, flush_bytes=1, max_bytes=200, backup_count=2)
+    log.start_logging(str(path))
+    for i in range(50):
+        log.write_log("x" * 50)
+        time.sleep(0.002)
+    log.stop_logging()
+    assert (tmp_path / "log.txt.1").exists() and (tmp_path / "log.txt.2").exists()
+    assert not (tmp_path / "log.txt.3").exists()
+
+
+def test_atexit_registered_once(tmp_path):
+    before = atexit._ncallbacks()
+    logs = [Log() for _ in range(3)]
+    for i, log in enumerate(logs):
+        log.start_logging(str(tmp_path / f"{i}.txt"))
+    assert atexit._ncallbacks() == before  # Логи не добавляют обработчиков
+    for log in logs[1:]:
+        log.stop_logging()
+    assert logs[0] in log_writer._active
+    log_writer._stop_all()
+    assert not logs[0].log_flag and logs[0] not in log_writer._active
+    assert read_lines(tmp_path / "0.txt")[-1] == b"STOP LOGGING"
+
+
+def test_queue_bounded(tmp_path):
+    log = Log(flush_interval=0.01, max_queue=5)
+    release = threading.Event()
+    write_batch = log._write_batch
+
+    def slow_disk():
+        release.wait(5)
+        write_batch()
+
+    log._write_batch = slow_disk
+    log.start_logging(str(tmp_path / "log.txt"))
+    writer = threading.Thread(target=lambda: [log.write_log(f"line {i}") for i in range(100)])
+    writer.start()
+    time.sleep(0.2)
+    assert writer.is_alive() and len(log._queue) <= 5  # Ждет, а не копит строки
+    release.set()
+    writer.join(5)
+    log.stop_logging()
+    assert not writer.is_alive() and log.waits > 0
+    assert len(read_lines(tmp_path / "log.txt")) == 102
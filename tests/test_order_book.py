@@ -0,0 +1,43 @@
+from messages import PRICE_SCALE, decode
+from order_book import BookSide, OrderBooks
+
+
+def quotes(*levels):
+    """levels: (board, seccode, price, buy, sell); None — поля нет в обновлении"""
+    return decode("quotes", b"<quotes>" + b"".join(
+        b'<quote secid="1"><board>%s</board><seccode>%s</seccode><price>%s</price>%s%s</quote>' % (
+            board.encode(), seccode.encode(), price.encode(),
+            b"" if buy is None else b"<buy>%d</buy>" % buy, b"" if sell is None else b"<sell>%d</sell>" % sell)
+        for board, seccode, price, buy, sell in levels) + b"</quotes>")
+
+
+def test_side_keeps_best_last():
+    bids, asks = BookSide(1), BookSide(-1)
+    for price in (100, 102, 101):
+        bids.set(price, price)
+        asks.set(price, price)
+    assert bids.best() == (102, 102) and asks.best() == (100, 100)
+    assert bids.levels() == [(102, 102), (101, 101), (100, 100)]
+    assert asks.levels(2) == [(100, 100), (101, 101)]
+    bids.set(101, 5)
+    bids.set(102, -1)
+    bids.set(999, -1)  # Удаление несуществующего уровня ничего не меняет
+    assert bids.levels() == [(101, 5), (100, 100)]
+
+
+def test_books_from_quotes():
+    books = OrderBooks()
+    books.on_quotes(quotes(("TQBR", "SBER", "250.10", 10, None), ("TQBR", "SBER", "250.20", None, 7),
+                           ("TQBR", "SBER", "250.00", 3, None), ("TQBR", "GAZP", "160", None, 1)))
+    books.on_quotes(quotes(("TQBR", "SBER", "250.10", -1, None), ("TQBR", "SBER", "250.30", None, 4)))
+    book = books.get("TQBR", "SBER")
+    assert book.best_bid() == (250 * PRICE_SCALE, 3)
+    assert book.best_ask() == (25020 * PRICE_SCALE // 100, 7)
+    assert book.spread() == 20 * PRICE_SCALE // 100
+    bids, asks = book.depth(10)
+    assert len(bids) == 1 and [quantity for _, quantity in asks] == [7, 4]
+    assert book.updates == 2 and sorted(books.keys()) == [("TQBR", "GAZP"), ("TQBR", "SBER")]
+    assert books.get("TQBR", "GAZP").best_bid() is None and books.get("TQBR", "GAZP").spread() is None
+    snapshot = book.snapshot()
+    books.clear()
+    assert book.best_bid() is None and book.updates == 3 and snapshot.bids == bids
@@ -0,0 +1,74 @@
+import pytest
+
+from messages import to_scaled
+from orders import (OrderEntry, OrderError, NewOrderTemplate, encode_moveorder, encode_neworder,
+                    encode_newstoporder, format_price)
+from securities_cache import SecuritiesCache
+
+
+def securities():
+    cache = SecuritiesCache()
+    cache.load_message(b'<securities><security secid="3" active="true"><seccode>SBER</seccode>'
+                       b'<instrclass>E</instrclass><board>TQBR</board><market>1</market>'
+                       b'<decimals>2</decimals><minstep>0.01</minstep><lotsize>10</lotsize></security>'
+                       b'<security secid="4" active="false"><seccode>OLD</seccode><board>TQBR</board>'
+                       b'<decimals>2</decimals></security></securities>')
+    return cache
+
+
+@pytest.mark.parametrize("text, decimals, expected", [
+    ("250.1", 2, b"250.10"), ("250", 0, b"250"), ("-1.5", 2, b"-1.50"), ("0.000001", None, b"0.000001"),
+])
+def test_format_price(text, decimals, expected):
+    assert format_price(to_scaled(text), decimals) == expected
+
+
+@pytest.mark.parametrize("text, decimals", [("250.175", 2), ("250.5", 0), ("-1.555", 2)])
+def test_format_price_rejects_extra_digits(text, decimals):
+    with pytest.raises(OrderError):
+        format_price(to_scaled(text), decimals)
+
+
+def test_neworder_template():
+    template = NewOrderTemplate("TQBR", "SBER", client="C1", decimals=2)
+    command = template.encode("B", 3, to_scaled("250.1"))
+    assert b"<price>250.10</price>" in command and b"<quantity>3</quantity>" in command
+    assert b"<buysell>B</buysell>" in command and b"<client>C1</client>" in command
+    with pytest.raises(OrderError):
+        template.encode("B", 3, to_scaled("250.105"))  # Не округляется до 250.10
+    with pytest.raises(OrderError):
+        template.encode("X", 3, to_scaled("250.1"))
+
+
+def test_neworder_bymarket_and_escaping():
+    command = encode_neworder("TQBR", "SBER", "S", 1, client="C%1", bymarket=True, brokerref="a<b")
+    assert b"<bymarket/>" in command and b"<price>" not in command
+    assert b"<client>C%1</client>" in command and b"a&lt;b" in command
+
+
+def test_moveorder_rejects_extra_digits():
+    assert b"<price>250.20</price>" in encode_moveorder(7, to_scaled("250.2"), decimals=2)
+    with pytest.raises(OrderError):
+        encode_moveorder(7, to_scaled("250.201"), decimals=2)
+    with pytest.raises(OrderError):
+        encode_moveorder(7, to_scaled("250.5"), decimals=0)
+
+
+def test_order_entry_checks():
+    orders = OrderEntry(securities=securities(), client="C1")
+    assert b"<price>250.17</price>" in orders.encode_new_order("TQBR", "SBER", "B", 1, to_scaled("250.17"))
+    for args in (("TQBR", "GAZP", "B", 1, to_scaled("1")),  # Нет в справочнике
+                 ("TQBR", "OLD", "B", 1, to_scaled("1")),  # Не торгуется
+                 ("TQBR", "SBER", "B", 0, to_scaled("1")),  # Объем
+                 ("TQBR", "SBER", "B", 1, to_scaled("-1")),  # Цена
+                 ("TQBR", "SBER", "B", 1, to_scaled("250.175"))):  # Шаг
+        with pytest.raises(OrderError):
+            orders.encode_new_order(*args)
+
+
+def test_stoporder_needs_leg():
+    with pytest.raises(OrderError):
+        encode_newstoporder("TQBR", "SBER", "B", client="C1")
+    command = encode_newstoporder("TQBR", "SBER", "S", client="C1", decimals=2,
+                                  stoploss={"activationprice": to_scaled("240"), "quantity": 1})
+    assert b"<activationprice>240.00</activationprice><bymarket/>" in command
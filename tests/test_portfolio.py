@@ -0,0 +1,106 @@
+# Тесты portfolio.py: позиции по (client, board, seccode), размер лота, результат
+import pytest  # Тесты
+from messages import Trade, SecPosition, AllTrade, Security, PRICE_SCALE  # Записи сообщений
+from portfolio import Portfolio  # Портфель
+
+
+class Securities:
+    """Справочник с тем же интерфейсом, что у SecuritiesCache (get, find)"""
+    def __init__(self, *securities):
+        self.by_secid = {security.secid: security for security in securities}
+
+    def get(self, secid):
+        return self.by_secid.get(secid)
+
+    def find(self, board, seccode):
+        for security in self.by_secid.values():
+            if security.board == board and security.seccode == seccode:
+                return security
+        return None
+
+
+SBER = Security(secid=3, board="TQBR", seccode="SBER", lotsize=10)
+
+
+def trade(tradeno, buysell, quantity, price, board="TQBR", seccode="SBER", secid=3):
+    return Trade(tradeno=tradeno, client="C1", board=board, seccode=seccode, secid=secid, buysell=buysell,
+                 quantity=quantity, price=price * PRICE_SCALE)
+
+
+def round_trip(portfolio):
+    portfolio.on_trades([trade(1, "B", 2, 100)])
+    portfolio.on_trades([trade(2, "S", 2, 110)])
+    return portfolio.position("C1", "TQBR", "SBER")
+
+
+def test_realized_uses_lotsize():
+    position = round_trip(Portfolio(securities=Securities(SBER)))
+    assert position.lotsize == 10
+    assert position.realized == 2 * 10 * 10 * PRICE_SCALE
+
+
+@pytest.mark.parametrize("secid", [3, None])
+def test_sec_position_before_trades_does_not_lose_lotsize(secid):
+    """<sec_position> без board пришел раньше сделок: результат тот же, что без него"""
+    portfolio = Portfolio(securities=Securities(SBER))
+    portfolio.on_positions([SecPosition(client="C1", seccode="SBER", secid=secid, saldo=2)])
+    position = round_trip(portfolio)
+    assert position.lotsize == 10
+    assert position.saldo == 2
+    assert position.realized == 2 * 10 * 10 * PRICE_SCALE
+    assert list(portfolio.positions) == [("C1", "TQBR", "SBER")]
+
+
+def test_lotsize_found_later_applies_to_realized():
+    securities = Securities()
+    portfolio = Portfolio(securities=securities)
+    portfolio.on_trades([trade(1, "B", 1, 100)])
+    securities.by_secid[3] = SBER  # Справочник загрузился после первой сделки
+    portfolio.on_trades([trade(2, "S", 1, 105)])
+    assert portfolio.position("C1", "TQBR", "SBER").realized == 5 * 10 * PRICE_SCALE
+
+
+def test_positions_on_different_boards_are_separate():
+    portfolio = Portfolio()
+    portfolio.on_trades([trade(1, "B", 3, 100), trade(2, "S", 1, 100, board="SMAL")])
+    assert portfolio.position("C1", "TQBR", "SBER").quantity == 3
+    assert portfolio.position("C1", "SMAL", "SBER").quantity == -1
+
+
+def test_alltrades_mark_by_board():
+    portfolio = Portfolio()
+    portfolio.on_trades([trade(1, "B", 1, 100)])
+    portfolio.on_alltrades([AllTrade(board="SMAL", seccode="SBER", price=50 * PRICE_SCALE),
+                            AllTrade(board="TQBR", seccode="SBER", price=120 * PRICE_SCALE)])
+    (position, mark, result), = portfolio.snapshot()["positions"]
+    assert mark == 120 * PRICE_SCALE
+    assert result == 20 * PRICE_SCALE
+
+
+def test_duplicate_trade_ignored_and_flip():
+    portfolio = Portfolio()
+    portfolio.on_trades([trade(1, "B", 2, 100)])
+    portfolio.on_trades([trade(1, "B", 2, 100)])  # Повтор после переподключения
+    portfolio.on_trades([trade(2, "S", 3, 90)])  # Переворот
+    position = portfolio.position("C1", "TQBR", "SBER")
+    assert position.quantity == -1
+    assert position.avg_price == 90 * PRICE_SCALE
+    assert position.realized == -2 * 10 * PRICE_SCALE
+
+
+def test_cost_basis_exact_after_many_fills():
+    portfolio = Portfolio()
+    prices = [100 * PRICE_SCALE + step for step in (1, 2, 4)]  # Средняя — не целое число
+    for number in range(3000):
+        portfolio.on_trades([Trade(tradeno=number + 1, client="C1", board="TQBR", seccode="SBER", buysell="B",
+                                   quantity=1, price=prices[number % 3])])
+    position = portfolio.position("C1", "TQBR", "SBER")
+    assert position.cost == sum(prices) * 1000 and position.avg_price == pytest.approx(sum(prices) / 3)
+    portfolio.on_trades([Trade(tradeno=5000, client="C1", board="TQBR", seccode="SBER", buysell="S",
+                               quantity=1000, price=101 * PRICE_SCALE)])
+    portfolio.on_trades([Trade(tradeno=5001, client="C1", board="TQBR", seccode="SBER", buysell="S",
+                               quantity=2000, price=101 * PRICE_SCALE)])
+    position = portfolio.position("C1", "TQBR", "SBER")
+    assert position.quantity == 0 and position.cost == 0
+    assert position.realized == 3000 * 101 * PRICE_SCALE - sum(prices) * 1000  # Точно, без округления
+    assert isinstance(position.realized, int)
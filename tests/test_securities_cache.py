@@ -0,0 +1,26 @@
+import atexit
+
+import securities_cache
+from securities_cache import SecuritiesCache
+
+SECURITIES = (b'<securities><security secid="1" active="true"><seccode>SBER</seccode><board>TQBR</board>'
+              b'<decimals>2</decimals><minstep>0.01</minstep><lotsize>10</lotsize></security></securities>')
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / "securities.cache")
+    cache = SecuritiesCache(path)
+    cache.on_securities(SECURITIES)
+    cache.save()
+    loaded = SecuritiesCache(path)
+    assert loaded.find("TQBR", "SBER").lotsize == 10 and len(loaded) == 1
+
+
+def test_one_atexit_handler_saves_all(tmp_path):
+    before = atexit._ncallbacks()
+    caches = [SecuritiesCache(str(tmp_path / f"{i}.cache")) for i in range(3)]
+    assert atexit._ncallbacks() == before
+    for cache in caches:
+        cache.on_securities(SECURITIES)
+    securities_cache._save_all()
+    assert all((tmp_path / f"{i}.cache").exists() for i in range(3))
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+import shm_ring
+from shm_ring import HEADER_SIZE, PID, SLOT_WORDS, RingReader, RingWriter
+
+
+@pytest.fixture
+def writer():
+    ring = RingWriter(f"test_{uuid.uuid4().hex[:12]}", capacity=4096, slots=4)
+    yield ring
+    ring.close()
+
+
+def claim_slot(name, queue):
+    with RingReader(name) as reader:
+        queue.put(reader._slot)
+        queue.get()  # Держим слот, пока тест не прочитает все
+
+
+def test_wraparound_keeps_records_whole(writer):
+    reader = RingReader(writer.name, start="tail")
+    got = []
+    for i in range(500):
+        assert writer.publish("quotes", b"%d" % i + b"x" * (i % 97))
+        if i % 7 == 0:
+            got += reader.poll()
+    got += reader.poll()
+    assert writer.head > writer.capacity * 5  # Буфер прошел по кругу несколько раз
+    assert [message.payload for message in got] == [b"%d" % i + b"x" * (i % 97) for i in range(500)]
+    assert reader.lost == 0 and reader.lag() == 0
+    reader.close()
+
+
+def test_overrun_counts_lost(writer):
+    reader = RingReader(writer.name)
+    writer.publish("alltrades", b"first")
+    assert reader.poll()[0].seq == 0
+    for i in range(200):
+        writer.publish("alltrades", b"y" * 100)
+    messages = reader.poll()
+    assert reader.overruns == 1 and messages[0].seq > 1
+    assert reader.lost + len(messages) == 200 and messages[-1].seq == 200
+    assert writer.readers()[0]["lost"] == reader.lost
+    reader.close()
+
+
+def test_publish_rejects_large_message(writer):
+    assert not writer.publish("quotes", b"z" * writer.capacity)
+    assert writer.dropped == 1
+
+
+def test_readers_get_distinct_slots(writer):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [context.Process(target=claim_slot, args=(writer.name, queue)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    slots = [queue.get(timeout=30) for _ in processes]
+    assert len(set(slots)) == 4 and len(writer.readers()) == 4
+    with pytest.raises(RuntimeError):
+        RingReader(writer.name)
+    for _ in processes:
+        queue.put(None)
+    for process in processes:
+        process.join(30)
+
+
+def test_dead_reader_slot_reused(writer, monkeypatch):
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=os.getpid)
+    process.start()
+    process.join(30)
+    dead = process.pid  # Процесс завершился, его pid (почти наверняка) никому не выдан
+    monkeypatch.setattr(shm_ring, "_alive", lambda pid: pid != dead)
+    for index in range(writer.slots):  # Все слоты заняты «упавшими» читателями
+        writer._words[HEADER_SIZE // 8 + index * SLOT_WORDS + PID] = dead
+    reader = RingReader(writer.name)
+    assert reader._slot == HEADER_SIZE // 8 and writer._words[reader._slot + PID] == os.getpid()
+    writer.check_readers()
+    assert [r["pid"] for r in writer.readers()] == [os.getpid()]
+    reader.close()
+    assert writer.readers() == []
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from messages import PRICE_SCALE  # noqa: E402
+from tick_store import TickSeries, TickStore  # noqa: E402
+
+
+def message(trades, tag="alltrades"):
+    row, time_tag = ("trade", "time") if tag == "alltrades" else ("tick", "tradetime")
+    return (f"<{tag}>" + "".join(
+        f'<{row} secid="1"><seccode>SBER</seccode><board>TQBR</board><tradeno>{no}</tradeno>'
+        f'<{time_tag}>01.02.2024 10:{second // 60:02d}:{second % 60:02d}</{time_tag}><price>{price}</price>'
+        f'<quantity>{quantity}</quantity><buysell>{side}</buysell></{row}>'
+        for no, second, price, quantity, side in trades) + f"</{tag}>").encode()
+
+
+def test_duplicates_and_aggregates():
+    store = TickStore()
+    store.add_message(message([(1, 0, "100", 1, "B"), (2, 30, "102", 3, "S")]))
+    store.add_message(message([(2, 30, "102", 3, "S"), (3, 61, "101", 2, "B")], "ticks"), "ticks")  # Повтор 2
+    series = store.get("TQBR", "SBER")
+    assert len(series) == 3
+    assert series.vwap() == pytest.approx((100 + 306 + 202) / 6 * PRICE_SCALE)
+    bars = series.ohlcv(60_000)
+    assert list(bars["open"]) == [100 * PRICE_SCALE, 101 * PRICE_SCALE]
+    assert list(bars["high"]) == [102 * PRICE_SCALE, 101 * PRICE_SCALE]
+    assert list(bars["volume"]) == [4, 2]
+    profile = series.volume_profile(PRICE_SCALE)
+    assert list(profile["buy"]) == [1, 2, 0] and list(profile["sell"]) == [0, 0, 3]
+
+
+def test_chunks_and_time_range(tmp_path):
+    series = TickSeries("TQBR", "SBER", chunk_rows=4, spill_dir=str(tmp_path))
+    series.append(range(10), [PRICE_SCALE] * 10, [1] * 10, [1] * 10, range(1, 11))
+    assert len(series.chunks) == 2 and len(series) == 10
+    assert isinstance(series.chunks[0][2]["time"], np.memmap)
+    assert list(series.columns(3, 5)["time"]) == [3, 4, 5]
+
+
+def test_stores_do_not_overwrite_each_other(tmp_path):
+    first = TickStore(spill_dir=str(tmp_path), chunk_rows=2)
+    second = TickStore(spill_dir=str(tmp_path), chunk_rows=2)
+    assert first.session_dir != second.session_dir
+    first.add_message(message([(1, 0, "100", 1, "B"), (2, 1, "100", 1, "B"), (3, 2, "100", 1, "B")]))
+    second.add_message(message([(1, 0, "200", 1, "B"), (2, 1, "200", 1, "B"), (3, 2, "200", 1, "B")]))
+    assert list(first.get("TQBR", "SBER").columns()["price"]) == [100 * PRICE_SCALE] * 3
+    assert len(os.listdir(first.session_dir)) == len(os.listdir(second.session_dir)) == 5
+
+
+def test_series_refuses_existing_files(tmp_path):
+    TickSeries("TQBR", "SBER", chunk_rows=1, spill_dir=str(tmp_path)).append([0, 1], [1, 1], [1, 1], [1, 1], [1, 2])
+    series = TickSeries("TQBR", "SBER", chunk_rows=1, spill_dir=str(tmp_path))
+    with pytest.raises(FileExistsError):
+        series.append([0, 1], [1, 1], [1, 1], [1, 1], [1, 2])
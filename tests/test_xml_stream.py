@@ -0,0 +1,50 @@
+import gc
+import weakref
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import xml_stream
+from xml_stream import iter_children, root_attrib, root_tag, sniff_root_tag
+
+MIXED = (b"<securities>" + b"".join(
+    b'<security secid="%d"><seccode>S%d</seccode></security><pit secid="%d"/>' % (i, i, i)
+    for i in range(500)) + b"</securities>")
+
+
+@pytest.fixture
+def streaming(monkeypatch):
+    """Потоковый разбор даже для небольших пакетов, мелкими порциями"""
+    monkeypatch.setattr(xml_stream, "STREAM_THRESHOLD", 0)
+    monkeypatch.setattr(xml_stream, "CHUNK_SIZE", 512)
+
+
+def test_root_helpers():
+    data = b'<?xml version="1.0"?><!-- c --><server_status connected="true" recover="false"/>'
+    assert sniff_root_tag(data) == b"server_status" and root_tag(data) == "server_status"
+    assert root_attrib(data) == {"connected": "true", "recover": "false"}
+    assert root_tag(b"not xml") is None
+    with pytest.raises(xml_stream.ParseError):
+        root_attrib(b"<broken")
+
+
+@pytest.mark.parametrize("tag", [None, "security", "pit"])
+def test_streaming_matches_fromstring(streaming, tag):
+    expected = [(elem.tag, elem.get("secid"), elem.findtext("seccode"))
+                for elem in ET.fromstring(MIXED) if tag is None or elem.tag == tag]
+    got = [(elem.tag, elem.get("secid"), elem.findtext("seccode")) for elem in iter_children(MIXED, tag)]
+    assert got == expected
+
+
+@pytest.mark.parametrize("tag", [None, "security"])
+def test_streaming_detaches_handled_children(streaming, tag):
+    refs = []
+    alive = None
+    for elem in iter_children(MIXED, tag):
+        refs.append(weakref.ref(elem))
+        if len(refs) == 300:  # Пока разбор идет, корень не должен держать разобранные элементы
+            del elem
+            gc.collect()
+            alive = sum(1 for ref in refs if ref() is not None)
+            break
+    assert alive < 20
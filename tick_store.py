@@ -0,0 +1,265 @@
+# Колоночное хранилище обезличенных сделок (<alltrades> и <ticks>) на массивах NumPy
+#
+# Подключение к Connector (нужен numpy):
+#   store = TickStore(spill_dir="ticks")      # заполненные блоки уходят в файлы *.npy в ticks/<сеанс>/
+#   store.attach(connector)
+#   series = store.get("TQBR", "SBER")
+#   series.vwap(), series.ohlcv(60_000), series.volume_profile(10 * PRICE_SCALE)
+#
+# Время — миллисекунды эпохи (UTC), цена — целое в единицах PRICE_SCALE (как в messages.py),
+# сторона — 1 (покупка) или -1 (продажа). Каждое хранилище пишет блоки в свою новую папку
+# внутри spill_dir (store.session_dir), поэтому файлы прошлых запусков и других хранилищ,
+# возможно отображенные в память, не перезаписываются.
+import os  # Для работы с файлами и путями
+import tempfile  # Своя папка сеанса внутри spill_dir
+import time  # Время запуска в имени папки сеанса
+import threading  # Запись из потоков-обработчиков, чтение из любых потоков
+from xml.parsers import expat  # Разбор сделок прямо в столбцы, без ElementTree и записей
+import numpy as np  # Столбцы и векторные расчеты
+from messages import to_scaled, to_time  # Перевод цены и времени в целые
+
+COLUMNS = ("time", "price", "quantity", "side", "tradeno")
+DTYPES = {"time": np.int64, "price": np.int64, "quantity": np.int64, "side": np.int8, "tradeno": np.int64}
+
+# Элемент сделки и имя тега времени в каждом типе сообщения
+ROW_TAGS = {"alltrades": ("trade", "time"), "ticks": ("tick", "tradetime")}
+
+
+def parse_trades(data, tag="alltrades"):
+    """Разбирает сообщение со сделками в столбцы: {(board, seccode): (time, price, quantity, side, tradeno)}
+
+    Каждый столбец — список целых; объекты-записи на сделку не создаются.
+    """
+    row_tag, time_tag = ROW_TAGS[tag]
+    result = {}
+    row = {}  # Поля текущей сделки: имя тега -> текст
+    field = [None]  # Тег поля, текст которого сейчас читается
+
+    def start(name, attrs):
+        if name == row_tag:
+            row.clear()
+            row.update(attrs)  # secid приходит атрибутом
+            field[0] = None
+        else:
+            field[0] = name
+
+    def text(value):
+        if field[0] is not None:
+            row[field[0]] = value
+
+    def end(name):
+        field[0] = None
+        if name != row_tag:
+            return
+        key = (row.get("board"), row.get("seccode"))
+        columns = result.get(key)
+        if columns is None:
+            columns = result[key] = ([], [], [], [], [])
+        columns[0].append(to_time(row.get(time_tag)) or 0)
+        columns[1].append(to_scaled(row.get("price")) or 0)
+        columns[2].append(int(row.get("quantity") or 0))
+        columns[3].append(1 if row.get("buysell") == "B" else -1)
+        columns[4].append(int(row.get("tradeno") or 0))
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True  # Текст поля приходит одним вызовом
+    parser.StartElementHandler = start
+    parser.CharacterDataHandler = text
+    parser.EndElementHandler = end
+    parser.Parse(data, True)
+    return result
+
+
+class TickSeries:
+    """Сделки одной бумаги: активный блок в памяти и заполненные блоки (в памяти или в файлах)"""
+    def __init__(self, board, seccode, chunk_rows=65536, spill_dir=None):
+        self.board = board
+        self.seccode = seccode
+        self.chunk_rows = chunk_rows  # Размер блока в строках
+        self.spill_dir = spill_dir  # Папка для заполненных блоков (None — держать в памяти); файлы не перезаписываются
+        self.chunks = []  # Заполненные блоки: (первое время, последнее время, {столбец: массив})
+        self.last_tradeno = 0  # Сделки с номером не больше этого уже есть (повтор после переподключения)
+        self._active = {name: np.empty(min(1024, chunk_rows), DTYPES[name]) for name in COLUMNS}
+        self._size = 0  # Заполнено строк в активном блоке
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(chunk[2]["time"]) for chunk in self.chunks) + self._size
+
+    def append(self, times, prices, quantities, sides, tradenos):
+        """Добавляет столбцы сделок (последовательности одинаковой длины)"""
+        columns = {"time": np.asarray(times, np.int64), "price": np.asarray(prices, np.int64),
+                   "quantity": np.asarray(quantities, np.int64), "side": np.asarray(sides, np.int8),
+                   "tradeno": np.asarray(tradenos, np.int64)}
+        with self._lock:
+            fresh = columns["tradeno"] > self.last_tradeno
+            if not fresh.all():  # Отбрасываем уже записанные сделки
+                columns = {name: column[fresh] for name, column in columns.items()}
+            count = len(columns["time"])
+            if not count:
+                return
+            self.last_tradeno = max(self.last_tradeno, int(columns["tradeno"].max()))
+            pos = 0
+            while pos < count:
+                room = self.chunk_rows - self._size
+                if room == 0:
+                    self._seal()
+                    continue
+                take = min(room, count - pos)
+                self._reserve(self._size + take)
+                for name, column in columns.items():
+                    self._active[name][self._size:self._size + take] = column[pos:pos + take]
+                self._size += take
+                pos += take
+
+    def _reserve(self, size):
+        """Увеличивает активный блок вдвое, пока он не вместит size строк (но не больше chunk_rows)"""
+        capacity = len(self._active["time"])
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        capacity = min(capacity, self.chunk_rows)
+        for name in COLUMNS:
+            grown = np.empty(capacity, DTYPES[name])
+            grown[:self._size] = self._active[name][:self._size]
+            self._active[name] = grown
+
+    def _seal(self):
+        """Закрывает заполненный активный блок; при заданной папке переносит его в файлы"""
+        columns = {name: self._active[name][:self._size] for name in COLUMNS}
+        if self.spill_dir is not None:
+            columns = self._spill(columns)
+        times = columns["time"]
+        self.chunks.append((int(times.min()), int(times.max()), columns))
+        self._active = {name: np.empty(self.chunk_rows, DTYPES[name]) for name in COLUMNS}
+        self._size = 0
+
+    def _spill(self, columns):
+        """Пишет блок в новые файлы *.npy и возвращает столбцы, отображенные в память только для чтения
+
+        FileExistsError, если файл уже есть: его может читать другой ряд или процесс.
+        """
+        os.makedirs(self.spill_dir, exist_ok=True)
+        prefix = os.path.join(self.spill_dir, f"{self.board}_{self.seccode}_{len(self.chunks):05d}")
+        mapped = {}
+        for name, column in columns.items():
+            path = f"{prefix}.{name}.npy"
+            with open(path, "xb") as file:  # "x" — не перезаписывать существующий файл
+                np.save(file, column)
+            mapped[name] = np.load(path, mmap_mode="r")
+        return mapped
+
+    def columns(self, start=None, end=None):
+        """Столбцы сделок с временем в интервале [start, end] (мс эпохи): {имя: массив}"""
+        parts = []
+        with self._lock:
+            for first, last, chunk in self.chunks:
+                if (start is not None and last < start) or (end is not None and first > end):
+                    continue  # Блок целиком вне интервала
+                parts.append(chunk)
+            if self._size:
+                parts.append({name: self._active[name][:self._size].copy() for name in COLUMNS})
+        result = {}
+        for name in COLUMNS:
+            arrays = [part[name] for part in parts]
+            result[name] = np.concatenate(arrays) if arrays else np.empty(0, DTYPES[name])
+        if start is not None or end is not None:
+            times = result["time"]
+            mask = np.ones(len(times), bool)
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times <= end
+            result = {name: column[mask] for name, column in result.items()}
+        return result
+
+    def vwap(self, start=None, end=None):
+        """Средневзвешенная по объему цена (в единицах PRICE_SCALE) или None"""
+        columns = self.columns(start, end)
+        volume = columns["quantity"].sum()
+        if not volume:
+            return None
+        return float(np.dot(columns["price"].astype(np.float64), columns["quantity"]) / volume)
+
+    def ohlcv(self, interval, start=None, end=None):
+        """Бары с шагом interval мс: {time, open, high, low, close, volume}; time — начало бара"""
+        columns = self.columns(start, end)
+        times = columns["time"]
+        prices = columns["price"]
+        quantities = columns["quantity"]
+        if len(times) > 1 and (np.diff(times) < 0).any():  # Сделки пришли не по порядку
+            order = np.argsort(times, kind="stable")
+            times, prices, quantities = times[order], prices[order], quantities[order]
+        buckets = times // interval
+        if not len(buckets):
+            empty = np.empty(0, np.int64)
+            return {"time": empty, "open": empty, "high": empty, "low": empty, "close": empty, "volume": empty}
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+        return {
+            "time": buckets[starts] * interval,
+            "open": prices[starts],
+            "high": np.maximum.reduceat(prices, starts),
+            "low": np.minimum.reduceat(prices, starts),
+            "close": prices[ends],
+            "volume": np.add.reduceat(quantities, starts),
+        }
+
+    def volume_profile(self, step, start=None, end=None):
+        """Объем по ценовым уровням шириной step: {price, volume, buy, sell}"""
+        columns = self.columns(start, end)
+        levels = columns["price"] // step * step
+        prices, inverse = np.unique(levels, return_inverse=True)
+        quantities = columns["quantity"]
+        buys = np.where(columns["side"] > 0, quantities, 0)
+        volume = np.bincount(inverse, weights=quantities, minlength=len(prices)).astype(np.int64)
+        buy = np.bincount(inverse, weights=buys, minlength=len(prices)).astype(np.int64)
+        return {"price": prices, "volume": volume, "buy": buy, "sell": volume - buy}
+
+
+class TickStore:
+    """Хранилище сделок всех бумаг, заполняемое из сырых сообщений <alltrades> и <ticks>"""
+    def __init__(self, spill_dir=None, chunk_rows=65536):
+        self.spill_dir = spill_dir
+        self.session_dir = None  # Папка этого хранилища внутри spill_dir
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.session_dir = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d_%H%M%S_"), dir=spill_dir)
+        self.chunk_rows = chunk_rows
+        self.series = {}  # (board, seccode) -> TickSeries
+        self._lock = threading.Lock()  # Только для создания новых рядов
+
+    def attach(self, connector):
+        """Подписывается на сырые сообщения коннектора (декодирование в записи не нужно)"""
+        connector.add_raw_handler("alltrades", self.on_alltrades)
+        connector.add_raw_handler("ticks", self.on_ticks)
+
+    def on_alltrades(self, data):
+        self.add_message(data, "alltrades")
+
+    def on_ticks(self, data):
+        self.add_message(data, "ticks")
+
+    def add_message(self, data, tag="alltrades"):
+        """Разбирает сообщение со сделками и добавляет их в ряды бумаг"""
+        for (board, seccode), columns in parse_trades(data, tag).items():
+            series = self.series.get((board, seccode))
+            if series is None:
+                series = self._create(board, seccode)
+            series.append(*columns)
+
+    def _create(self, board, seccode):
+        with self._lock:
+            series = self.series.get((board, seccode))
+            if series is None:
+                series = self.series[(board, seccode)] = TickSeries(board, seccode, self.chunk_rows, self.session_dir)
+            return series
+
+    def get(self, board, seccode):
+        """Ряд сделок бумаги или None"""
+        return self.series.get((board, seccode))
+
+    def keys(self):
+        """Список пар (board, seccode), по которым есть сделки"""
+        return list(self.series)
@@ -0,0 +1,276 @@
+# Локальный эмулятор Transaq Connector для нагрузочного тестирования (TCP, без брокера)
+#
+# Запуск:
+#   python transaq_emulator.py --port 3950 --rate 50000 --instruments 100
+#   python transaq_emulator.py --drop-every 30 --fail-hosts tr1.finam.ru   — проверка переподключения
+#   python transaq_emulator.py --mix 40,20,5,35                           — с потоком <quotations>
+#
+# Протокол: кадры FRAME_HEADER (тип, длина) + XML в UTF-8.
+#   FRAME_COMMAND  — команда клиента (<command id="...">), как в SendCommand
+#   FRAME_RESULT   — ответ на команду (строго по порядку команд)
+#   FRAME_DATA     — асинхронное сообщение, как в callback DLL
+import argparse  # Для аргументов командной строки
+import asyncio  # Сервер и генераторы потока
+import itertools  # Счетчики номеров сделок и заявок
+import logging  # Для ведения логов
+import random  # Случайное блуждание цен
+import time  # Время сделок
+from xml_stream import root_tag, root_attrib, parse_root, ParseError  # Разбор команд
+from emulator_protocol import FRAME_HEADER, FRAME_COMMAND, FRAME_RESULT, FRAME_DATA, frame  # Кадры протокола
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+OK_RESULT = b'<result success="true"/>'
+TICK = 0.01  # Генераторы отправляют поток пачками раз в TICK секунд
+
+
+class Instrument:
+    """Бумага эмулятора со случайным блужданием цены"""
+    __slots__ = ("secid", "seccode", "board", "price", "step")
+
+    def __init__(self, secid, seccode, board, price, step):
+        self.secid = secid
+        self.seccode = seccode.encode("ascii")
+        self.board = board.encode("ascii")
+        self.price = price  # Цена в шагах цены
+        self.step = step    # Шаг цены в копейках (для форматирования)
+
+    def move(self):
+        """Сдвигает цену на случайное число шагов"""
+        self.price = max(1, self.price + random.randint(-2, 2))
+
+
+class EmulatorSession:
+    """Одно подключение клиента: ответы на команды и генерация потока данных"""
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.connected = False  # Была ли команда connect
+        self.stream_task = None  # Задача генерации потока
+        self.drop_task = None  # Задача имитации обрыва связи
+        self.sent = 0  # Сколько сообщений отправлено
+
+    async def run(self):
+        """Читает команды клиента до закрытия соединения"""
+        try:
+            while True:
+                header = await self.reader.readexactly(FRAME_HEADER.size)
+                kind, length = FRAME_HEADER.unpack(header)
+                payload = await self.reader.readexactly(length)
+                if kind == FRAME_COMMAND:
+                    self.handle_command(payload)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Клиент отключился
+        finally:
+            self.stop_stream()
+            self.writer.close()
+
+    def send(self, kind, payload):
+        self.writer.write(frame(kind, payload))
+
+    def handle_command(self, payload):
+        """Отвечает на команду так, как ответил бы Transaq Connector"""
+        try:
+            command_id = root_attrib(payload).get("id") if root_tag(payload) == "command" else None
+        except ParseError:
+            command_id = None
+        server = self.server
+        if command_id == "connect":
+            self.send(FRAME_RESULT, OK_RESULT)
+            try:
+                host = parse_root(payload).findtext("host")
+            except ParseError:
+                host = None
+            if host in server.fail_hosts:  # Имитация недоступного адреса
+                self.send(FRAME_DATA, b'<server_status connected="error">Host %s is unreachable</server_status>'
+                          % host.encode("utf-8"))
+                return
+            self.send(FRAME_DATA, b'<server_status id="1" connected="true" recover="false" '
+                                  b'server_tz="Russian Standard Time"/>')
+            self.connected = True
+            self.start_stream()
+            if server.drop_every and self.drop_task is None:
+                self.drop_task = asyncio.get_running_loop().create_task(self.drop_later(server.drop_every))
+        elif command_id == "disconnect":
+            self.send(FRAME_RESULT, OK_RESULT)
+            self.stop_stream()
+            self.connected = False
+            self.send(FRAME_DATA, b'<server_status connected="false"/>')
+        elif command_id in ("neworder", "newstoporder"):
+            transaction_id = next(server.transaction_ids)
+            self.send(FRAME_RESULT, b'<result success="true" transactionid="%d"/>' % transaction_id)
+            self.send(FRAME_DATA, server.order_update(transaction_id, b"active"))
+        elif command_id == "moveorder":
+            transaction_id = next(server.transaction_ids)
+            self.send(FRAME_RESULT, b'<result success="true" transactionid="%d"/>' % transaction_id)
+        elif command_id == "cancelorder":
+            self.send(FRAME_RESULT, OK_RESULT)
+            try:
+                transaction_id = int(parse_root(payload).findtext("transactionid") or 0)
+            except (ParseError, ValueError):
+                transaction_id = 0
+            self.send(FRAME_DATA, server.order_update(transaction_id, b"cancelled"))
+        elif command_id is not None:  # subscribe, unsubscribe, gethistorydata и прочие — просто подтверждаем
+            self.send(FRAME_RESULT, OK_RESULT)
+        else:
+            self.send(FRAME_RESULT, b'<result success="false"><message>Unknown command</message></result>')
+
+    def start_stream(self):
+        if self.stream_task is None:
+            self.stream_task = asyncio.get_running_loop().create_task(self.stream())
+
+    def stop_stream(self):
+        if self.stream_task is not None:
+            self.stream_task.cancel()
+            self.stream_task = None
+        if self.drop_task is not None and self.drop_task is not asyncio.current_task():
+            self.drop_task.cancel()
+        self.drop_task = None
+
+    async def drop_later(self, delay):
+        """Через delay секунд после подключения имитирует обрыв связи с сервером"""
+        await asyncio.sleep(delay)
+        if self.connected:
+            self.stop_stream()
+            self.connected = False
+            self.send(FRAME_DATA, b'<server_status connected="false"/>')
+
+    async def stream(self):
+        """Отправляет поток сообщений с заданной скоростью пачками раз в TICK"""
+        loop = asyncio.get_running_loop()
+        server = self.server
+        started = loop.time()
+        while True:
+            await asyncio.sleep(TICK)
+            count = int((loop.time() - started) * server.rate) - self.sent  # Сколько положено отправить к этому моменту
+            if count <= 0:
+                continue
+            self.writer.write(b"".join(frame(FRAME_DATA, server.next_message()) for _ in range(count)))
+            self.sent += count
+            await self.writer.drain()  # Медленный клиент притормаживает генератор, а не копит память
+
+
+class EmulatorServer:
+    """Генератор синтетического потока котировок, сделок и заявок"""
+    def __init__(self, rate=10000, instruments=100, mix=(60, 35, 5), levels=10, trades=5, drop_every=0,
+                 fail_hosts=()):
+        self.rate = rate  # Сообщений в секунду на одного клиента
+        self.drop_every = drop_every  # Через сколько секунд после connect обрывать связь (0 — никогда)
+        self.fail_hosts = frozenset(fail_hosts)  # Адреса из команды connect, подключение к которым не удается
+        self.levels = levels  # Уровней в одном <quotes>
+        self.trades = trades  # Сделок в одном <alltrades>
+        self.instruments = [Instrument(i + 1, f"SEC{i + 1:04d}", "TQBR", random.randint(5000, 50000), 1)
+                            for i in range(instruments)]
+        kinds = (self.quotes, self.alltrades, self.orders, self.quotations)  # Без четвертой доли — без quotations
+        self._kinds = [kind for kind, weight in zip(kinds, mix) for _ in range(weight)]  # Таблица для выбора по весам
+        self.trade_numbers = itertools.count(1)
+        self.transaction_ids = itertools.count(1000)
+
+    def next_message(self):
+        """Возвращает следующее сообщение потока"""
+        return random.choice(self._kinds)(random.choice(self.instruments))
+
+    @staticmethod
+    def _price(instrument, price):
+        return b"%d.%02d" % divmod(price * instrument.step, 100)
+
+    def quotes(self, instrument):
+        """<quotes> с обновлением нескольких уровней стакана (иногда с удалением уровня)"""
+        instrument.move()
+        parts = [b"<quotes>"]
+        for level in range(self.levels):
+            side = b"buy" if level % 2 else b"sell"
+            price = instrument.price + (level // 2 + 1) * (-1 if level % 2 else 1)
+            quantity = -1 if random.random() < 0.1 else random.randint(1, 500)
+            parts.append(b'<quote secid="%d"><board>%s</board><seccode>%s</seccode><price>%s</price>'
+                         b'<%s>%d</%s></quote>' % (instrument.secid, instrument.board, instrument.seccode,
+                                                 self._price(instrument, price), side, quantity, side))
+        parts.append(b"</quotes>")
+        return b"".join(parts)
+
+    def alltrades(self, instrument):
+        """<alltrades> с несколькими обезличенными сделками"""
+        now = time.time()
+        stamp = time.strftime("%d.%m.%Y %H:%M:%S", time.gmtime(now)).encode("ascii") + b".%03d" % (now * 1000 % 1000)
+        parts = [b"<alltrades>"]
+        for _ in range(self.trades):
+            instrument.move()
+            parts.append(b'<trade secid="%d"><seccode>%s</seccode><board>%s</board><tradeno>%d</tradeno>'
+                         b'<time>%s</time><price>%s</price><quantity>%d</quantity><buysell>%s</buysell></trade>'
+                         % (instrument.secid, instrument.seccode, instrument.board, next(self.trade_numbers),
+                            stamp, self._price(instrument, instrument.price), random.randint(1, 100),
+                            random.choice((b"B", b"S"))))
+        parts.append(b"</alltrades>")
+        return b"".join(parts)
+
+    def quotations(self, instrument):
+        """<quotations> с изменившимися полями котировки (цена и объем последней сделки, лучшие цены)"""
+        instrument.move()
+        price = instrument.price
+        now = time.time()
+        parts = [b'<quotations><quotation secid="%d"><board>%s</board><seccode>%s</seccode>'
+                 % (instrument.secid, instrument.board, instrument.seccode)]
+        if random.random() < 0.5:
+            parts.append(b"<last>%s</last><quantity>%d</quantity><time>%s</time>"
+                         % (self._price(instrument, price), random.randint(1, 100),
+                            time.strftime("%H:%M:%S", time.gmtime(now)).encode("ascii")))
+        if random.random() < 0.5:
+            parts.append(b"<bid>%s</bid><biddepth>%d</biddepth>"
+                         % (self._price(instrument, price - 1), random.randint(1, 500)))
+        if random.random() < 0.5:
+            parts.append(b"<offer>%s</offer><offerdepth>%d</offerdepth>"
+                         % (self._price(instrument, price + 1), random.randint(1, 500)))
+        parts.append(b"<numtrades>%d</numtrades></quotation></quotations>" % next(self.trade_numbers))
+        return b"".join(parts)
+
+    def orders(self, instrument):
+        """<orders> с обновлением случайной заявки"""
+        return self.order_update(next(self.transaction_ids), random.choice((b"active", b"matched", b"cancelled")),
+                                 instrument)
+
+    def order_update(self, transaction_id, status, instrument=None):
+        """Сообщение об изменении состояния заявки"""
+        instrument = instrument or self.instruments[0]
+        return (b'<orders><order transactionid="%d"><orderno>%d</orderno><secid>%d</secid><board>%s</board>'
+                b'<seccode>%s</seccode><client>EMU</client><status>%s</status><buysell>B</buysell>'
+                b'<price>%s</price><quantity>1</quantity><balance>1</balance></order></orders>'
+                % (transaction_id, transaction_id + 10 ** 9, instrument.secid, instrument.board,
+                   instrument.seccode, status, self._price(instrument, instrument.price)))
+
+    async def serve(self, host, port):
+        """Принимает подключения до остановки процесса"""
+        async def on_client(reader, writer):
+            await EmulatorSession(self, reader, writer).run()
+
+        server = await asyncio.start_server(on_client, host, port)
+        logger.info(f"Эмулятор Transaq слушает {host}:{port}, {self.rate} сообщений/с на клиента")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Эмулятор Transaq Connector для нагрузочного тестирования")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3950)
+    parser.add_argument("--rate", type=int, default=10000, help="сообщений в секунду")
+    parser.add_argument("--instruments", type=int, default=100, help="число бумаг")
+    parser.add_argument("--mix", default="60,35,5", help="доли quotes,alltrades,orders[,quotations]")
+    parser.add_argument("--levels", type=int, default=10, help="уровней стакана в одном <quotes>")
+    parser.add_argument("--trades", type=int, default=5, help="сделок в одном <alltrades>")
+    parser.add_argument("--drop-every", type=float, default=0, help="обрыв связи через N секунд после connect")
+    parser.add_argument("--fail-hosts", default="", help="адреса connect, которые не подключаются (через запятую)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    mix = tuple(int(x) for x in args.mix.split(","))
+    server = EmulatorServer(args.rate, args.instruments, mix, args.levels, args.trades, args.drop_every,
+                            [host for host in args.fail_hosts.split(",") if host])
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# Транспорты для Connector: DLL Transaq, воспроизведение записанной сессии и локальный эмулятор
+import ctypes  # Для работы с DLL (библиотеками Windows)
+import logging  # Для ведения логов
+import os  # Для работы с файлами и путями
+import queue  # Ответы эмулятора на команды
+import socket  # Подключение к эмулятору
+import threading  # Для потока воспроизведения
+import time  # Для выдержки темпа воспроизведения
+from capture import CaptureReader  # Чтение файлов записи *.tqc
+from emulator_protocol import FRAME_HEADER, FRAME_COMMAND, FRAME_RESULT, FRAME_DATA, frame  # Протокол эмулятора
+
+logger = logging.getLogger(__name__)  # Логгер модуля
+
+OK_RESULT = b'<result success="true"/>'  # Ответ-заглушка на команды без DLL
+
+
+class Transport:
+    """Базовый транспорт: источник входящих сообщений и приемник команд
+
+    Транспорт вызывает on_data(bytes) для каждого входящего сообщения в своем
+    потоке. Команды и ответы передаются байтами; None означает "ответа нет".
+    """
+    def __init__(self):
+        self.on_data = None  # Обработчик входящих сообщений
+
+    def set_callback(self, on_data):
+        """Устанавливает обработчик входящих сообщений"""
+        self.on_data = on_data
+
+    def initialize(self, path, log_level):
+        raise NotImplementedError
+
+    def send_command(self, command):
+        raise NotImplementedError
+
+    def uninitialize(self):
+        raise NotImplementedError
+
+
+class DllTransport(Transport):
+    """Транспорт через txmlconnector64.dll"""
+    def __init__(self, dll_dir=None):
+        super().__init__()
+        self._load_dll(dll_dir or os.path.dirname(os.path.abspath(__file__)))  # Загружаем DLL
+
+    def _load_dll(self, script_dir):
+        """Загружает DLL-библиотеку для работы с Transaq"""
+        dll_path = os.path.join(script_dir, "txmlconnector64.dll")  # Путь к DLL
+        os.environ['PATH'] += os.pathsep + script_dir  # Добавляем путь в системный PATH (чтобы DLL была доступна)
+
+        try:
+            self.txml = ctypes.WinDLL(dll_path)  # Загружаем DLL
+            logger.info(f"DLL успешно загружена из {dll_path}")  # Пишем в лог
+            self._setup_dll_functions()  # Настраиваем функции DLL
+            self._setup_callbacks()  # Настраиваем обработчики событий
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке DLL: {e}")  # Если ошибка — пишем в лог
+            raise  # Прерываем выполнение
+
+    def _setup_dll_functions(self):
+        """Настраивает типы аргументов и возвращаемых значений для функций DLL"""
+        self.CALLBACK_TYPE = ctypes.CFUNCTYPE(ctypes.c_bool, ctypes.c_void_p)  # Тип callback-функции
+
+        # Настройка функций DLL:
+        self.txml.SetCallback.argtypes = [self.CALLBACK_TYPE]  # Устанавливаем callback
+        self.txml.SetCallback.restype = ctypes.c_bool
+
+        self.txml.SendCommand.argtypes = [ctypes.c_char_p]  # Отправка команды
+        self.txml.SendCommand.restype = ctypes.c_void_p
+
+        self.txml.FreeMemory.argtypes = [ctypes.c_void_p]  # Освобождение памяти
+        self.txml.FreeMemory.restype = None
+
+        self.txml.Initialize.argtypes = [ctypes.c_char_p, ctypes.c_int]  # Инициализация
+        self.txml.Initialize.restype = ctypes.c_void_p
+
+        self.txml.UnInitialize.argtypes = []  # Деинициализация
+        self.txml.UnInitialize.restype = ctypes.c_void_p
+
+    def _setup_callbacks(self):
+        """Настраивает callback-функцию для обработки входящих данных"""
+        @self.CALLBACK_TYPE
+        def callback(pData):
+            try:
+                if pData:  # Если данные получены
+                    data = ctypes.string_at(pData)  # Копируем байты из буфера DLL
+                    self.txml.FreeMemory(pData)  # Сразу освобождаем память
+                    self.on_data(data)  # Передаем данные дальше
+                return True
+            except Exception as e:
+                logger.error(f"Ошибка в callback: {e}", exc_info=True)  # Логируем ошибку
+                return False
+
+        self.callback_func = callback  # Сохраняем callback
+
+        if not self.txml.SetCallback(self.callback_func):  # Устанавливаем callback
+            raise RuntimeError("Не удалось установить callback")  # Если ошибка
+
+    def _take_result(self, result_ptr):
+        """Копирует ответ DLL и освобождает его память"""
+        if not result_ptr:
+            return None
+        result = ctypes.string_at(result_ptr)
+        self.txml.FreeMemory(result_ptr)
+        return result
+
+    def initialize(self, path, log_level):
+        return self._take_result(self.txml.Initialize(path, log_level))  # bytes передаются как char* без копии
+
+    def send_command(self, command):
+        return self._take_result(self.txml.SendCommand(command))
+
+    def uninitialize(self):
+        return self._take_result(self.txml.UnInitialize())
+
+
+class ReplayTransport(Transport):
+    """Воспроизводит записанную сессию (*.tqc) вместо DLL
+
+    speed=1.0 — в записанном темпе, speed=N — в N раз быстрее,
+    speed=None — так быстро, как успевает принимающая сторона.
+    """
+    def __init__(self, path, speed=1.0, start=None, end=None, tags=None):
+        super().__init__()
+        self.reader = CaptureReader(path)  # Чтец файла записи
+        self.speed = speed
+        self.start = start  # Границы (datetime или секунды эпохи) и фильтр выборки, как в CaptureReader.read
+        self.end = end
+        self.tags = tags
+        self.sent = 0  # Сколько сообщений передано
+        self.started_at = None  # Время начала и конца воспроизведения (time.perf_counter)
+        self.finished_at = None
+        self.finished = threading.Event()  # Устанавливается в конце записи
+        self._stop = threading.Event()
+        self._thread = None
+
+    def initialize(self, path, log_level):
+        """Запускает воспроизведение в отдельном потоке"""
+        self._stop.clear()
+        self.finished.clear()
+        self._thread = threading.Thread(target=self._play, name="ReplayTransport", daemon=True)
+        self._thread.start()
+        return OK_RESULT
+
+    def send_command(self, command):
+        return OK_RESULT  # Команды в записанную сессию не уходят
+
+    def uninitialize(self):
+        """Останавливает воспроизведение"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return OK_RESULT
+
+    def _play(self):
+        """Передает записанные сообщения в on_data с выдержкой темпа"""
+        self.started_at = time.perf_counter()
+        first_ts = None
+        on_data = self.on_data
+        try:
+            for ts, _, payload in self.reader.read(self.start, self.end, self.tags):
+                if self._stop.is_set():
+                    break
+                if self.speed:
+                    if first_ts is None:
+                        first_ts = ts
+                    delay = (ts - first_ts) / 1e9 / self.speed - (time.perf_counter() - self.started_at)
+                    if delay > 0:  # Ждем момента, когда сообщение пришло в записи
+                        self._stop.wait(delay)
+                on_data(payload)
+                self.sent += 1
+        except Exception as e:
+            logger.error(f"Ошибка воспроизведения: {e}", exc_info=True)
+        finally:
+            self.finished_at = time.perf_counter()
+            self.finished.set()
+
+
+class EmulatorTransport(Transport):
+    """Транспорт к локальному эмулятору Transaq (transaq_emulator.py) по TCP"""
+    def __init__(self, host="127.0.0.1", port=3950, timeout=10.0):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.timeout = timeout  # Сколько ждать ответа на команду
+        self.received = 0  # Сколько сообщений принято
+        self._sock = None
+        self._thread = None
+        self._results = queue.Queue()  # Ответы на команды приходят строго по порядку
+        self._send_lock = threading.Lock()  # Одна команда в полете, как у SendCommand в DLL
+
+    def initialize(self, path, log_level):
+        """Подключается к эмулятору и запускает поток приема"""
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._sock.settimeout(None)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._thread = threading.Thread(target=self._read_loop, name="EmulatorTransport", daemon=True)
+        self._thread.start()
+        return OK_RESULT
+
+    def send_command(self, command):
+        """Отправляет команду и ждет ответа, как SendCommand"""
+        if self._sock is None:
+            raise RuntimeError("Нет подключения к эмулятору")
+        with self._send_lock:
+            self._sock.sendall(frame(FRAME_COMMAND, command))
+            try:
+                return self._results.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError("Эмулятор не ответил на команду") from None
+
+    def uninitialize(self):
+        """Закрывает подключение"""
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return OK_RESULT
+
+    def _read_loop(self):
+        """Читает кадры: данные — в on_data, ответы — ожидающей команде"""
+        stream = self._sock.makefile("rb", buffering=1024 * 1024)
+        try:
+            while True:
+                header = stream.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    break  # Соединение закрыто
+                kind, length = FRAME_HEADER.unpack(header)
+                payload = stream.read(length)
+                if kind == FRAME_DATA:
+                    self.received += 1
+                    self.on_data(payload)
+                elif kind == FRAME_RESULT:
+                    self._results.put(payload)
+        except (OSError, ValueError):
+            pass  # Сокет закрыт в uninitialize
+        finally:
+            stream.close()
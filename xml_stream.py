@@ -0,0 +1,109 @@
+# Потоковый разбор XML-сообщений Transaq (работает с байтами, без декодирования в str)
+import xml.etree.ElementTree as ET  # Для потокового разбора (XMLPullParser)
+from xml.parsers import expat  # Быстрый разбор атрибутов корневого тега
+
+ParseError = ET.ParseError  # Ошибка разбора (та же, что у ElementTree)
+
+CHUNK_SIZE = 256 * 1024  # Размер порции, которой большие пакеты подаются в парсер
+STREAM_THRESHOLD = 1024 * 1024  # Пакеты крупнее этого размера разбираются потоково
+
+_TAG_CACHE = {}  # Кэш имен тегов: bytes -> str (чтобы не декодировать каждый раз)
+
+
+class _StopParsing(Exception):
+    """Внутренний сигнал досрочной остановки expat после корневого тега"""
+
+
+def sniff_root_tag(data):
+    """Возвращает имя корневого тега (bytes) из первых байт XML (без разбора документа)"""
+    start = data.find(b"<")  # Ищем начало первого тега
+    while start != -1 and data[start + 1:start + 2] in (b"?", b"!"):  # Пропускаем <?xml ...?> и комментарии
+        start = data.find(b"<", start + 1)
+    if start == -1:
+        return None  # Это не XML
+    end = start + 1
+    size = len(data)
+    while end < size and data[end] not in b" \t\r\n/>":  # Имя тега заканчивается пробелом, / или >
+        end += 1
+    return data[start + 1:end] or None
+
+
+def root_tag(data):
+    """Возвращает имя корневого тега (str) или None, если данные не XML"""
+    raw = sniff_root_tag(data)
+    if raw is None:
+        return None
+    tag = _TAG_CACHE.get(raw)
+    if tag is None:  # Новый тег — декодируем один раз и запоминаем
+        tag = raw.decode("utf-8", "replace")
+        if len(_TAG_CACHE) < 1024:  # Ограничиваем кэш на случай мусорных данных
+            _TAG_CACHE[raw] = tag
+    return tag
+
+
+def root_attrib(data):
+    """Возвращает атрибуты корневого тега, не разбирая вложенные элементы"""
+    result = {}
+
+    def start(name, attrs):
+        result.update(attrs)  # Запоминаем атрибуты корня
+        raise _StopParsing()  # Остальной документ не нужен
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    try:
+        parser.Parse(data, True)
+    except _StopParsing:
+        pass
+    except expat.ExpatError as e:
+        raise ParseError(str(e)) from None  # Единый тип ошибки для вызывающего кода
+    return result
+
+
+def parse_root(data):
+    """Полностью разбирает небольшое сообщение (например, <error> или <result>)"""
+    return ET.fromstring(data)  # ElementTree принимает байты и сам учитывает кодировку
+
+
+def iter_children(data, tag=None):
+    """Поэлементно перебирает дочерние элементы корня, не строя дерево целиком
+
+    Небольшие пакеты разбираются целиком (так быстрее), большие подаются в
+    XMLPullParser порциями. Если задан tag, отбираются прямые потомки корня с
+    этим именем. Каждый элемент очищается и отцепляется от корня после того,
+    как вызывающий код перешел к следующему, поэтому хранить ссылки на
+    элементы между итерациями нельзя. Выигрыш потокового разбора — память:
+    дерево большого пакета целиком не строится (см. bench_parser.py).
+    """
+    if len(data) <= STREAM_THRESHOLD:  # Небольшой пакет — обычный разбор быстрее
+        for elem in ET.fromstring(data):
+            if tag is None or elem.tag == tag:
+                yield elem
+        return
+    view = memoryview(data)  # Порции без копирования байтов
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0
+    for offset in range(0, len(view), CHUNK_SIZE):
+        parser.feed(view[offset:offset + CHUNK_SIZE])
+        for event, elem in parser.read_events():
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = elem  # Запоминаем корень, чтобы отцеплять от него разобранное
+                continue
+            depth -= 1
+            if depth == 1 and (tag is None or elem.tag == tag):  # Нас интересуют только прямые потомки корня
+                yield elem
+                elem.clear()
+        if root is not None and depth > 0:
+            del root[:len(root) - 1]  # Отцепляем разобранные элементы (кроме незаконченного)
+    parser.close()
+
+
+def child_text(elem, name, default=None):
+    """Возвращает текст дочернего элемента или default"""
+    child = elem.find(name)
+    if child is None or child.text is None:
+        return default
+    return child.text